@@ -0,0 +1,109 @@
+"""
+Mémoire et latence de l'anti-spam (RATE_LIMIT / CHAT_FLOOD) face à un afflux d'utilisateurs distincts,
+comparées aux anciens dictionnaires LAST_MSG_TIME + SPAM_COUNT (jamais bornés).
+
+    python bench/bench_antispam.py [--users 100000] [--messages 500000]
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("BOT_TOKEN", "123:bench")
+
+import bot  # noqa: E402
+
+
+class LegacyAntiSpam:
+    """Ancien cooldown : un horodatage et un compteur d'avertissements par utilisateur, sans éviction."""
+
+    def __init__(self):
+        self.last_msg_time = {}
+        self.spam_count = {}
+
+    def __len__(self):
+        return len(self.last_msg_time)
+
+    def hit(self, user_id, now):
+        last = self.last_msg_time.get(user_id, 0)
+        self.last_msg_time[user_id] = now
+        if now - last < bot.SPAM_COOLDOWN:
+            state = self.spam_count.get(user_id, {"count": 0, "last": 0})
+            state["count"] += 1
+            state["last"] = now
+            self.spam_count[user_id] = state
+            return True
+        return False
+
+
+class EngineAntiSpam:
+    def __init__(self, capacity):
+        self.engine = bot.RateLimitEngine(capacity=capacity)
+
+    def __len__(self):
+        return len(self.engine)
+
+    def hit(self, user_id, now):
+        if self.engine.hit(user_id, now):
+            self.engine.strike(user_id, now)
+            return True
+        return False
+
+
+def make_stream(users: int, messages: int) -> list:
+    """Chaque utilisateur poste au moins une fois ; 10 % d'habitués génèrent le reste, par rafales."""
+    rnd = random.Random(7)
+    regulars = max(1, users // 10)
+    ids = list(range(users)) + [rnd.randrange(regulars) for _ in range(max(0, messages - users))]
+    rnd.shuffle(ids)
+    t0 = 1_700_000_000.0
+    return [(uid, t0 + i * 0.002) for i, uid in enumerate(ids)]     # 500 msg/s
+
+
+def run(name: str, make_limiter, stream: list):
+    # Passe 1 : mémoire retenue (tracemalloc ralentit, on ne mesure pas la latence ici)
+    gc.collect()
+    tracemalloc.start()
+    limiter, flood = make_limiter(), bot.ChatFloodDetector()
+    for uid, now in stream:
+        limiter.hit(uid, now)
+        flood.hit(-100, now)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    keys = len(limiter)
+    del limiter, flood
+
+    # Passe 2 : latence par message (contrôle utilisateur + détecteur d'afflux)
+    limiter, flood = make_limiter(), bot.ChatFloodDetector()
+    lat = [0] * len(stream)
+    blocked = 0
+    clock = time.perf_counter_ns
+    for i, (uid, now) in enumerate(stream):
+        t = clock()
+        blocked += limiter.hit(uid, now)
+        flood.hit(-100, now)
+        lat[i] = clock() - t
+    lat.sort()
+    q = lambda p: lat[min(len(lat) - 1, int(len(lat) * p))] / 1000
+    print(f"{name:<26} clés={keys:>7}  mémoire={current / 1e6:6.1f} Mo (pic {peak / 1e6:5.1f})  "
+          f"p50={q(0.50):5.2f} µs  p99={q(0.99):5.2f} µs  bloqués={blocked}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=100_000)
+    ap.add_argument("--messages", type=int, default=500_000)
+    args = ap.parse_args()
+    stream = make_stream(args.users, args.messages)
+    print(f"{len(stream)} messages, {args.users} utilisateurs distincts, RATE_LRU_CAPACITY={bot.RATE_LRU_CAPACITY}")
+    run("ancien (dicts)", LegacyAntiSpam, stream)
+    run("RateLimitEngine (borné)", lambda: EngineAntiSpam(bot.RATE_LRU_CAPACITY), stream)
+    run("RateLimitEngine (∞)", lambda: EngineAntiSpam(args.users + 1), stream)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Index de media_archive (migration v3) sur une archive d'un million de lignes :
+purge par âge (requête de _delete_batched) et lecture d'album (/deplacer, /modifier),
+avant et après la migration, avec le plan de requête SQLite.
+
+    python bench/bench_archive.py [--rows 1000000] [--lookups 2000]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("BOT_TOKEN", "123:bench")
+
+import aiosqlite  # noqa: E402
+
+import bot  # noqa: E402
+
+DAYS = 7
+T_END = 1_700_000_000
+
+PURGE_SQL = "SELECT rowid FROM media_archive WHERE timestamp < ? LIMIT ?"
+ALBUM_SQL = (
+    "SELECT message_id, file_type, file_id, caption FROM media_archive "
+    "WHERE media_group_id = ? AND chat_id = ? ORDER BY message_id"
+)
+
+
+def build(path: str, rows: int) -> list:
+    """Archive chronologique (schéma v2 : ancien idx_media_group_id) ; 60 % des médias en albums de 2 à 10."""
+    rnd = random.Random(16)
+    con = sqlite3.connect(path)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("""
+        CREATE TABLE media_archive (
+            message_id INTEGER, chat_id INTEGER, media_group_id TEXT, file_id TEXT,
+            file_type TEXT, caption TEXT, timestamp INTEGER, thread_id INTEGER,
+            PRIMARY KEY (message_id, chat_id)
+        )
+    """)
+    con.execute("CREATE INDEX idx_media_group_id ON media_archive (media_group_id, chat_id)")
+    albums, batch, mid, t = [], [], 0, T_END - DAYS * 86400
+    step = DAYS * 86400 / rows
+    while mid < rows:
+        chat_id = rnd.choice((-1001, -1002))
+        size = rnd.randint(2, 10) if rnd.random() < 0.6 else 1
+        group = f"g{mid}" if size > 1 else None
+        if group:
+            albums.append((group, chat_id))
+        caption = rnd.choice(("", "Accident A7", "Bouchon périph", "Radar mobile"))
+        # Les médias d'un album arrivent dans le désordre
+        for k in rnd.sample(range(size), size):
+            batch.append((mid + k, chat_id, group, f"file{mid + k}", "photo", caption, int(t), None))
+        mid += size
+        t += step * size
+        if len(batch) >= 50_000:
+            con.executemany("INSERT INTO media_archive VALUES (?, ?, ?, ?, ?, ?, ?, ?)", batch)
+            batch = []
+    con.executemany("INSERT INTO media_archive VALUES (?, ?, ?, ?, ?, ?, ?, ?)", batch)
+    con.commit()
+    con.close()
+    return albums
+
+
+def plan(con, sql: str, params: tuple) -> str:
+    return " | ".join(r[3] for r in con.execute("EXPLAIN QUERY PLAN " + sql, params))
+
+
+def timed(con, sql: str, params_list: list) -> float:
+    t0 = time.perf_counter()
+    for params in params_list:
+        con.execute(sql, params).fetchall()
+    return (time.perf_counter() - t0) / len(params_list)
+
+
+def measure(path: str, label: str, albums: list, lookups: int):
+    rnd = random.Random(3)
+    con = sqlite3.connect(path)
+    steady = (T_END - DAYS * 86400 - 1, bot.MAINT_BATCH_ROWS)        # rien à purger : dernier lot de chaque passe
+    backlog = (T_END - 3 * 86400, bot.MAINT_BATCH_ROWS)              # 4 jours sur 7 à purger
+    sample = [rnd.choice(albums) for _ in range(lookups)]
+    print(f"\n== {label}")
+    print(f"  purge, plan        : {plan(con, PURGE_SQL, steady)}")
+    print(f"  purge, lot vide    : {timed(con, PURGE_SQL, [steady] * 5) * 1000:8.2f} ms")
+    print(f"  purge, lot plein   : {timed(con, PURGE_SQL, [backlog] * 5) * 1000:8.2f} ms")
+    print(f"  purge, COUNT 57 %  : {timed(con, 'SELECT COUNT(*) FROM media_archive WHERE timestamp < ?', [backlog[:1]] * 3) * 1000:8.2f} ms")
+    print(f"  album, plan        : {plan(con, ALBUM_SQL, sample[0])}")
+    print(f"  album, lecture     : {timed(con, ALBUM_SQL, sample) * 1e6:8.1f} µs")
+    con.close()
+
+
+async def migrate(path: str) -> float:
+    async with aiosqlite.connect(path) as db:
+        t0 = time.perf_counter()
+        await bot._m3_media_archive_indexes(db)
+        await db.commit()
+        return time.perf_counter() - t0
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=1_000_000)
+    ap.add_argument("--lookups", type=int, default=2000)
+    args = ap.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "archive.db")
+        t0 = time.perf_counter()
+        albums = build(path, args.rows)
+        print(f"{args.rows} lignes, {len(albums)} albums, {DAYS} jours (construction {time.perf_counter() - t0:.1f} s, "
+              f"{os.path.getsize(path) / 1e6:.0f} Mo)")
+        measure(path, "schéma v2 (idx_media_group_id)", albums, args.lookups)
+        print(f"\nmigration v3 : {asyncio.run(migrate(path)):.2f} s")
+        measure(path, "schéma v3 (idx_media_archive_ts + idx_media_archive_album)", albums, args.lookups)
+
+
+if __name__ == "__main__":
+    main()
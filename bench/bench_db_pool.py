@@ -0,0 +1,86 @@
+"""
+Micro-benchmark du pool SQLite (DBPool) contre l'ancien schéma « une connexion aiosqlite par appel ».
+
+Chaque « message » reproduit le travail base de données d'un message entrant :
+lecture du mute, événement stats + compteur, archive du média.
+
+    python bench/bench_db_pool.py [--messages 2000] [--concurrency 50]
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+TMP = tempfile.mkdtemp(prefix="afbot-bench-")
+os.environ.setdefault("BOT_TOKEN", "123:bench")
+os.environ["DB_PATH"] = os.path.join(TMP, "bench.db")
+
+import aiosqlite  # noqa: E402
+import bot  # noqa: E402
+
+SQL_MUTE = "SELECT mute_until_ts FROM muted_users WHERE user_id = ?"
+SQL_EVENT = "INSERT INTO stats_events (event_type, ts, meta) VALUES ('message', ?, NULL)"
+SQL_COUNTER = "INSERT INTO counters (key, value) VALUES ('messages_total', 1) ON CONFLICT(key) DO UPDATE SET value = value + 1"
+SQL_ARCHIVE = "INSERT INTO media_archive (message_id, chat_id, media_group_id, timestamp) VALUES (?, ?, NULL, ?)"
+
+
+async def message_per_call(path: str, i: int):
+    # Avant : aiosqlite.connect() (nouveau thread + nouveau handle) à chaque accès
+    async with aiosqlite.connect(path) as db:
+        async with db.execute(SQL_MUTE, (i,)) as cur:
+            await cur.fetchone()
+    async with aiosqlite.connect(path) as db:
+        await db.execute(SQL_EVENT, (int(time.time()),))
+        await db.execute(SQL_COUNTER)
+        await db.commit()
+    async with aiosqlite.connect(path) as db:
+        await db.execute(SQL_ARCHIVE, (i, -1, int(time.time())))
+        await db.commit()
+
+
+async def message_pooled(i: int):
+    async with bot.DB.read() as db:
+        async with db.execute(SQL_MUTE, (i,)) as cur:
+            await cur.fetchone()
+    async with bot.DB.write() as db:
+        await db.execute(SQL_EVENT, (int(time.time()),))
+        await db.execute(SQL_COUNTER)
+    async with bot.DB.write() as db:
+        await db.execute(SQL_ARCHIVE, (i, -2, int(time.time())))
+
+
+async def run(fn, messages: int, concurrency: int) -> float:
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with sem:
+            await fn(i)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(messages)))
+    return messages / (time.perf_counter() - t0)
+
+
+async def main(messages: int, concurrency: int):
+    await bot.init_db()
+    try:
+        before = await run(lambda i: message_per_call(bot.DB_NAME, i), messages, concurrency)
+        after = await run(message_pooled, messages, concurrency)
+    finally:
+        await bot.DB.close()
+        shutil.rmtree(TMP, ignore_errors=True)
+    print(f"{messages} messages, {concurrency} en parallèle")
+    print(f"  connexion par appel : {before:8.0f} msg/s")
+    print(f"  pool DBPool         : {after:8.0f} msg/s  (x{after / before:.1f})")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--messages", type=int, default=2000)
+    ap.add_argument("--concurrency", type=int, default=50)
+    args = ap.parse_args()
+    asyncio.run(main(args.messages, args.concurrency))
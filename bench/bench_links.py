@@ -0,0 +1,74 @@
+"""
+Débit du moteur de liens (LINK_ENGINE) en messages/seconde, sur un mélange réaliste du groupe public :
+texte ordinaire, légendes, liens autorisés, liens externes avec entités Telegram, formes obfusquées.
+
+    python bench/bench_links.py [--messages 50000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("BOT_TOKEN", "123:bench")
+
+from telegram import Message  # noqa: E402
+
+import bot  # noqa: E402
+
+PLAIN = [
+    "Accident sur l'A7 à hauteur de Montélimar, prudence",
+    "Radar mobile après Valence, voiture banalisée",
+    "Paris.De nombreux bouchons ce matin",
+    "Bouchon de 8 km sur le périph, ça roule pas",
+    "Merci pour l'info 👍",
+    "Contrôle de gendarmerie à la sortie 15 (direction Lyon)",
+    "Quelqu'un sait si l'A75 est dégagée ? Il neige à St-Flour.",
+]
+LINKS = [
+    "Tout est sur t.me/accidentsfr",
+    "Promo ici : spam[.]xyz/offre",
+    "gagne de l'argent hxxps://evil.io/x",
+    "viens sur t .me/arnaque",
+]
+ENTITY_LINKS = ["https://spam.example.com/x", "www.casino.ru", "t.me/+AbCdEf"]
+
+
+def make_messages(n: int) -> list:
+    rnd = random.Random(1)
+    out = []
+    for i in range(n):
+        r = rnd.random()
+        data = {"message_id": i, "date": 0, "chat": {"id": bot.PUBLIC_GROUP_ID, "type": "supergroup"}}
+        if r < 0.85:
+            data["text"] = rnd.choice(PLAIN)
+        elif r < 0.95:
+            data["text"] = rnd.choice(LINKS)
+        else:
+            url = rnd.choice(ENTITY_LINKS)
+            data["text"] = f"regarde {url} vite"
+            data["entities"] = [{"type": "url", "offset": 8, "length": len(url)}]
+        out.append(Message.de_json(data, None))
+    return out
+
+
+def main(n: int):
+    messages = make_messages(n)
+    texts = [m.text for m in messages]
+    t0 = time.perf_counter()
+    blocked = sum(bot.LINK_ENGINE.check(m).blocked for m in messages)
+    t_msg = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for t in texts:
+        bot.LINK_ENGINE.check_text(t)
+    t_text = time.perf_counter() - t0
+    print(f"{n} messages ({blocked} bloqués)")
+    print(f"  check(message)  : {n / t_msg:10.0f} msg/s  ({t_msg / n * 1e6:.1f} µs/msg)")
+    print(f"  check_text seul : {n / t_text:10.0f} msg/s  ({t_text / n * 1e6:.1f} µs/msg)")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--messages", type=int, default=50000)
+    main(ap.parse_args().messages)
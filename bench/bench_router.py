@@ -0,0 +1,80 @@
+"""
+Benchmark du routage des topics : anciennes recherches `any(word in text)` (deux listes, ~80 scans)
+contre le classifieur compilé TOPIC_ROUTER (un seul passage).
+
+Corpus : bench/captions_fr.tsv (légendes étiquetées), plus les légendes d'une base existante avec --db.
+
+    python bench/bench_router.py [--db bot_storage.db] [--repeat 300]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+os.environ.setdefault("BOT_TOKEN", "123:bench")
+
+import bot  # noqa: E402
+
+
+def legacy_route(text: str):
+    # Règle d'origine (on_button_click / handle_deplacer_*) : première liste qui contient un mot-clé
+    text_lower = (text or "").lower()
+    if any(word in text_lower for word in bot.accident_keywords):
+        return bot.PUBLIC_TOPIC_VIDEOS_ID
+    if any(word in text_lower for word in bot.radar_keywords):
+        return bot.PUBLIC_TOPIC_RADARS_ID
+    return bot.PUBLIC_TOPIC_GENERAL_ID
+
+
+def load_corpus(path: str = os.path.join(HERE, "captions_fr.tsv")) -> list:
+    """[(topic attendu, légende)] depuis le TSV du dépôt."""
+    rows = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip() and not line.startswith("#"):
+                topic, caption = line.rstrip("\n").split("\t", 1)
+                rows.append((topic, caption))
+    return rows
+
+
+def load_db_captions(db_path: str) -> list:
+    con = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        return [c for (c,) in con.execute("SELECT caption FROM media_archive WHERE caption <> ''")]
+    finally:
+        con.close()
+
+
+def bench(fn, captions: list, repeat: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for c in captions:
+            fn(c)
+    return (time.perf_counter() - t0) / (repeat * len(captions)) * 1e6
+
+
+def accuracy(fn, corpus: list) -> float:
+    return sum(bot._topic_name(fn(c)) == topic for topic, c in corpus) / len(corpus)
+
+
+def main(db_path: str | None, repeat: int):
+    corpus = load_corpus()
+    captions = [c for _, c in corpus] + (load_db_captions(db_path) if db_path else [])
+    current = lambda text: bot.TOPIC_ROUTER.classify(text).thread_id  # noqa: E731
+    t_old = bench(legacy_route, captions, repeat)
+    t_new = bench(current, captions, repeat)
+    print(f"{len(captions)} légendes x {repeat}")
+    print(f"  any() x2 (ancien)   : {t_old:6.2f} µs/légende   exactitude {accuracy(legacy_route, corpus):.1%}")
+    print(f"  TOPIC_ROUTER        : {t_new:6.2f} µs/légende   exactitude {accuracy(current, corpus):.1%}"
+          f"   (x{t_old / t_new:.1f})")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--db", help="base SQLite dont les légendes media_archive s'ajoutent au corpus")
+    ap.add_argument("--repeat", type=int, default=300)
+    args = ap.parse_args()
+    main(args.db, args.repeat)
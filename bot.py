@@ -1,11 +1,25 @@
 import os
 import time
-import threading
 import asyncio
 import json
+import sys
+import signal
+import bisect
+import functools
+import html
+import heapq
+import hashlib
+import hmac
+import math
+from collections import Counter, OrderedDict, deque
+import contextvars
+import re
+import unicodedata
 import aiosqlite
-import requests
-from flask import Flask
+from contextlib import asynccontextmanager, contextmanager
+from typing import NamedTuple
+import httpx
+from aiohttp import web
 from telegram import (
     Update, InlineKeyboardButton, InlineKeyboardMarkup,
     InputMediaPhoto, InputMediaVideo, ChatPermissions
@@ -13,9 +27,10 @@ from telegram import (
 from telegram.constants import ParseMode
 from telegram.ext import (
     ApplicationBuilder, Application, MessageHandler,
-    CallbackQueryHandler, ContextTypes, filters, CommandHandler
+    CallbackQueryHandler, ContextTypes, filters, CommandHandler,
+    BaseRateLimiter, BaseUpdateProcessor
 )
-from telegram.error import Forbidden, BadRequest
+from telegram.error import Forbidden, BadRequest, RetryAfter
 
 # =========================
 # UPTIME / CONFIG
@@ -29,9 +44,29 @@ PUBLIC_GROUP_ID = int(os.getenv("PUBLIC_GROUP_ID", "-1003245719893"))
 PORT = int(os.getenv("PORT", "10000"))
 KEEP_ALIVE_URL = os.getenv("KEEP_ALIVE_URL", "https://accidentsfrancebot.onrender.com")
 
+# Mode webhook : si WEBHOOK_URL est défini, Telegram pousse les updates sur WEBHOOK_URL + WEBHOOK_PATH
+# (plus de polling ni d'auto-ping). Sinon : polling, comme avant.
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "").rstrip("/")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or hashlib.sha256(f"webhook:{BOT_TOKEN}".encode()).hexdigest()
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org/bot")  # fake-telegram : http://127.0.0.1:8081/bot
+
 DB_NAME = os.getenv("DB_PATH", "bot_storage.db")
+DB_READERS = int(os.getenv("DB_READERS", "3"))
+DB_MMAP_SIZE = 64 * 1024 * 1024      # 64 Mo
+DB_CACHE_SIZE_KB = 8 * 1024          # 8 Mo / connexion
+DB_BUSY_TIMEOUT_MS = 5000
+
+# Écritures différées (stats, compteurs, archive médias)
+WB_FLUSH_INTERVAL_SEC = float(os.getenv("WB_FLUSH_INTERVAL_SEC", "2"))  # fenêtre de durabilité max
+WB_FLUSH_BATCH = int(os.getenv("WB_FLUSH_BATCH", "200"))                 # flush anticipé au-delà
+WB_MAX_ROWS = int(os.getenv("WB_MAX_ROWS", "50000"))                     # lignes gardées si la BDD refuse
 
 SPAM_COOLDOWN = 4
+SPAM_BURST = int(os.getenv("SPAM_BURST", "1"))          # messages tolérés d'affilée avant le cooldown
+SPAM_STRIKE_WINDOW_SEC = 10
+RATE_LRU_CAPACITY = int(os.getenv("RATE_LRU_CAPACITY", "50000"))  # utilisateurs suivis au max
 MUTE_THRESHOLD = 3
 MUTE_DURATION_SEC = 300
 MUTE_DURATION_SPAM_SUBMISSION = 3600  # 1h
@@ -40,6 +75,50 @@ CLEAN_MAX_AGE_PENDING = 3600 * 24
 CLEAN_MAX_AGE_ALBUMS = 60
 CLEAN_MAX_AGE_SPAM = 3600
 CLEAN_MAX_AGE_ARCHIVE = 3600 * 24 * 3  # 3j
+CLEAN_MAX_AGE_FORWARDED = 3600
+
+# Maintenance BDD : suppressions par lots, le verrou d'écriture est rendu entre deux lots
+MAINT_BATCH_ROWS = 500
+MAINT_BATCH_PAUSE_SEC = 0.05
+MAINT_VACUUM_PAGES = 2000
+
+# Statistiques : événements bruts conservés N jours, agrégats horaires (stats_rollup) bien plus longtemps
+STATS_RAW_RETENTION_DAYS = int(os.getenv("STATS_RAW_RETENTION_DAYS", "14"))
+STATS_ROLLUP_RETENTION_DAYS = int(os.getenv("STATS_ROLLUP_RETENTION_DAYS", "400"))
+DASHBOARD_TTL_SEC = float(os.getenv("DASHBOARD_TTL_SEC", "15"))          # instantané servi tel quel
+DASHBOARD_MAX_STALE_SEC = float(os.getenv("DASHBOARD_MAX_STALE_SEC", "120"))  # au-delà : collecte bloquante
+
+# Métriques (/metrics) et profilage (/perf)
+LOOP_LAG_INTERVAL_SEC = 0.5
+SLOW_HANDLER_SEC = float(os.getenv("SLOW_HANDLER_SEC", "1.0"))      # handler signalé comme lent au-delà
+PERF_SAMPLE_STACKS = os.getenv("PERF_SAMPLE_STACKS", "1") == "1"     # pile capturée quand un handler dépasse le seuil
+PERF_WINDOW_MIN = 60
+PERF_TOP_N = 5
+
+# Afflux dans le groupe public -> verrouillage auto
+FLOOD_CHAT_MSGS = int(os.getenv("FLOOD_CHAT_MSGS", "40"))            # messages…
+FLOOD_WINDOW_SEC = float(os.getenv("FLOOD_WINDOW_SEC", "10"))        # …dans cette fenêtre
+FLOOD_AUTOLOCK = os.getenv("FLOOD_AUTOLOCK", "1") == "1"
+FLOOD_AUTOUNLOCK_SEC = int(os.getenv("FLOOD_AUTOUNLOCK_SEC", "900"))  # 0 = déverrouillage manuel (/unlock)
+
+# Mode raid : arrivées massives ou spam venant de nombreux comptes
+RAID_WINDOW_SEC = float(os.getenv("RAID_WINDOW_SEC", "60"))
+RAID_JOIN_THRESHOLD = int(os.getenv("RAID_JOIN_THRESHOLD", "15"))       # arrivées dans la fenêtre
+RAID_SPAMMER_THRESHOLD = int(os.getenv("RAID_SPAMMER_THRESHOLD", "5"))  # spammeurs distincts dans la fenêtre
+RAID_NEWCOMER_SEC = float(os.getenv("RAID_NEWCOMER_SEC", "600"))       # arrivé depuis moins : compte pour un raid
+RAID_QUIET_SEC = 120            # fin du raid après ce délai sans activité suspecte
+RAID_FLUSH_SEC = 1.0            # suppressions groupées (deleteMessages) à ce rythme
+
+ALBUM_QUIET_SEC = float(os.getenv("ALBUM_QUIET_SEC", "2.5"))  # silence avant de clôturer un album
+ALBUM_MAX_ITEMS = 10
+ALBUM_INSERT_ATTEMPTS = 3       # essais d'enregistrement d'un album avant abandon (avec message d'erreur)
+
+# --- Envoi vers le groupe admin ---
+REVIEW_WORKERS = int(os.getenv("REVIEW_WORKERS", "3"))
+UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", "64"))  # updates traités en parallèle (ordre garanti par clé)
+TG_GLOBAL_MSG_PER_SEC = 30        # limite Bot API, tous chats confondus
+TG_GROUP_MSG_PER_MIN = 20         # limite Bot API dans un même groupe
+TG_PRIVATE_MSG_PER_SEC = 1        # limite Bot API dans un même chat privé
 
 POLL_INTERVAL = 2.0
 POLL_TIMEOUT = 30
@@ -57,6 +136,10 @@ PUBLIC_TOPIC_GENERAL_ID = None
 # --- Anti-spam notifications admin ---
 ADMIN_NOTIFY_COOLDOWN_SEC = 300
 HEARTBEAT_ALERT_COOLDOWN_SEC = 300
+HEARTBEAT_INTERVAL_SEC = 45
+HEARTBEAT_MAX_FAILURES = 3
+HEALTH_MAX_GET_ME_AGE_SEC = HEARTBEAT_INTERVAL_SEC * HEARTBEAT_MAX_FAILURES + 15  # /healthz -> 503 au-delà
+KEEP_ALIVE_INTERVAL_SEC = 600
 _last_admin_notify_ts = 0.0
 _last_heartbeat_alert_ts = 0.0
 
@@ -90,14 +173,808 @@ radar_keywords = [
     "alcoolémie", "radar mobile nouvelle génération", "radar en travaux"
 ]
 
+# =========================
+# ROUTAGE DES TOPICS (score pondéré)
+# =========================
+_TOPIC_ACCIDENT = 1
+_TOPIC_RADAR = 2
+_TOPIC_NEGATION = 4
+_APOSTROPHES = str.maketrans({"\u2019": "'", "\u2018": "'", "\u02bc": "'"})
+_COMBINING_RE = re.compile("[\u0300-\u036f]")
+_WORD_RE = re.compile(r"\w+")
+
+# Poids par défaut = nombre de mots du mot-clé (une expression pèse plus qu'un mot seul).
+# Mots ambigus (vus dans les deux types de vidéos) : poids réduit.
+KEYWORD_WEIGHTS = {
+    "impact": 0.5, "choc": 0.75, "frotter": 0.5,
+    "police": 0.5, "gendarmerie": 0.5, "piege": 0.5,
+    "flash": 0.75, "laser": 0.75, "controle": 0.75,
+}
+NEGATION_MARKERS = ("pas de ", "pas d'", "pas un ", "pas une ", "aucun ", "aucune ", "sans ", "ni ", "jamais de ")
+ROUTER_MIN_SCORE = 0.5              # en dessous : topic général (un mot-clé, même ambigu, suffit)
+ROUTER_CONFIDENT_SCORE = 3.0        # score à partir duquel la confiance n'est plus limitée
+TOPIC_OVERRIDES_MAX = int(os.getenv("TOPIC_OVERRIDES_MAX", "20000"))
+
+
+def fold_text(text: str) -> str:
+    """Minuscules, apostrophes droites, sans accents : 'Contrôle' -> 'controle'."""
+    text = (text or "").casefold()
+    if text.isascii():
+        return text
+    return _COMBINING_RE.sub("", unicodedata.normalize("NFKD", text.translate(_APOSTROPHES)))
+
+
+def caption_key(text: str, *, folded: bool = False) -> str:
+    """Clé de légende pour le cache de corrections : mots normalisés, ponctuation ignorée."""
+    return " ".join(_WORD_RE.findall(text if folded else fold_text(text)))[:512]
+
+
+def _trie_pattern(words) -> str:
+    """Alternance factorisée en trie : peu de branches testées par position."""
+    trie = {}
+    for w in words:
+        node = trie
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def build(node) -> str:
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+
+class TopicMatch(NamedTuple):
+    thread_id: int | None
+    keywords: tuple = ()
+    score: float = 0.0
+    confidence: float = 0.0
+    source: str = "rules"       # rules | fallback | override | admin
+
+
+class TopicRouter:
+    """
+    Routage vers un topic public en un seul passage sur le texte (regex compilée une fois).
+    Chaque catégorie cumule le poids de ses mots-clés ; une négation n'annule que le mot-clé
+    qui la suit immédiatement ("pas de radar", "sans accident" ; pas "pas de blessé dans l'accident").
+    Mots entiers seulement (pluriel / féminin tolérés) : "chocolat" ne contient pas "choc".
+    Égalité : accident > radar.
+    """
+
+    def __init__(self, accident_words, radar_words, weights=None, negations=NEGATION_MARKERS):
+        weights = {fold_text(k): w for k, w in (weights or {}).items()}
+        flags = {}
+        for words, flag in ((accident_words, _TOPIC_ACCIDENT), (radar_words, _TOPIC_RADAR)):
+            for w in words:
+                k = fold_text(w).strip()
+                if k:
+                    flags[k] = flags.get(k, 0) | flag
+        # La regex ne rend que le mot-clé le plus long à chaque position :
+        # il hérite donc des catégories de ses préfixes ("radar mobile" ⊃ "radar").
+        self._flags = {k: self._inherit(k, flags) for k in flags}
+        self._weights = {k: weights.get(k, float(len(k.split()))) for k in flags}
+        for n in negations:
+            self._flags[fold_text(n)] = _TOPIC_NEGATION
+        # Début de mot, mot-clé, terminaison -e/-s facultative, puis fin de mot
+        # (sauf marqueurs finissant par une espace ou une apostrophe : "pas d'").
+        self._regex = re.compile(r"\b(" + _trie_pattern(self._flags) + r")(?:e?s?)(?:(?<!\w)|(?!\w))")
+
+    @staticmethod
+    def _inherit(keyword: str, flags: dict) -> int:
+        out = 0
+        for other, f in flags.items():
+            if keyword.startswith(other):
+                out |= f
+        return out
+
+    def classify(self, text: str) -> TopicMatch:
+        return self.classify_folded(fold_text(text))
+
+    def classify_folded(self, folded: str) -> TopicMatch:
+        acc = radar = 0.0
+        found = {}
+        neg_end = -1
+        for m in self._regex.finditer(folded):
+            kw = m.group(1)
+            flags = self._flags[kw]
+            if flags & _TOPIC_NEGATION:
+                neg_end = m.end(1)
+                continue
+            negated = neg_end >= 0 and not folded[neg_end:m.start()].strip()
+            neg_end = -1
+            if negated:
+                continue
+            w = self._weights[kw]
+            if flags & _TOPIC_ACCIDENT:
+                acc += w
+            if flags & _TOPIC_RADAR:
+                radar += w
+            found[kw] = None
+
+        best, second = (acc, radar) if acc >= radar else (radar, acc)
+        if best < ROUTER_MIN_SCORE:
+            return TopicMatch(PUBLIC_TOPIC_GENERAL_ID, tuple(found), best, 0.0, "fallback")
+        confidence = (best - second) / best * min(1.0, best / ROUTER_CONFIDENT_SCORE)
+        thread_id = PUBLIC_TOPIC_VIDEOS_ID if acc >= radar else PUBLIC_TOPIC_RADARS_ID
+        return TopicMatch(thread_id, tuple(found), best, round(confidence, 2), "rules")
+
+
+class TopicOverrides:
+    """Corrections admin (/deplacer <topic>) : légende normalisée -> topic final, consultées avant les règles."""
+
+    def __init__(self, max_entries: int = TOPIC_OVERRIDES_MAX):
+        self.max_entries = max_entries
+        self._map = {}
+
+    def __len__(self):
+        return len(self._map)
+
+    async def load(self):
+        async with DB.read() as db:
+            async with db.execute(
+                "SELECT caption_key, thread_id FROM topic_overrides ORDER BY updated_ts DESC LIMIT ?",
+                (self.max_entries,)
+            ) as cur:
+                rows = await cur.fetchall()
+        self._map = {k: tid for k, tid in reversed(rows)}
+
+    def get(self, key: str):
+        if key and key in self._map:
+            return TopicMatch(self._map[key], (), 0.0, 1.0, "override")
+        return None
+
+    def remember(self, text: str, thread_id):
+        key = caption_key(text)
+        if not key:
+            return
+        self._map.pop(key, None)
+        self._map[key] = thread_id
+        while len(self._map) > self.max_entries:
+            self._map.pop(next(iter(self._map)))
+        WRITE_BEHIND.add(
+            "INSERT OR REPLACE INTO topic_overrides (caption_key, thread_id, updated_ts) VALUES (?, ?, ?)",
+            (key, thread_id, int(time.time()))
+        )
+
+
+TOPIC_ROUTER = TopicRouter(accident_keywords, radar_keywords, KEYWORD_WEIGHTS)
+TOPIC_OVERRIDES = TopicOverrides()
+
+TOPIC_ARGS = {
+    "videos": PUBLIC_TOPIC_VIDEOS_ID, "video": PUBLIC_TOPIC_VIDEOS_ID, "accident": PUBLIC_TOPIC_VIDEOS_ID,
+    "radars": PUBLIC_TOPIC_RADARS_ID, "radar": PUBLIC_TOPIC_RADARS_ID,
+    "general": PUBLIC_TOPIC_GENERAL_ID,
+}
+
+
+def route_topic(text: str) -> TopicMatch:
+    """Cache des corrections admin d'abord, puis score par mots-clés."""
+    folded = fold_text(text)
+    hit = TOPIC_OVERRIDES.get(caption_key(folded, folded=True))
+    return hit or TOPIC_ROUTER.classify_folded(folded)
+
+
+def forced_topic(args):
+    """'/deplacer radars' -> TopicMatch imposé ; None sans argument ; ValueError si topic inconnu."""
+    if not args:
+        return None
+    key = fold_text(args[0]).strip()
+    if key not in TOPIC_ARGS:
+        raise ValueError(key)
+    return TopicMatch(TOPIC_ARGS[key], (), 0.0, 1.0, "admin")
+
+
+def _topic_name(thread_id) -> str:
+    return {PUBLIC_TOPIC_VIDEOS_ID: "videos", PUBLIC_TOPIC_RADARS_ID: "radars"}.get(thread_id, "general")
+
 # =========================
 # ÉTAT EN MÉMOIRE
 # =========================
-LAST_MSG_TIME = {}
-SPAM_COUNT = {}
 TEMP_ALBUMS = {}
-REVIEW_QUEUE = asyncio.Queue()   # globale (simple, fonctionne après redeploy)
-ALREADY_FORWARDED_ALBUMS = set()
+ALREADY_FORWARDED_ALBUMS = {}   # media_group_id -> ts de finalisation
+
+# =========================
+# MÉTRIQUES (format Prometheus)
+# =========================
+METRIC_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRIC_HELP = {
+    "afbot_handler_seconds": ("histogram", "Durée des handlers Telegram"),
+    "afbot_handler_errors_total": ("counter", "Exceptions remontées par les handlers"),
+    "afbot_api_request_seconds": ("histogram", "Durée des appels Bot API (hors attente du limiteur)"),
+    "afbot_api_errors_total": ("counter", "Appels Bot API en erreur (RetryAfter compris)"),
+    "afbot_db_wait_seconds": ("histogram", "Attente d'une connexion SQLite (verrou écrivain / lecteur libre)"),
+    "afbot_db_hold_seconds": ("histogram", "Durée d'un bloc DB.read()/DB.write() (commit compris)"),
+    "afbot_loop_lag_seconds": ("histogram", "Retard de la boucle asyncio"),
+    "afbot_loop_lag_last_seconds": ("gauge", "Dernier retard mesuré de la boucle asyncio"),
+    "afbot_review_queue_depth": ("gauge", "Signalements en file admin (en attente + en cours)"),
+    "afbot_write_behind_pending": ("gauge", "Écritures différées pas encore en base"),
+    "afbot_write_behind_dropped_total": ("counter", "Lignes différées abandonnées (tampon plein, BDD indisponible)"),
+    "afbot_counter_total": ("counter", "Compteurs persistants (table counters)"),
+    "afbot_webhook_updates_total": ("counter", "Requêtes reçues sur le webhook, par issue"),
+    "afbot_network_recovery_seconds": ("histogram", "Durée des reprises de la couche réseau (perte -> reprise)"),
+    "afbot_update_key_wait_seconds": ("histogram", "Attente d'un update derrière un autre de même clé (utilisateur/album/signalement)"),
+    "afbot_updates_inflight": ("gauge", "Updates en cours de traitement"),
+}
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(METRIC_BUCKETS) + 1)  # dernier seau : +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(METRIC_BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _metric_escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _metric_labels(labels: tuple, le=None) -> str:
+    parts = [f'{k}="{_metric_escape(v)}"' for k, v in labels]
+    if le is not None:
+        parts.append(f'le="{le}"')
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Metrics:
+    """
+    Instrumentation légère : histogrammes / compteurs / jauges en mémoire, indexés par
+    (nom, labels) où labels est un tuple de paires précalculé par l'appelant.
+    Coût sur le chemin chaud : une recherche de dict + un bisect. Lu et écrit uniquement
+    depuis la boucle du bot (/metrics est servi par HTTP_SERVER sur cette même boucle).
+    """
+
+    def __init__(self):
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+
+    def observe(self, name: str, value: float, labels: tuple = ()):
+        h = self.histograms.get((name, labels))
+        if h is None:
+            h = self.histograms[(name, labels)] = Histogram()
+        h.observe(value)
+
+    def inc(self, name: str, labels: tuple = (), delta: float = 1):
+        key = (name, labels)
+        self.counters[key] = self.counters.get(key, 0) + delta
+
+    def set(self, name: str, value: float, labels: tuple = ()):
+        self.gauges[(name, labels)] = value
+
+    def render(self) -> str:
+        """Format texte Prometheus 0.0.4 (seaux cumulés, +Inf, _sum, _count)."""
+        by_name = {}
+        for (name, labels), v in self.counters.items():
+            by_name.setdefault(name, []).append(("c", labels, v))
+        for (name, labels), v in self.gauges.items():
+            by_name.setdefault(name, []).append(("g", labels, v))
+        for (name, labels), h in self.histograms.items():
+            by_name.setdefault(name, []).append(("h", labels, h))
+        out = []
+        for name in sorted(by_name):
+            kind, help_text = METRIC_HELP.get(name, ("untyped", name))
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} {kind}")
+            for typ, labels, v in sorted(by_name[name], key=lambda it: it[1]):
+                if typ != "h":
+                    out.append(f"{name}{_metric_labels(labels)} {v}")
+                    continue
+                cumulative = 0
+                for bound, n in zip(METRIC_BUCKETS + ("+Inf",), v.counts):
+                    cumulative += n
+                    out.append(f"{name}_bucket{_metric_labels(labels, bound)} {cumulative}")
+                out.append(f"{name}_sum{_metric_labels(labels)} {v.sum}")
+                out.append(f"{name}_count{_metric_labels(labels)} {v.count}")
+        return "\n".join(out) + "\n"
+
+METRICS = Metrics()
+
+_DB_READ = (("mode", "read"),)
+_DB_WRITE = (("mode", "write"),)
+
+
+# ==== Profilage : agrégats glissants par minute (handlers, SQL, boucle) ====
+class PerfWindow:
+    """Par clé et par minute : [appels, durée totale, durée max] ; PERF_WINDOW_MIN minutes conservées."""
+
+    def __init__(self, minutes: int = PERF_WINDOW_MIN):
+        self.minutes = minutes
+        self._buckets = deque()     # (minute, {clé: [n, total, max]})
+
+    def record(self, key: str, dur: float):
+        minute = int(time.time() // 60)
+        if not self._buckets or self._buckets[-1][0] != minute:
+            self._buckets.append((minute, {}))
+            while self._buckets[0][0] <= minute - self.minutes:
+                self._buckets.popleft()
+        agg = self._buckets[-1][1].get(key)
+        if agg is None:
+            self._buckets[-1][1][key] = [1, dur, dur]
+            return
+        agg[0] += 1
+        agg[1] += dur
+        if dur > agg[2]:
+            agg[2] = dur
+
+    def totals(self) -> dict:
+        since = int(time.time() // 60) - self.minutes
+        out = {}
+        for minute, keys in self._buckets:
+            if minute <= since:
+                continue
+            for key, (n, total, mx) in keys.items():
+                agg = out.setdefault(key, [0, 0.0, 0.0])
+                agg[0] += n
+                agg[1] += total
+                agg[2] = max(agg[2], mx)
+        return out
+
+    def top(self, n: int) -> list:
+        """[(clé, appels, moyenne, max)] triés par durée max décroissante."""
+        rows = [(key, cnt, total / cnt, mx) for key, (cnt, total, mx) in self.totals().items()]
+        return sorted(rows, key=lambda r: r[3], reverse=True)[:n]
+
+
+def _await_chain(task: asyncio.Task, depth: int = 6) -> str:
+    """Où la tâche est suspendue : chaîne cr_await des coroutines, les `depth` plus profondes."""
+    frames = []
+    coro = task.get_coro()
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is not None:
+            frames.append(f"{frame.f_code.co_name}:{frame.f_lineno}")
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return " > ".join(frames[-depth:]) or "?"
+
+
+class Profiler:
+    def __init__(self):
+        self.handlers = PerfWindow()
+        self.sql = PerfWindow()
+        self.loop_lag = PerfWindow()
+        self.slow = deque(maxlen=20)    # (ts, handler, durée, pile échantillonnée ou None)
+
+    def handler_done(self, name: str, dur: float, stack: str | None):
+        self.handlers.record(name, dur)
+        if dur >= SLOW_HANDLER_SEC:
+            self.slow.append((_now(), name, dur, stack))
+            print(f"[SLOW] {name} {dur:.2f}s" + (f" @ {stack}" if stack else ""))
+
+PROFILER = Profiler()
+
+
+def timed_handler(fn):
+    """Enveloppe un callback PTB : durée et exceptions par handler (nom de la fonction).
+
+    Au-delà de SLOW_HANDLER_SEC, l'appel est journalisé ; si PERF_SAMPLE_STACKS, un
+    call_later capture à ce moment l'endroit où la tâche attend (appel API, verrou BDD…).
+    """
+    name = fn.__name__
+    labels = (("handler", name),)
+
+    @functools.wraps(fn)
+    async def wrapper(update, context):
+        sampled = []
+        probe = None
+        if PERF_SAMPLE_STACKS:
+            task = asyncio.current_task()
+            probe = asyncio.get_running_loop().call_later(
+                SLOW_HANDLER_SEC, lambda: sampled.append(_await_chain(task))
+            )
+        t0 = time.perf_counter()
+        try:
+            return await fn(update, context)
+        except Exception:
+            METRICS.inc("afbot_handler_errors_total", labels)
+            raise
+        finally:
+            dur = time.perf_counter() - t0
+            if probe is not None:
+                probe.cancel()
+            METRICS.observe("afbot_handler_seconds", dur, labels)
+            PROFILER.handler_done(name, dur, sampled[0] if sampled else None)
+    return wrapper
+
+
+def instrument_handlers(app: Application):
+    for handlers in app.handlers.values():
+        for handler in handlers:
+            handler.callback = timed_handler(handler.callback)
+
+
+async def loop_lag_monitor(interval: float = LOOP_LAG_INTERVAL_SEC):
+    while True:
+        t0 = time.perf_counter()
+        await asyncio.sleep(interval)
+        lag = max(0.0, time.perf_counter() - t0 - interval)
+        METRICS.observe("afbot_loop_lag_seconds", lag)
+        METRICS.set("afbot_loop_lag_last_seconds", lag)
+        PROFILER.loop_lag.record("loop", lag)
+
+# =========================
+# BDD — POOL DE CONNEXIONS
+# =========================
+class _TimedResult:
+    """Résultat de db.execute chronométré ; `await` et `async with` comme l'original aiosqlite.
+    Avec `async with`, la mesure va jusqu'à la sortie du bloc (fetch compris)."""
+    __slots__ = ("_result", "_sql", "_t0", "_cursor")
+
+    def __init__(self, result, sql: str):
+        self._result = result
+        self._sql = sql
+
+    def __await__(self):
+        return self._timed().__await__()
+
+    async def _timed(self):
+        t0 = time.perf_counter()
+        try:
+            return await self._result
+        finally:
+            PROFILER.sql.record(self._sql, time.perf_counter() - t0)
+
+    async def __aenter__(self):
+        self._t0 = time.perf_counter()
+        self._cursor = await self._result
+        return self._cursor
+
+    async def __aexit__(self, *exc):
+        try:
+            await self._cursor.close()
+        finally:
+            PROFILER.sql.record(self._sql, time.perf_counter() - self._t0)
+
+
+class _TimedConnection:
+    """Connexion aiosqlite dont execute/executemany alimentent PROFILER.sql (clé = SQL compacté)."""
+    __slots__ = ("_db", "_on_commit")
+
+    def __init__(self, db):
+        self._db = db
+        self._on_commit = []
+
+    def after_commit(self, fn):
+        """Appelle fn() une fois la transaction DB.write() validée (jamais en cas de rollback)."""
+        self._on_commit.append(fn)
+
+    def __getattr__(self, name):
+        return getattr(self._db, name)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=512)
+    def _key(sql: str) -> str:
+        return " ".join(sql.split())[:120]
+
+    def execute(self, sql: str, parameters=None):
+        return _TimedResult(self._db.execute(sql, parameters), self._key(sql))
+
+    def executemany(self, sql: str, parameters):
+        return _TimedResult(self._db.executemany(sql, parameters), self._key(sql))
+
+
+class DBPool:
+    """Connexions SQLite longue durée : 1 écrivain (sérialisé) + N lecteurs (WAL).
+
+    - `async with DB.write() as db:` → transaction exclusive, commit auto (rollback si erreur).
+    - `async with DB.read() as db:` → connexion lecture seule empruntée au pool.
+    Ne jamais garder un bloc `write()` ouvert pendant un appel à l'API Telegram.
+    """
+
+    def __init__(self, path: str, readers: int = DB_READERS):
+        self.path = path
+        self.readers_count = max(1, readers)
+        self._writer = None
+        self._all_readers = []
+        self._write_lock = None
+        self._readers = None
+        self._loop = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._writer is not None
+
+    async def _connect(self, readonly: bool = False):
+        db = await aiosqlite.connect(self.path)
+        await db.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+        await db.execute("PRAGMA synchronous=NORMAL")
+        await db.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
+        await db.execute(f"PRAGMA cache_size=-{DB_CACHE_SIZE_KB}")
+        await db.execute("PRAGMA temp_store=MEMORY")
+        if readonly:
+            await db.execute("PRAGMA query_only=ON")
+        return db
+
+    def _bind_loop(self):
+        # Lock/Queue asyncio sont liés à une boucle : on les recrée si main() en a changé.
+        # Les connexions aiosqlite (threads) restent valides d'une boucle à l'autre.
+        loop = asyncio.get_running_loop()
+        if loop is self._loop:
+            return
+        self._loop = loop
+        self._write_lock = asyncio.Lock()
+        self._readers = asyncio.Queue()
+        for r in self._all_readers:
+            self._readers.put_nowait(r)
+
+    async def open(self):
+        if self._writer is None:
+            writer = await self._connect()
+            await writer.execute("PRAGMA auto_vacuum=INCREMENTAL")  # effectif sur une base neuve uniquement
+            async with writer.execute("PRAGMA journal_mode=WAL") as cur:
+                mode = (await cur.fetchone())[0]
+            self._all_readers = [await self._connect(readonly=True) for _ in range(self.readers_count)]
+            self._writer = writer
+            self._loop = None
+            print(f"🗃️ Pool SQLite ouvert (journal={mode}, lecteurs={self.readers_count})")
+        self._bind_loop()
+
+    async def close(self):
+        conns = ([self._writer] if self._writer else []) + self._all_readers
+        self._writer, self._all_readers, self._loop = None, [], None
+        for c in conns:
+            try:
+                await c.close()
+            except Exception as e:
+                print(f"[DB CLOSE] {e}")
+
+    @asynccontextmanager
+    async def write(self):
+        await self.open()
+        t0 = time.perf_counter()
+        async with self._write_lock:
+            t1 = time.perf_counter()
+            METRICS.observe("afbot_db_wait_seconds", t1 - t0, _DB_WRITE)
+            db = self._writer
+            conn = _TimedConnection(db)
+            try:
+                yield conn
+                await db.commit()
+            except BaseException:
+                try:
+                    await db.rollback()
+                except Exception as e:
+                    print(f"[DB ROLLBACK] {e}")
+                raise
+            finally:
+                METRICS.observe("afbot_db_hold_seconds", time.perf_counter() - t1, _DB_WRITE)
+        for fn in conn._on_commit:
+            fn()
+
+    @asynccontextmanager
+    async def read(self):
+        await self.open()
+        t0 = time.perf_counter()
+        db = await self._readers.get()
+        t1 = time.perf_counter()
+        METRICS.observe("afbot_db_wait_seconds", t1 - t0, _DB_READ)
+        try:
+            yield _TimedConnection(db)
+        finally:
+            self._readers.put_nowait(db)
+            METRICS.observe("afbot_db_hold_seconds", time.perf_counter() - t1, _DB_READ)
+
+DB = DBPool(DB_NAME)
+
+async def _ensure_column(db, table: str, column: str, decl: str) -> bool:
+    """Ajoute la colonne si elle manque (bases créées par une ancienne version). True si ajoutée."""
+    async with db.execute(f"PRAGMA table_info({table})") as cur:
+        cols = {r[1] for r in await cur.fetchall()}
+    if column in cols:
+        return False
+    await db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+    return True
+
+# =========================
+# BDD — ÉCRITURES DIFFÉRÉES
+# =========================
+class WriteBehind:
+    """Tampon write-behind : regroupe les écritures non critiques en une transaction.
+
+    Les deltas de compteurs et de seaux horaires (stats_rollup) sont sommés en mémoire,
+    les lignes (stats_events, media_archive…) sont regroupées par requête et écrites via executemany.
+    Flush toutes les `interval` s, dès `batch` écritures en attente, et de force
+    à l'arrêt / au redémarrage. En cas d'échec, les données sont remises en tampon ; au-delà de
+    `max_rows` lignes, les plus anciennes sont abandonnées (compteur `dropped`, alerte admin).
+    Compteurs et seaux restent bornés par leur nombre de clés et ne sont jamais abandonnés.
+    """
+
+    def __init__(self, interval: float = WB_FLUSH_INTERVAL_SEC, batch: int = WB_FLUSH_BATCH,
+                 max_rows: int = WB_MAX_ROWS):
+        self.interval = interval
+        self.batch = max(1, batch)
+        self.max_rows = max(1, max_rows)
+        self._counters = {}
+        self._buckets = {}  # (event_type, hour_ts) -> delta
+        self._rows = {}
+        self._pending = 0
+        self._flush_scheduled = False
+        self.stats = {"flushes": 0, "rows": 0, "errors": 0, "dropped": 0,
+                      "last_batch": 0, "last_ms": 0.0, "max_ms": 0.0}
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def inc(self, key: str, delta: int = 1):
+        self._counters[key] = self._counters.get(key, 0) + delta
+        self._touch()
+
+    def bucket(self, event_type: str, ts: int, delta: int = 1):
+        key = (event_type, ts - ts % 3600)
+        self._buckets[key] = self._buckets.get(key, 0) + delta
+        self._touch()
+
+    def add(self, sql: str, params: tuple):
+        self._rows.setdefault(sql, []).append(params)
+        self._touch()
+
+    def _touch(self):
+        self._pending += 1
+        if self._pending >= self.batch and not self._flush_scheduled:
+            self._flush_scheduled = True
+            try:
+                asyncio.get_running_loop().create_task(self.flush())
+            except RuntimeError:
+                self._flush_scheduled = False  # pas de boucle : le prochain flush s'en chargera
+
+    async def flush(self) -> int:
+        self._flush_scheduled = False
+        if not self._pending:
+            return 0
+        # Échange synchrone des tampons : les écritures suivantes partent dans un nouveau lot.
+        counters, buckets, rows, n = self._counters, self._buckets, self._rows, self._pending
+        self._counters, self._buckets, self._rows, self._pending = {}, {}, {}, 0
+        t0 = time.perf_counter()
+        try:
+            async with DB.write() as db:
+                if counters:
+                    await db.executemany(
+                        "INSERT INTO counters(key,value) VALUES(?,?) "
+                        "ON CONFLICT(key) DO UPDATE SET value = value + excluded.value",
+                        list(counters.items())
+                    )
+                for sql, params in rows.items():
+                    await db.executemany(sql, params)
+                if buckets:
+                    await db.executemany(
+                        "INSERT INTO stats_rollup(event_type, hour_ts, count) VALUES(?,?,?) "
+                        "ON CONFLICT(event_type, hour_ts) DO UPDATE SET count = count + excluded.count",
+                        [(et, h, d) for (et, h), d in buckets.items()]
+                    )
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"[WRITE BEHIND] flush de {n} écritures échoué, remis en tampon : {e}")
+            for k, d in counters.items():
+                self._counters[k] = self._counters.get(k, 0) + d
+            for k, d in buckets.items():
+                self._buckets[k] = self._buckets.get(k, 0) + d
+            for sql, params in rows.items():
+                self._rows[sql] = params + self._rows.get(sql, [])
+            self._pending += n
+            dropped = self._trim_rows()
+            if dropped:
+                print(f"[WRITE BEHIND] tampon plein : {dropped} ligne(s) les plus anciennes abandonnées")
+                await notify_admin(
+                    f"⚠️ Écritures différées : BDD indisponible, {self.stats['dropped']} ligne(s) abandonnée(s) "
+                    f"(stats / archive médias)."
+                )
+            return 0
+        ms = (time.perf_counter() - t0) * 1000
+        st = self.stats
+        st["flushes"] += 1
+        st["rows"] += n
+        st["last_batch"] = n
+        st["last_ms"] = ms
+        st["max_ms"] = max(st["max_ms"], ms)
+        return n
+
+    def _trim_rows(self) -> int:
+        """Ramène les lignes en tampon à `max_rows` en retirant les plus anciennes de chaque requête, au prorata."""
+        total = sum(len(params) for params in self._rows.values())
+        excess = total - self.max_rows
+        if excess <= 0:
+            return 0
+        dropped = 0
+        for sql, params in list(self._rows.items()):
+            cut = min(len(params), -(-excess * len(params) // total), excess - dropped)
+            if cut:
+                self._rows[sql] = params[cut:]
+                dropped += cut
+            if not self._rows[sql]:
+                del self._rows[sql]
+        self._pending -= dropped
+        self.stats["dropped"] += dropped
+        METRICS.inc("afbot_write_behind_dropped_total", delta=dropped)
+        return dropped
+
+async def write_behind_loop():
+    print("🧾 Write-behind démarré")
+    while True:
+        await asyncio.sleep(WRITE_BEHIND.interval)
+        try:
+            await WRITE_BEHIND.flush()
+        except Exception as e:
+            print(f"[WRITE BEHIND LOOP] {e}")
+
+WRITE_BEHIND = WriteBehind()
+
+# =========================
+# MUTES MP — INDEX MÉMOIRE
+# =========================
+class MuteIndex:
+    """
+    Miroir mémoire de muted_users : user_id -> fin du mute, plus un tas d'expirations.
+    Chargé au démarrage, mis à jour en écriture directe (write-through, après commit) ;
+    le contrôle sur chaque MP ne touche plus la base.
+    """
+
+    def __init__(self):
+        self._until = {}
+        self._heap = []     # (mute_until_ts, user_id) ; entrées périmées ignorées à l'éviction
+
+    def __len__(self):
+        self.evict()
+        return len(self._until)
+
+    async def load(self):
+        async with DB.read() as db:
+            async with db.execute(
+                "SELECT user_id, mute_until_ts FROM muted_users WHERE mute_until_ts > ?", (int(_now()),)
+            ) as cur:
+                rows = await cur.fetchall()
+        self._until = {uid: until for uid, until in rows}
+        self._heap = [(until, uid) for uid, until in rows]
+        heapq.heapify(self._heap)
+
+    def remaining(self, user_id: int) -> int:
+        """Secondes de mute restantes (0 si non muté)."""
+        until = self._until.get(user_id)
+        if until is None:
+            return 0
+        now = int(_now())
+        if until > now:
+            return until - now
+        self.evict(now)
+        return 0
+
+    async def mute(self, db, user_id: int, until_ts: int):
+        """À appeler dans une transaction DB.write() : le miroir n'est mis à jour qu'après le commit."""
+        await db.execute(
+            "INSERT OR REPLACE INTO muted_users (user_id, mute_until_ts) VALUES (?, ?)",
+            (user_id, until_ts)
+        )
+        db.after_commit(lambda: self._apply(user_id, until_ts))
+
+    def _apply(self, user_id: int, until_ts: int):
+        self._until[user_id] = until_ts
+        heapq.heappush(self._heap, (until_ts, user_id))
+
+    def evict(self, now: int | None = None) -> int:
+        now = int(_now()) if now is None else now
+        n = 0
+        while self._heap and self._heap[0][0] <= now:
+            until, uid = heapq.heappop(self._heap)
+            if self._until.get(uid) == until:
+                del self._until[uid]
+                WRITE_BEHIND.add(
+                    "DELETE FROM muted_users WHERE user_id = ? AND mute_until_ts <= ?", (uid, until)
+                )
+                n += 1
+        return n
+
+MUTE_INDEX = MuteIndex()
 
 # =========================
 # BDD
@@ -105,14 +982,17 @@ ALREADY_FORWARDED_ALBUMS = set()
 async def init_db():
     print("🗃️ Init SQLite…")
     try:
-        async with aiosqlite.connect(DB_NAME) as db:
+        async with DB.write() as db:
             await db.execute("""
                 CREATE TABLE IF NOT EXISTS pending_reports (
                     report_id TEXT PRIMARY KEY,
                     text TEXT,
                     files_json TEXT,
                     created_ts INTEGER,
-                    user_name TEXT
+                    user_name TEXT,
+                    preview_text TEXT,
+                    delivery_state TEXT NOT NULL DEFAULT 'queued',
+                    delivery_gen INTEGER NOT NULL DEFAULT 0
                 )
             """)
             await db.execute("""
@@ -137,13 +1017,10 @@ async def init_db():
                     file_type TEXT,
                     caption TEXT,
                     timestamp INTEGER,
+                    thread_id INTEGER,
                     PRIMARY KEY (message_id, chat_id)
                 )
             """)
-            await db.execute("""
-                CREATE INDEX IF NOT EXISTS idx_media_group_id
-                ON media_archive (media_group_id, chat_id);
-            """)
             await db.execute("""
                 CREATE TABLE IF NOT EXISTS admin_outbox (
                     report_id TEXT,
@@ -151,6 +1028,25 @@ async def init_db():
                     PRIMARY KEY (report_id, message_id)
                 )
             """)
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS scheduled_deletions (
+                    chat_id INTEGER,
+                    message_id INTEGER,
+                    due_ts REAL,
+                    PRIMARY KEY (chat_id, message_id)
+                )
+            """)
+            await db.execute("""
+                CREATE INDEX IF NOT EXISTS idx_scheduled_deletions_due
+                ON scheduled_deletions (due_ts)
+            """)
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS topic_overrides (
+                    caption_key TEXT PRIMARY KEY,
+                    thread_id INTEGER,
+                    updated_ts INTEGER
+                )
+            """)
             await db.execute("""
                 CREATE TABLE IF NOT EXISTS bot_state (
                     key TEXT PRIMARY KEY,
@@ -173,64 +1069,130 @@ async def init_db():
             """)
             for k in ("published_total","rejected_total","spam_blocked_total","auto_restarts_total"):
                 await db.execute("INSERT OR IGNORE INTO counters(key,value) VALUES(?,0)", (k,))
-            await db.commit()
-        print(f"🗃️ DB ok '{DB_NAME}'")
+            version = await _run_migrations(db)
+        print(f"🗃️ DB ok '{DB_NAME}' (schéma v{version})")
     except Exception as e:
         print(f"[DB INIT ERR] {e}")
         raise
 
-# ======= OUTILS STATS =======
-async def _inc_counter(db, key: str, delta: int = 1):
-    try:
+# =========================
+# BDD — MIGRATIONS
+# =========================
+# Chaque migration s'exécute une seule fois, dans l'ordre, dans la transaction d'init_db ;
+# la version atteinte est stockée dans bot_state['schema_version'].
+async def _m1_pending_delivery_state(db):
+    await _ensure_column(db, "pending_reports", "preview_text", "TEXT")
+    if await _ensure_column(db, "pending_reports", "delivery_state", "TEXT NOT NULL DEFAULT 'queued'"):
+        # Anciennes lignes : déjà envoyées (ou perdues) avant la file durable, on ne rejoue pas.
+        await db.execute("UPDATE pending_reports SET delivery_state = 'delivered'")
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_pending_queued
+        ON pending_reports (created_ts) WHERE delivery_state = 'queued'
+    """)
+
+async def _m2_media_archive_thread(db):
+    await _ensure_column(db, "media_archive", "thread_id", "INTEGER")
+
+async def _m3_media_archive_indexes(db):
+    # Purge par âge (maintenance) : plus de scan complet.
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_media_archive_ts ON media_archive (timestamp)")
+    # Lecture d'album (/deplacer, /modifier) servie par l'index seul, déjà triée par message_id ;
+    # partiel : les médias isolés (sans media_group_id) n'y figurent pas.
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_media_archive_album
+        ON media_archive (media_group_id, chat_id, message_id, file_type, file_id, caption)
+        WHERE media_group_id IS NOT NULL
+    """)
+    await db.execute("DROP INDEX IF EXISTS idx_media_group_id")
+
+async def _m4_stats_rollup(db):
+    # Agrégats horaires (UTC, heure tronquée) tenus à jour à l'écriture : le dashboard
+    # lit quelques dizaines de lignes quel que soit l'historique.
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS stats_rollup (
+            event_type TEXT NOT NULL,
+            hour_ts INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (event_type, hour_ts)
+        ) WITHOUT ROWID
+    """)
+    await db.execute("""
+        INSERT OR REPLACE INTO stats_rollup (event_type, hour_ts, count)
+        SELECT event_type, ts - ts % 3600, COUNT(*) FROM stats_events
+        WHERE event_type IS NOT NULL AND ts IS NOT NULL
+        GROUP BY event_type, ts - ts % 3600
+    """)
+    # Purge des événements bruts par âge
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_stats_events_ts ON stats_events (ts)")
+
+async def _m5_pending_delivery_gen(db):
+    # Génération de livraison : une édition pendant l'envoi périme la livraison en cours.
+    await _ensure_column(db, "pending_reports", "delivery_gen", "INTEGER NOT NULL DEFAULT 0")
+
+MIGRATIONS = [
+    (1, "pending_reports.preview_text / delivery_state", _m1_pending_delivery_state),
+    (2, "media_archive.thread_id", _m2_media_archive_thread),
+    (3, "index media_archive (timestamp, album couvrant)", _m3_media_archive_indexes),
+    (4, "stats_rollup (agrégats horaires) + index stats_events.ts", _m4_stats_rollup),
+    (5, "pending_reports.delivery_gen", _m5_pending_delivery_gen),
+]
+
+async def _run_migrations(db) -> int:
+    async with db.execute("SELECT value FROM bot_state WHERE key = 'schema_version'") as cur:
+        row = await cur.fetchone()
+    current = int(row[0]) if row else 0
+    for version, desc, migrate in MIGRATIONS:
+        if version <= current:
+            continue
+        t0 = time.perf_counter()
+        await migrate(db)
         await db.execute(
-            "INSERT INTO counters(key,value) VALUES(?,?) "
-            "ON CONFLICT(key) DO UPDATE SET value = value + ?",
-            (key, delta, delta)
+            "INSERT OR REPLACE INTO bot_state (key, value) VALUES ('schema_version', ?)", (str(version),)
         )
-    except Exception as e:
-        print(f"[COUNTER INC {key}] {e}")
+        current = version
+        print(f"🗃️ Migration v{version} : {desc} ({(time.perf_counter() - t0) * 1000:.0f} ms)")
+    return current
 
-async def _get_counter(db, key: str) -> int:
-    async with db.execute("SELECT value FROM counters WHERE key = ?", (key,)) as cur:
-        row = await cur.fetchone()
-        return int(row[0]) if row else 0
+# ======= OUTILS STATS =======
+# Compteurs / événements passent par WRITE_BEHIND : aucune I/O sur le chemin chaud.
+def _inc_counter(key: str, delta: int = 1):
+    WRITE_BEHIND.inc(key, delta)
 
-async def _add_event(db, event_type: str, meta: dict | None = None, ts: int | None = None):
+def _add_event(event_type: str, meta: dict | None = None, ts: int | None = None):
     try:
-        await db.execute(
+        ts = int(ts or time.time())
+        WRITE_BEHIND.add(
             "INSERT INTO stats_events(event_type, ts, meta) VALUES(?,?,?)",
-            (event_type, int(ts or time.time()), json.dumps(meta or {}))
+            (event_type, ts, json.dumps(meta or {}))
         )
+        WRITE_BEHIND.bucket(event_type, ts)
     except Exception as e:
         print(f"[ADD EVENT {event_type}] {e}")
 
-async def _count_events(db, event_type: str, since_ts: int) -> int:
+async def _rollup_last24(db, event_types: tuple) -> dict:
+    """Seaux horaires des 24 dernières heures (heure en cours incluse) : {event_type: {hour_ts: count}}."""
+    now = int(time.time())
+    since = now - now % 3600 - 23 * 3600
+    out = {et: {} for et in event_types}
+    marks = ",".join("?" * len(event_types))
     async with db.execute(
-        "SELECT COUNT(*) FROM stats_events WHERE event_type = ? AND ts >= ?",
-        (event_type, since_ts)
+        f"SELECT event_type, hour_ts, count FROM stats_rollup WHERE event_type IN ({marks}) AND hour_ts >= ?",
+        (*event_types, since)
     ) as cur:
-        row = await cur.fetchone()
-        return int(row[0] or 0)
-
-async def _busiest_hour_range_last24(db) -> str | None:
-    since = int(time.time()) - 24*3600
-    try:
-        async with db.execute("""
-            SELECT strftime('%H', datetime(ts,'unixepoch','localtime')) AS hh, COUNT(*)
-            FROM stats_events
-            WHERE event_type='published' AND ts >= ?
-            GROUP BY hh
-            ORDER BY COUNT(*) DESC
-            LIMIT 1
-        """, (since,)) as cur:
-            row = await cur.fetchone()
-            if not row: return None
-            start_h = int(row[0])
-            end_h = (start_h + 3) % 24
-            return f"{start_h}h – {end_h}h"
-    except Exception as e:
-        print(f"[BUSIEST HOUR] {e}")
+        for et, hour_ts, count in await cur.fetchall():
+            out[et][hour_ts] = count
+    return out
+
+def _busiest_hour_range(buckets: dict) -> str | None:
+    # Seaux en UTC : l'heure locale est calculée ici plutôt qu'en SQL
+    by_hour = Counter()
+    for hour_ts, count in buckets.items():
+        by_hour[time.localtime(hour_ts).tm_hour] += count
+    if not by_hour:
         return None
+    start_h = by_hour.most_common(1)[0][0]
+    end_h = (start_h + 3) % 24
+    return f"{start_h}h – {end_h}h"
 
 # =========================
 # OUTILS
@@ -238,16 +1200,175 @@ async def _busiest_hour_range_last24(db) -> str | None:
 def _now() -> float:
     return time.time()
 
-def _is_spam(user_id: int, media_group_id) -> bool:
-    if media_group_id:
-        return False
-    t = _now()
-    last = LAST_MSG_TIME.get(user_id, 0)
-    if t - last < SPAM_COOLDOWN:
-        LAST_MSG_TIME[user_id] = t
+# ==== Anti-spam : seaux par utilisateur (LRU borné) + détecteur d'afflux par chat ====
+class _RateRecord:
+    __slots__ = ("tokens", "ts", "strikes", "strike_ts")
+
+    def __init__(self, tokens: float, ts: float):
+        self.tokens = tokens
+        self.ts = ts
+        self.strikes = 0
+        self.strike_ts = 0.0
+
+
+class RateLimitEngine:
+    """
+    Un seau à jetons par clé (SPAM_BURST messages, puis 1 par SPAM_COOLDOWN s).
+    Un envoi refusé vide le seau : insister prolonge l'attente, comme l'ancien cooldown.
+    Mémoire bornée : au-delà de `capacity` clés, la moins récente est oubliée.
+    """
+
+    def __init__(self, cooldown: float = SPAM_COOLDOWN, burst: int = SPAM_BURST, capacity: int = RATE_LRU_CAPACITY):
+        self.rate = 1.0 / cooldown
+        self.burst = max(1, burst)
+        self.capacity = capacity
+        self._records = OrderedDict()
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self._records)
+
+    def _record(self, key, now: float) -> _RateRecord:
+        rec = self._records.get(key)
+        if rec is None:
+            rec = self._records[key] = _RateRecord(float(self.burst), now)
+            if len(self._records) > self.capacity:
+                self._records.popitem(last=False)
+                self.evicted += 1
+        else:
+            self._records.move_to_end(key)
+        return rec
+
+    def hit(self, key, now: float | None = None) -> bool:
+        """Compte un message ; True si la clé dépasse son débit."""
+        now = _now() if now is None else now
+        rec = self._record(key, now)
+        rec.tokens = min(self.burst, rec.tokens + (now - rec.ts) * self.rate)
+        rec.ts = now
+        if rec.tokens >= 1:
+            rec.tokens -= 1
+            return False
+        rec.tokens = 0.0
         return True
-    LAST_MSG_TIME[user_id] = t
-    return False
+
+    def strike(self, key, now: float | None = None, window: float = SPAM_STRIKE_WINDOW_SEC) -> int:
+        """Ajoute un avertissement (remis à zéro après `window` s de calme) ; renvoie le total."""
+        now = _now() if now is None else now
+        rec = self._record(key, now)
+        if now - rec.strike_ts > window:
+            rec.strikes = 0
+        rec.strikes += 1
+        rec.strike_ts = now
+        return rec.strikes
+
+    def reset_strikes(self, key):
+        rec = self._records.get(key)
+        if rec is not None:
+            rec.strikes = 0
+
+    def prune(self, idle_sec: float) -> int:
+        """Oublie les clés inactives ; parcours depuis la plus ancienne, arrêt à la première active."""
+        cutoff = _now() - idle_sec
+        n = 0
+        while self._records:
+            key, rec = next(iter(self._records.items()))
+            if max(rec.ts, rec.strike_ts) >= cutoff:
+                break
+            self._records.popitem(last=False)
+            n += 1
+        return n
+
+
+class ChatFloodDetector:
+    """Vrai quand un chat reçoit `threshold` messages en moins de `window` s (fenêtre glissante, O(1))."""
+
+    def __init__(self, threshold: int = FLOOD_CHAT_MSGS, window: float = FLOOD_WINDOW_SEC):
+        self.threshold = max(2, threshold)
+        self.window = window
+        self._hits = {}
+
+    def hit(self, chat_id: int, now: float | None = None) -> bool:
+        now = _now() if now is None else now
+        dq = self._hits.get(chat_id)
+        if dq is None:
+            dq = self._hits[chat_id] = deque(maxlen=self.threshold)
+        dq.append(now)
+        return len(dq) == self.threshold and now - dq[0] <= self.window
+
+
+# ==== Qualité du texte (charabia) ====
+_VOWELS = "aeiouyàâäéèêëîïôöùûüÿæœ"
+_CONSONANTS = "bcdfghjklmnpqrstvwxzçñ"
+_CLASS_TABLE = str.maketrans(
+    {**{ch: "v" for ch in _VOWELS + _VOWELS.upper()},
+     **{ch: "c" for ch in _CONSONANTS + _CONSONANTS.upper()},
+     **{ch: "d" for ch in "0123456789"}}
+)
+_EMOJI_RE = re.compile("[\u2190-\u2bff\U0001f000-\U0001faff]")
+_RUN_RE = re.compile(r"(.)\1{3,}")
+_WORDS_RE = re.compile(r"\w+")
+
+GIB_MIN_LEN = 12                 # en dessous : jamais jugé
+GIB_CONSONANT_RATIO = 5.0        # consonnes / (voyelles + 1) : seul critère appliqué (règle d'origine)
+# Seuils candidats, NON appliqués : seulement rapportés par `score-captions` tant qu'ils
+# n'ont pas été choisis sur des légendes réelles (« bravo bravo bravo bravo » passerait pour du spam).
+GIB_REPETITION = 0.5             # part du texte en répétitions
+GIB_MIN_ENTROPY = 1.5            # bits/caractère pour un texte de 24+ caractères
+
+
+class TextQuality(NamedTuple):
+    length: int
+    consonant_ratio: float
+    repetition: float
+    entropy: float
+    emoji_density: float
+    digit_ratio: float
+
+    @property
+    def gibberish(self) -> bool:
+        """Décision appliquée dans le groupe public : ratio consonnes/voyelles uniquement."""
+        return self.length >= GIB_MIN_LEN and self.consonant_ratio > GIB_CONSONANT_RATIO
+
+    @property
+    def suspect(self) -> bool:
+        """Ce que les seuils candidats ajouteraient (répétitions, faible entropie) ; pour réglage hors ligne."""
+        if self.length < GIB_MIN_LEN or self.gibberish:
+            return False
+        return self.repetition > GIB_REPETITION or (self.length >= 24 and self.entropy < GIB_MIN_ENTROPY)
+
+
+def text_quality(text: str) -> TextQuality:
+    """Caractéristiques d'un texte : classes de caractères via table de traduction (boucles C), entropie via Counter."""
+    text = (text or "").strip()
+    n = len(text)
+    if not n:
+        return TextQuality(0, 0.0, 0.0, 0.0, 0.0, 0.0)
+    classes = text.translate(_CLASS_TABLE)
+    vowels, consonants, digits = classes.count("v"), classes.count("c"), classes.count("d")
+    emojis = len(_EMOJI_RE.findall(text))
+    runs = sum(len(m.group(0)) for m in _RUN_RE.finditer(text))
+    words = _WORDS_RE.findall(text.lower())
+    dup_words = (1 - len(set(words)) / len(words)) if len(words) >= 4 else 0.0
+    counts = Counter(text.lower()).values()
+    entropy = sum(c / n * math.log2(n / c) for c in counts)
+    return TextQuality(
+        n,
+        round(consonants / (vowels + 1), 2),
+        round(max(runs / n, dup_words), 3),
+        round(entropy, 3),
+        round(emojis / n, 3),
+        round(digits / n, 3),
+    )
+
+
+def score_captions(captions) -> list:
+    """Lot de légendes -> liste de TextQuality (réglage hors ligne des seuils GIB_*)."""
+    return [text_quality(c) for c in captions]
+
+
+PUBLIC_RATE = RateLimitEngine()     # groupe public
+PRIVATE_RATE = RateLimitEngine()    # soumissions en MP
+CHAT_FLOOD = ChatFloodDetector()
 
 def _make_admin_preview(user_name: str, text: str | None, is_album: bool) -> str:
     head = "📩 Nouveau signalement" + (" (album)" if is_album else "")
@@ -267,97 +1388,304 @@ def _build_mod_keyboard(report_id: str) -> InlineKeyboardMarkup:
         ]
     ])
 
-def _extract_entities_text(msg) -> tuple[list, list]:
-    ents = getattr(msg, "entities", []) or []
-    cents = getattr(msg, "caption_entities", []) or []
-    return ents, cents
-
-def _has_disallowed_link(msg) -> bool:
-    text = (msg.caption or msg.text or "")
-    ents, cents = _extract_entities_text(msg)
-    allents = list(ents) + list(cents)
-
-    for e in allents:
-        et = e.type
-        if et in ("url", "text_link"):
-            url = getattr(e, "url", None)
-            if not url and et == "url":
-                try:
-                    url = text[e.offset:e.offset+e.length]
-                except Exception:
-                    url = None
-            if not url:
-                continue
-            u = url.strip().lower()
+# ==== Modération des liens : moteur compilé ====
+class LinkVerdict(NamedTuple):
+    blocked: bool
+    host: str | None = None
+    reason: str = ""            # url | punycode | obfuscated | tg_link | tg_invite | mention
 
-            if not ("t.me/" in u or "telegram.me/" in u or u.startswith("tg://")):
-                return True
 
-            username = None
-            if "t.me/" in u or "telegram.me/" in u:
-                try:
-                    after = u.replace("https://", "").replace("http://", "")
-                    after = after.split("t.me/")[-1].split("telegram.me/")[-1]
-                    after = after.split("?")[0].split("#")[0]
-                    after = after.strip("/").split("/")[0]
-                    username = after.lstrip("@").lower() if after else None
-                except Exception:
-                    username = None
-            elif u.startswith("tg://") and "domain=" in u:
+LINK_OK = LinkVerdict(False)
+
+_TG_HOSTS = frozenset({"t.me", "telegram.me", "telegram.dog", "www.t.me", "www.telegram.me"})
+_INVISIBLE = dict.fromkeys(map(ord, "\u200b\u200c\u200d\u2060\ufeff\u00ad"))
+_OBFUSCATION_HINT_RE = re.compile(r"hxxp|\[|\(|\{|dot|\s\.|\.\s|[^\x00-\x7f]")
+_OBFUSCATIONS = (
+    (re.compile(r"hxxp"), "http"),
+    (re.compile(r"\s*(?:\[\s*(?:\.|dot)\s*\]|\(\s*(?:\.|dot)\s*\)|\{\s*(?:\.|dot)\s*\})\s*"), "."),
+    (re.compile(r"\b(t|telegram)\s*(?:\.|\bdot\b)\s*(me)\b"), r"\1.\2"),
+    (re.compile(r"\s+dot\s+(?=[a-z0-9])"), "."),
+)
+_LINK_TLDS = (
+    "com|net|org|fr|be|ch|eu|de|uk|io|co|me|ly|gg|tv|ru|info|biz|xyz|top|site|online"
+    "|shop|app|link|click|live|pro|tk|ml|ga|cf|cc|ws|to|su|store|club"
+)
+# Texte brut : lien explicite (schéma, www., t.me) seulement ; "Paris.De nombreux…" ou "bouchon.info" passent.
+_LINK_RE = re.compile(
+    r"(?:https?://|tg://)[^\s<>\"']+"
+    r"|www\.[^\s<>\"']+"
+    r"|(?<![\w@.-])(?:[a-z0-9-]+\.)?(?:t|telegram)\.(?:me|dog)(?![\w-])(?:/[^\s<>\"']*)?"
+)
+# Nom de domaine nu : retenu seulement s'il sort de la dés-obfuscation ("spam[.]com", "spam dot xyz").
+_BARE_HOST_RE = re.compile(
+    r"(?<![\w@.-])((?:[a-z0-9](?:[a-z0-9-]*[a-z0-9])?\.)+(?:" + _LINK_TLDS + r"))(?![\w-])(?:/[^\s<>\"']*)?"
+)
+
+
+class LinkEngine:
+    """
+    Un passage par message : entités Telegram (offsets UTF-16 gérés par parse_entities),
+    puis une regex compilée sur le texte dés-obfusqué ("hxxp", "t .me", "[.]", "dot").
+    Un domaine nu n'est bloqué que s'il apparaît par dés-obfuscation, jamais tel quel dans le texte
+    (sinon "Paris.De nombreux…" ou "bouchon.info" seraient des liens). Liste blanche normalisée une fois.
+    """
+
+    def __init__(self, allowed_usernames):
+        self.allowed = frozenset(u.strip().lstrip("@").lower() for u in allowed_usernames if u.strip())
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        t = text.lower()
+        if not t.isascii():
+            t = unicodedata.normalize("NFKC", t.translate(_INVISIBLE)).replace("\u3002", ".")
+        if _OBFUSCATION_HINT_RE.search(t):
+            for rx, repl in _OBFUSCATIONS:
+                t = rx.sub(repl, t)
+        return t
+
+    def check_url(self, url: str) -> LinkVerdict:
+        u = url.strip().lower()
+        if u.startswith("tg://"):
+            m = re.search(r"[?&]domain=@?([\w]+)", u)
+            if m and m.group(1) in self.allowed:
+                return LINK_OK
+            return LinkVerdict(True, u[:64], "tg_link")
+        rest = u.split("://", 1)[1] if "://" in u else u
+        host, _, path = rest.partition("/")
+        host = host.split("?", 1)[0].split("#", 1)[0].rsplit("@", 1)[-1].split(":", 1)[0].rstrip(".")
+        sub = host[:-5] if host.endswith(".t.me") else None
+        if host in _TG_HOSTS or sub:
+            username = sub or path.split("?", 1)[0].split("#", 1)[0].split("/", 1)[0].lstrip("@")
+            if username in self.allowed:
+                return LINK_OK
+            if username.startswith("+") or username == "joinchat":
+                return LinkVerdict(True, f"t.me/{username}", "tg_invite")
+            return LinkVerdict(True, f"t.me/{username}" if username else host, "tg_link")
+        if "xn--" in host:
+            try:
+                shown = host.encode("ascii").decode("idna")
+            except Exception:
+                shown = host
+            return LinkVerdict(True, f"{host} ({shown})", "punycode")
+        return LinkVerdict(True, host or u[:64], "url")
+
+    def check_text(self, text: str) -> LinkVerdict:
+        if not text:
+            return LINK_OK
+        norm = self.normalize(text)
+        lower = text.lower()
+        for m in _LINK_RE.finditer(norm):
+            verdict = self.check_url(m.group(0))
+            if verdict.blocked:
+                if verdict.reason == "url" and m.group(0) not in lower:
+                    return verdict._replace(reason="obfuscated")
+                return verdict
+        if norm != lower or "xn--" in lower:
+            for m in _BARE_HOST_RE.finditer(norm):
+                if m.group(1) in lower and "xn--" not in m.group(1):
+                    continue  # hôte écrit tel quel : texte ordinaire (sauf punycode), même si la suite a été normalisée
+                verdict = self.check_url(m.group(0))
+                if verdict.blocked:
+                    return verdict._replace(reason="obfuscated") if verdict.reason == "url" else verdict
+        return LINK_OK
+
+    def check(self, msg) -> LinkVerdict:
+        if msg.caption is not None:
+            entities = msg.parse_caption_entities(["url", "text_link", "mention"])
+        else:
+            entities = msg.parse_entities(["url", "text_link", "mention"])
+        for ent, value in entities.items():
+            if ent.type == "mention":
+                if value.lstrip("@").lower() not in self.allowed:
+                    return LinkVerdict(True, value, "mention")
+                continue
+            verdict = self.check_url(ent.url or value)
+            if verdict.blocked:
+                return verdict
+        return self.check_text(msg.caption or msg.text or "")
+
+
+LINK_ENGINE = LinkEngine(ALLOWED_TG_USERNAMES)
+
+# --- Suppression groupée (deleteMessages) ---
+BULK_DELETE_STATS = {"messages": 0, "calls": 0, "saved": 0, "fallbacks": 0}
+
+async def bulk_delete_messages(bot, targets) -> dict:
+    """
+    Supprime des messages en lot. `targets` : {chat_id: [message_id, …]} ou itérable de (chat_id, message_id).
+    Un appel deleteMessages par tranche de 100 ids et par chat ; si une tranche échoue,
+    repli message par message pour cette tranche uniquement.
+    Renvoie {"deleted", "failed", "calls", "saved"} (saved = appels évités vs une suppression par id).
+    """
+    if isinstance(targets, dict):
+        per_chat = {chat_id: list(ids) for chat_id, ids in targets.items()}
+    else:
+        per_chat = {}
+        for chat_id, mid in targets:
+            per_chat.setdefault(chat_id, []).append(mid)
+
+    deleted = failed = calls = 0
+    for chat_id, ids in per_chat.items():
+        ids = list(dict.fromkeys(i for i in ids if i))
+        for i in range(0, len(ids), 100):
+            chunk = ids[i:i + 100]
+            calls += 1
+            try:
+                if len(chunk) == 1:
+                    await bot.delete_message(chat_id, chunk[0])
+                else:
+                    await bot.delete_messages(chat_id, chunk)
+                deleted += len(chunk)
+                continue
+            except (Forbidden, BadRequest) as e:
+                if len(chunk) == 1:
+                    failed += 1
+                    continue
+                print(f"[BULK DELETE] lot {chat_id} ({len(chunk)}) : {e} — repli unitaire")
+            except Exception as e:
+                print(f"[BULK DELETE] lot {chat_id} ({len(chunk)}) : {e} — repli unitaire")
+            BULK_DELETE_STATS["fallbacks"] += 1
+            for mid in chunk:
+                calls += 1
                 try:
-                    qs = u.split("domain=", 1)[1]
-                    username = qs.split("&")[0].split("#")[0].split("/")[0].lstrip("@").lower()
+                    await bot.delete_message(chat_id, mid)
+                    deleted += 1
                 except Exception:
-                    username = None
-
-            if username and username.lower() in ALLOWED_TG_USERNAMES:
+                    failed += 1
+
+    total = deleted + failed
+    saved = max(0, total - calls)
+    BULK_DELETE_STATS["messages"] += total
+    BULK_DELETE_STATS["calls"] += calls
+    BULK_DELETE_STATS["saved"] += saved
+    return {"deleted": deleted, "failed": failed, "calls": calls, "saved": saved}
+
+# --- Suppressions programmées (persistantes) ---
+DELETE_BATCH_WINDOW_SEC = 1.0       # échéances proches regroupées dans le même deleteMessages
+DELETE_MAX_AGE_SEC = 47 * 3600      # au-delà de 48h, Telegram refuse la suppression par un bot
+
+def _foreign_cancel() -> bool:
+    """Vrai si le CancelledError en cours vient d'une future annulée ailleurs, pas d'un cancel() de la tâche courante."""
+    task = asyncio.current_task()
+    return task is not None and not task.cancelling()
+
+class DeletionScheduler:
+    """
+    Suppressions différées (confirmations, messages de service) : un tas (échéance, chat_id, message_id) en mémoire,
+    doublé par la table scheduled_deletions (écrite via WRITE_BEHIND) pour survivre aux redémarrages.
+    Une seule coroutine draine le tas et supprime par lots, chat par chat.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._wake = None
+        self._loop = None
+        self.stats = {"scheduled": 0, "deleted": 0, "failed": 0}
+
+    def __len__(self):
+        return len(self._heap)
+
+    def _bind_loop(self):
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._wake = asyncio.Event()
+
+    async def load(self) -> int:
+        self._bind_loop()
+        async with DB.read() as db:
+            async with db.execute(
+                "SELECT due_ts, chat_id, message_id FROM scheduled_deletions WHERE due_ts > ?",
+                (_now() - DELETE_MAX_AGE_SEC,)
+            ) as cur:
+                rows = await cur.fetchall()
+        self._heap = [tuple(r) for r in rows]
+        heapq.heapify(self._heap)
+        self._wake.set()
+        return len(self._heap)
+
+    def schedule(self, messages, delay_seconds: float):
+        """`messages` : objets Message (None ignoré) ou tuples (chat_id, message_id)."""
+        due = _now() + delay_seconds
+        rows = []
+        for m in messages:
+            if not m:
                 continue
-            return True
+            chat_id, message_id = m if isinstance(m, tuple) else (m.chat_id, m.message_id)
+            heapq.heappush(self._heap, (due, chat_id, message_id))
+            rows.append((chat_id, message_id))
+            WRITE_BEHIND.add(
+                "INSERT OR REPLACE INTO scheduled_deletions (chat_id, message_id, due_ts) VALUES (?, ?, ?)",
+                (chat_id, message_id, due)
+            )
+        self.stats["scheduled"] += len(rows)
+        try:
+            self._bind_loop()
+            if self._heap and self._heap[0][0] >= due:
+                self._wake.set()  # nouvelle échéance la plus proche
+        except RuntimeError:
+            pass
 
-        elif et == "mention":
+    def _pop_due(self, now: float) -> dict:
+        per_chat = {}
+        horizon = now + DELETE_BATCH_WINDOW_SEC
+        while self._heap and self._heap[0][0] <= horizon:
+            _, chat_id, message_id = heapq.heappop(self._heap)
+            per_chat.setdefault(chat_id, []).append(message_id)
+        return per_chat
+
+    async def run(self, bot):
+        self._bind_loop()
+        print("🧹 Suppressions programmées : démarré")
+        while True:
+            timeout = (self._heap[0][0] - _now()) if self._heap else None
+            if timeout is None or timeout > 0:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            per_chat = self._pop_due(_now())
             try:
-                mention = text[e.offset:e.offset+e.length]
-            except Exception:
-                mention = ""
-            username = mention.lstrip("@").lower()
-            if username not in ALLOWED_TG_USERNAMES:
-                return True
-
-    t = text.lower()
-    if "http://" in t or "https://" in t or "www." in t or "t.me/" in t or "telegram.me/" in t:
-        for allowed in ALLOWED_TG_USERNAMES:
-            if f"t.me/{allowed.lower()}" in t or f"telegram.me/{allowed.lower()}" in t or f"@{allowed.lower()}" in t:
-                return False
-        return True
+                with api_lane(LANE_CLEANUP):
+                    res = await bulk_delete_messages(bot, per_chat)
+                self.stats["deleted"] += res["deleted"]
+                self.stats["failed"] += res["failed"]
+            except asyncio.CancelledError:
+                if not _foreign_cancel():
+                    raise
+                # Appel annulé sous nos pieds : le lot repart dans le tas, la boucle continue
+                print("[DELETE SCHEDULER] lot annulé, nouvel essai")
+                due = _now() + 1
+                for chat_id, ids in per_chat.items():
+                    for mid in ids:
+                        heapq.heappush(self._heap, (due, chat_id, mid))
+                continue
+            except Exception as e:
+                print(f"[DELETE SCHEDULER] {e}")
+            for chat_id, ids in per_chat.items():
+                for mid in ids:
+                    WRITE_BEHIND.add(
+                        "DELETE FROM scheduled_deletions WHERE chat_id = ? AND message_id = ?", (chat_id, mid)
+                    )
 
-    return False
+DELETE_SCHEDULER = DeletionScheduler()
 
-async def delete_after_delay(messages: list, delay_seconds: int):
-    await asyncio.sleep(delay_seconds)
-    for msg in messages:
-        if not msg:
-            continue
-        try:
-            await msg.delete()
-        except (Forbidden, BadRequest):
-            pass
-        except Exception as e:
-            print(f"[DELETE_AFTER_DELAY] {e}")
+def schedule_delete(messages: list, delay_seconds: float):
+    DELETE_SCHEDULER.schedule(messages, delay_seconds)
 
 # --- Admin outbox : purge / track ---
 async def admin_outbox_delete(report_id: str, bot):
     try:
-        async with aiosqlite.connect(DB_NAME) as db:
+        async with DB.read() as db:
             async with db.cursor() as c:
                 await c.execute("SELECT message_id FROM admin_outbox WHERE report_id = ?", (report_id,))
                 rows = await c.fetchall()
-            for (mid,) in rows:
-                try:
-                    await bot.delete_message(chat_id=ADMIN_GROUP_ID, message_id=mid)
-                except Exception:
-                    pass
+        if rows:
+            await bulk_delete_messages(bot, {ADMIN_GROUP_ID: [mid for (mid,) in rows]})
+        async with DB.write() as db:
             await db.execute("DELETE FROM admin_outbox WHERE report_id = ?", (report_id,))
-            await db.commit()
     except Exception as e:
         print(f"[ADMIN OUTBOX DELETE] {e}")
 
@@ -365,12 +1693,11 @@ async def admin_outbox_track(report_id: str, message_ids: list[int]):
     if not message_ids:
         return
     try:
-        async with aiosqlite.connect(DB_NAME) as db:
+        async with DB.write() as db:
             await db.executemany(
                 "INSERT OR IGNORE INTO admin_outbox (report_id, message_id) VALUES (?, ?)",
                 [(report_id, mid) for mid in message_ids]
             )
-            await db.commit()
     except Exception as e:
         print(f"[ADMIN OUTBOX TRACK] {e}")
 
@@ -423,18 +1750,27 @@ async def handle_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # =========================
 # WATCHDOG / HEARTBEAT
 # =========================
+# État lu par /healthz ; last_ok_ts = dernier get_me réussi (initialize() compris)
+HEARTBEAT = {"running": False, "failures": 0, "last_ok_ts": None, "last_check_ts": None}
+
 async def heartbeat_loop(application: Application):
     global _last_heartbeat_alert_ts
+    HEARTBEAT.update(running=True, failures=0, last_ok_ts=_now())
     failures = 0
     while True:
-        await asyncio.sleep(45)
+        await asyncio.sleep(HEARTBEAT_INTERVAL_SEC)
+        if SUPERVISOR.recovering:
+            failures = 0
+            continue
+        HEARTBEAT["last_check_ts"] = _now()
         try:
             await application.bot.get_me()
             failures = 0
+            HEARTBEAT["last_ok_ts"] = _now()
         except Exception as e:
             failures += 1
-            print(f"[HEARTBEAT] échec {failures}/3 : {e}")
-            if failures >= 3:
+            print(f"[HEARTBEAT] échec {failures}/{HEARTBEAT_MAX_FAILURES} : {e}")
+            if failures >= HEARTBEAT_MAX_FAILURES:
                 now = _now()
                 if now - _last_heartbeat_alert_ts >= HEARTBEAT_ALERT_COOLDOWN_SEC:
                     try:
@@ -445,12 +1781,11 @@ async def heartbeat_loop(application: Application):
                         _last_heartbeat_alert_ts = now
                     except Exception:
                         pass
-                try:
-                    await application.stop()
-                    await application.shutdown()
-                except Exception:
-                    pass
-                return
+                # Seule la couche réseau est relancée (SUPERVISOR) ; BDD, files et caches restent en place
+                SUPERVISOR.network_lost()
+                failures = 0
+        finally:
+            HEARTBEAT["failures"] = failures
 
 # =========================
 # HANDLER MESSAGES USER
@@ -465,6 +1800,11 @@ async def handle_user_message(update: Update, context: ContextTypes.DEFAULT_TYPE
         msg.new_chat_members or msg.left_chat_member or msg.new_chat_photo
         or msg.delete_chat_photo or msg.new_chat_title
     ):
+        if msg.chat_id == PUBLIC_GROUP_ID and msg.new_chat_members:
+            RAID.on_join(context.bot, [u.id for u in msg.new_chat_members], _now())
+            if RAID.active:
+                RAID.defer_delete(msg.message_id)
+                return
         if msg.chat_id in (PUBLIC_GROUP_ID, ADMIN_GROUP_ID):
             try:
                 await msg.delete()
@@ -481,60 +1821,45 @@ async def handle_user_message(update: Update, context: ContextTypes.DEFAULT_TYPE
 
     # 3) Mute en privé
     if chat_id == user.id:
-        try:
-            async with aiosqlite.connect(DB_NAME) as db:
-                async with db.cursor() as cursor:
-                    await cursor.execute("SELECT mute_until_ts FROM muted_users WHERE user_id = ?", (user.id,))
-                    row = await cursor.fetchone()
-                if row:
-                    mute_until_ts = row[0]
-                    now = int(now_ts)
-                    if now < mute_until_ts:
-                        remaining_min = (mute_until_ts - now) // 60 + 1
-                        await msg.reply_text(
-                            f"❌ Vous avez été restreint d'envoyer des signalements pour spam.\nTemps restant : {remaining_min} minutes."
-                        )
-                        return
-                    else:
-                        await db.execute("DELETE FROM muted_users WHERE user_id = ?", (user.id,))
-                        await db.commit()
-        except Exception as e:
-            print(f"[CHECK MUTE] {e}")
+        remaining = MUTE_INDEX.remaining(user.id)
+        if remaining:
+            try:
+                remaining_min = remaining // 60 + 1
+                await msg.reply_text(
+                    f"❌ Vous avez été restreint d'envoyer des signalements pour spam.\nTemps restant : {remaining_min} minutes."
+                )
+            except Exception as e:
+                print(f"[CHECK MUTE] {e}")
+            return
 
     # 4) Anti-spam groupe public
     is_spam = False
     if chat_id == PUBLIC_GROUP_ID:
         text_raw = (msg.text or msg.caption or "").strip()
         text = text_raw.lower()
-        user_state = SPAM_COUNT.get(user.id, {"count": 0, "last": 0})
-        flood = _is_spam(user.id, media_group_id)
-        gibberish = False
-        if len(text) >= 12:
-            consonnes = sum(1 for c in text if c in "bcdfghjklmnpqrstvwxyz")
-            voyelles = sum(1 for c in text if c in "aeiouy")
-            ratio = consonnes / (voyelles + 1)
-            if ratio > 5:
-                gibberish = True
+        if CHAT_FLOOD.hit(chat_id, now_ts):
+            RAID.on_flood(context.bot, now_ts)
+        flood = not media_group_id and PUBLIC_RATE.hit(user.id, now_ts)
+        gibberish = text_quality(text).gibberish
         is_spam = flood or gibberish
         if is_spam:
-            try:
-                await msg.delete()
-            except Exception as e:
-                print(f"[ANTISPAM] delete fail: {e}")
-            try:
-                async with aiosqlite.connect(DB_NAME) as db:
-                    await _inc_counter(db, "spam_blocked_total", 1)
-                    await _add_event(db, "spam_blocked")
-                    await db.commit()
-            except Exception as e:
-                print(f"[SPAM STATS] {e}")
-            if now_ts - user_state["last"] > 10:
-                user_state["count"] = 0
-            user_state["count"] += 1
-            user_state["last"] = now_ts
-            SPAM_COUNT[user.id] = user_state
-            if user_state["count"] >= MUTE_THRESHOLD:
-                SPAM_COUNT[user.id] = {"count": 0, "last": now_ts}
+            # Un habitué trop bavard n'est pas un raideur : seuls le charabia et les nouveaux venus comptent
+            raider = gibberish or RAID.is_newcomer(user.id, now_ts)
+            if raider:
+                RAID.on_spam(context.bot, user.id, now_ts)
+            if RAID.active:
+                RAID.defer_delete(msg.message_id)
+            else:
+                try:
+                    with api_lane(LANE_ENFORCE):
+                        await msg.delete()
+                except Exception as e:
+                    print(f"[ANTISPAM] delete fail: {e}")
+            _inc_counter("spam_blocked_total", 1)
+            _add_event("spam_blocked")
+            # En raid : mute dès le premier message des raideurs, sans attendre les avertissements
+            if PUBLIC_RATE.strike(user.id, now_ts) >= MUTE_THRESHOLD or (RAID.active and raider):
+                PUBLIC_RATE.reset_strikes(user.id)
                 until_ts = int(now_ts + MUTE_DURATION_SEC)
                 try:
                     await context.bot.restrict_chat_member(
@@ -559,27 +1884,39 @@ async def handle_user_message(update: Update, context: ContextTypes.DEFAULT_TYPE
                     )
                 except Exception as e:
                     print(f"[ANTISPAM] mute fail: {e}")
-                try:
-                    await context.bot.send_message(
-                        chat_id=ADMIN_GROUP_ID,
-                        text=f"🔇 {user.id} mute {MUTE_DURATION_SEC//60} min pour spam."
-                    )
-                except Exception as e:
-                    print(f"[ANTISPAM] admin notify fail: {e}")
+                if RAID.active:
+                    RAID.note_mute(user.id)  # résumé unique en fin de raid
+                else:
+                    try:
+                        await context.bot.send_message(
+                            chat_id=ADMIN_GROUP_ID,
+                            text=f"🔇 {user.id} mute {MUTE_DURATION_SEC//60} min pour spam."
+                        )
+                    except Exception as e:
+                        print(f"[ANTISPAM] admin notify fail: {e}")
             return
 
     # 4-bis) Modération des liens (PUBLIC)
     if chat_id == PUBLIC_GROUP_ID:
-        try:
-            is_admin_user = await is_user_admin(context, PUBLIC_GROUP_ID, user.id)
-        except Exception:
-            is_admin_user = False
-
-        if not is_admin_user and _has_disallowed_link(msg):
+        verdict = LINK_ENGINE.check(msg)
+        is_admin_user = False
+        if verdict.blocked:
             try:
-                await msg.delete()
-            except Exception as e:
-                print(f"[LINK MOD] delete fail: {e}")
+                is_admin_user = await is_user_admin(context, PUBLIC_GROUP_ID, user.id)
+            except Exception:
+                is_admin_user = False
+
+        if verdict.blocked and not is_admin_user:
+            RAID.on_spam(context.bot, user.id, now_ts)
+            raid = RAID.active
+            if raid:
+                RAID.defer_delete(msg.message_id)
+            else:
+                try:
+                    with api_lane(LANE_ENFORCE):
+                        await msg.delete()
+                except Exception as e:
+                    print(f"[LINK MOD] delete fail: {e}")
 
             until_ts = int(_now() + MUTE_LINKS_DURATION_SEC)
             try:
@@ -606,6 +1943,10 @@ async def handle_user_message(update: Update, context: ContextTypes.DEFAULT_TYPE
             except Exception as e:
                 print(f"[LINK MOD] mute fail: {e}")
 
+            if raid:
+                RAID.note_mute(user.id)
+                return
+
             try:
                 mins = MUTE_LINKS_DURATION_SEC // 60
                 await context.bot.send_message(
@@ -618,9 +1959,9 @@ async def handle_user_message(update: Update, context: ContextTypes.DEFAULT_TYPE
             try:
                 note = await context.bot.send_message(
                     chat_id=ADMIN_GROUP_ID,
-                    text=f"🔗 Lien bloqué + mute 10min — user {user.id}"
+                    text=f"🔗 Lien bloqué + mute 10min — user {user.id} ({verdict.reason} : {verdict.host})"
                 )
-                asyncio.create_task(delete_after_delay([note], 5))
+                schedule_delete([note], 5)
             except Exception:
                 pass
 
@@ -633,19 +1974,15 @@ async def handle_user_message(update: Update, context: ContextTypes.DEFAULT_TYPE
             file_id = msg.video.file_id if msg.video else msg.photo[-1].file_id
             caption = msg.caption or ""
             now_ts = _now()
-            try:
-                async with aiosqlite.connect(DB_NAME) as db:
-                    await db.execute(
-                        """
-                        INSERT OR REPLACE INTO media_archive
-                        (message_id, chat_id, media_group_id, file_id, file_type, caption, timestamp)
-                        VALUES (?, ?, ?, ?, ?, ?, ?)
-                        """,
-                        (msg.message_id, chat_id, media_group_id, file_id, media_type, caption, int(now_ts))
-                    )
-                    await db.commit()
-            except Exception as e:
-                print(f"[ARCHIVE DB] {e}")
+            WRITE_BEHIND.add(
+                """
+                INSERT OR REPLACE INTO media_archive
+                (message_id, chat_id, media_group_id, file_id, file_type, caption, timestamp, thread_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (msg.message_id, chat_id, media_group_id, file_id, media_type, caption, int(now_ts),
+                 msg.message_thread_id if msg.is_topic_message else None)
+            )
         return
 
     # 6) Ignorer texte non-commande dans les groupes
@@ -655,7 +1992,7 @@ async def handle_user_message(update: Update, context: ContextTypes.DEFAULT_TYPE
         return
 
     # 7) Traitement privé (soumissions)
-    if _is_spam(user.id, media_group_id):
+    if not media_group_id and PRIVATE_RATE.hit(user.id, now_ts):
         try:
             await msg.reply_text("⏳ Doucement, envoie pas tout d'un coup 🙏")
         except Exception:
@@ -682,21 +2019,17 @@ async def handle_user_message(update: Update, context: ContextTypes.DEFAULT_TYPE
             files_list.append({"type": media_type, "file_id": file_id})
         files_json = json.dumps(files_list)
         created_ts = int(_now())
+        preview_text = _make_admin_preview(user_name, piece_text, is_album=False)
         try:
-            async with aiosqlite.connect(DB_NAME) as db:
+            async with DB.write() as db:
                 await db.execute(
-                    "INSERT INTO pending_reports (report_id, text, files_json, created_ts, user_name) VALUES (?, ?, ?, ?, ?)",
-                    (report_id, piece_text, files_json, created_ts, user_name)
+                    "INSERT INTO pending_reports (report_id, text, files_json, created_ts, user_name, preview_text) VALUES (?, ?, ?, ?, ?, ?)",
+                    (report_id, piece_text, files_json, created_ts, user_name, preview_text)
                 )
-                await db.commit()
         except Exception as e:
             print(f"[DB INSERT] {e}")
             return
-        await REVIEW_QUEUE.put({
-            "report_id": report_id,
-            "preview_text": _make_admin_preview(user_name, piece_text, is_album=False),
-            "files": files_list,
-        })
+        await REVIEW_QUEUE.put(report_id)
         try:
             await msg.reply_text("✅ Reçu. Vérif avant publication (anonyme).")
         except Exception:
@@ -704,45 +2037,117 @@ async def handle_user_message(update: Update, context: ContextTypes.DEFAULT_TYPE
         return
 
     # -- album --
+    if media_group_id in ALREADY_FORWARDED_ALBUMS:
+        return  # morceau tardif d'un album déjà envoyé en modération
     album = TEMP_ALBUMS.get(media_group_id)
     if album is None:
         TEMP_ALBUMS[media_group_id] = {
-            "files": [],
+            "items": [],
             "text": piece_text,
             "user_name": user_name,
             "chat_id": chat_id,
             "ts": _now(),
             "done": False,
+            "timer": None,
+            "attempts": 0,
         }
         album = TEMP_ALBUMS[media_group_id]
+    elif album["done"]:
+        return
 
     if media_type and file_id:
-        album["files"].append({"type": media_type, "file_id": file_id})
+        album["items"].append((msg.message_id, {"type": media_type, "file_id": file_id}))
 
     if piece_text and not album.get("text"):
         album["text"] = piece_text
 
     album["ts"] = _now()
-    asyncio.create_task(finalize_album_later(media_group_id, context))
+    _schedule_album_finalize(media_group_id, context)
     return
 
 # =========================
-# ADMIN
+# ALBUMS (MP) — agrégation
 # =========================
-async def send_report_to_admin(application: Application, report_id: str, preview_text: str, files: list[dict]):
-    kb = _build_mod_keyboard(report_id)
-    sent_ids = []
+def _schedule_album_finalize(media_group_id: str, context: ContextTypes.DEFAULT_TYPE):
+    """(Ré)arme l'unique minuteur de l'album : finalisation après ALBUM_QUIET_SEC de silence."""
+    album = TEMP_ALBUMS.get(media_group_id)
+    if not album or album["done"]:
+        return
+    if album["timer"] is not None:
+        album["timer"].cancel()
+    album["timer"] = asyncio.get_running_loop().call_later(
+        ALBUM_QUIET_SEC, _on_album_quiet, media_group_id, context
+    )
+
+def _on_album_quiet(media_group_id: str, context: ContextTypes.DEFAULT_TYPE):
+    album = TEMP_ALBUMS.get(media_group_id)
+    if not album or album["done"]:
+        return
+    album["done"] = True
+    album["timer"] = None
+    asyncio.create_task(finalize_album_later(media_group_id, context))
+
+async def finalize_album_later(media_group_id: str, context: ContextTypes.DEFAULT_TYPE):
+    """Clôture un album : une ligne pending_reports, un événement, une mise en file (une seule fois).
+    L'album ne quitte TEMP_ALBUMS qu'une fois enregistré : en cas d'échec SQL, nouvel essai après
+    ALBUM_QUIET_SEC, puis message d'erreur à l'utilisateur après ALBUM_INSERT_ATTEMPTS essais."""
+    album = TEMP_ALBUMS.get(media_group_id)
+    if album is None or media_group_id in ALREADY_FORWARDED_ALBUMS:
+        return
+
+    chat_id = album["chat_id"]
+    user_name = album["user_name"]
+    text = album.get("text") or ""
+    files_list = [f for _, f in sorted(album["items"], key=lambda it: it[0])][:ALBUM_MAX_ITEMS]
+    if not files_list and not text:
+        TEMP_ALBUMS.pop(media_group_id, None)
+        return
 
-    # Caption (texte du report) pour les médias
-    caption_text = None
+    report_id = f"{chat_id}_{media_group_id}"
+    preview_text = _make_admin_preview(user_name, text, is_album=True)
     try:
-        async with aiosqlite.connect(DB_NAME) as db:
-            async with db.execute("SELECT text FROM pending_reports WHERE report_id = ?", (report_id,)) as cur:
-                row = await cur.fetchone()
-                if row and row[0]:
-                    caption_text = (row[0] or "").strip()
+        async with DB.write() as db:
+            await db.execute(
+                "INSERT OR IGNORE INTO pending_reports (report_id, text, files_json, created_ts, user_name, preview_text) VALUES (?, ?, ?, ?, ?, ?)",
+                (report_id, text, json.dumps(files_list), int(_now()), user_name, preview_text)
+            )
     except Exception as e:
-        print(f"[ADMIN SEND] caption fetch err: {e}")
+        print(f"[ALBUM DB INSERT] {e}")
+        album["attempts"] += 1
+        if album["attempts"] < ALBUM_INSERT_ATTEMPTS:
+            album["done"] = False
+            _schedule_album_finalize(media_group_id, context)
+            return
+        TEMP_ALBUMS.pop(media_group_id, None)
+        try:
+            await context.bot.send_message(
+                chat_id=chat_id, text="⚠️ Votre album n'a pas pu être enregistré. Merci de le renvoyer."
+            )
+        except Exception:
+            pass
+        return
+
+    TEMP_ALBUMS.pop(media_group_id, None)
+    ALREADY_FORWARDED_ALBUMS[media_group_id] = _now()
+    _add_event("album_received", {"report_id": report_id, "items": len(files_list)})
+    await REVIEW_QUEUE.put(report_id)
+    try:
+        await context.bot.send_message(chat_id=chat_id, text="✅ Reçu. Vérif avant publication (anonyme).")
+    except Exception:
+        pass
+
+# =========================
+# ADMIN
+# =========================
+async def send_report_to_admin(application: Application, report_id: str, preview_text: str,
+                               files: list[dict], caption_text: str | None = None) -> bool:
+    """Envoie l'aperçu + médias au groupe admin. True si tout est parti.
+
+    Chaque message envoyé est tracé dans admin_outbox au fil de l'eau : une
+    tentative interrompue peut ainsi être nettoyée avant d'être rejouée.
+    """
+    kb = _build_mod_keyboard(report_id)
+    caption_text = (caption_text or "").strip() or None
 
     try:
         m = await application.bot.send_message(
@@ -750,7 +2155,7 @@ async def send_report_to_admin(application: Application, report_id: str, preview
             text=preview_text,
             reply_markup=kb,
         )
-        sent_ids.append(m.message_id)
+        await admin_outbox_track(report_id, [m.message_id])
 
         if files:
             if len(files) == 1:
@@ -767,7 +2172,7 @@ async def send_report_to_admin(application: Application, report_id: str, preview
                         video=f["file_id"],
                         caption=caption_text
                     )
-                sent_ids.append(pm.message_id)
+                await admin_outbox_track(report_id, [pm.message_id])
             else:
                 media_group = []
                 for i, f in enumerate(files):
@@ -780,12 +2185,14 @@ async def send_report_to_admin(application: Application, report_id: str, preview
                     chat_id=ADMIN_GROUP_ID,
                     media=media_group
                 )
-                sent_ids.extend([x.message_id for x in msgs])
-
-        await admin_outbox_track(report_id, sent_ids)
+                await admin_outbox_track(report_id, [x.message_id for x in msgs])
+        return True
 
+    except (RetryAfter, BadRequest, Forbidden):
+        raise   # flood-wait / refus définitif : décidés par l'appelant (worker_loop)
     except Exception as e:
-        print(f"[ADMIN SEND] {e}")
+        print(f"[ADMIN SEND] {report_id}: {e}")
+        return False
 
 async def handle_admin_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
     msg = update.message
@@ -793,37 +2200,45 @@ async def handle_admin_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     chat_id = msg.chat_id
     try:
-        async with aiosqlite.connect(DB_NAME) as db:
+        # Lecture seule d'abord : la plupart des messages du groupe admin ne sont pas des éditions.
+        async with DB.read() as db:
             async with db.cursor() as c:
                 await c.execute("SELECT report_id, prompt_message_id FROM edit_state WHERE chat_id = ?", (chat_id,))
                 row = await c.fetchone()
-            if not row:
-                return
-            report_id, prompt_message_id = row
-
-            new_text = msg.text or ""
-            await db.execute("UPDATE pending_reports SET text = ? WHERE report_id = ?", (new_text, report_id))
-            await db.execute("DELETE FROM edit_state WHERE chat_id = ?", (chat_id,))
-            await db.commit()
-
-            async with db.cursor() as c2:
-                await c2.execute("SELECT text, files_json, user_name FROM pending_reports WHERE report_id = ?", (report_id,))
-                row2 = await c2.fetchone()
-            if not row2:
-                sent = await msg.reply_text("Erreur : signalement introuvable après MAJ.")
-                asyncio.create_task(delete_after_delay([msg, sent], 5))
-                return
+        if not row:
+            return
+        report_id, prompt_message_id = row
 
-            text, files_json, user_name = row2
-            files = json.loads(files_json)
+        new_text = msg.text or ""
+        async with DB.write() as db:
+            # Un clic sur ce signalement (clé différente) a pu annuler l'édition depuis la lecture.
+            cur = await db.execute(
+                "DELETE FROM edit_state WHERE chat_id = ? AND report_id = ?", (chat_id, report_id)
+            )
+            claimed = cur.rowcount
+            await cur.close()
+            updated = 0
+            if claimed:
+                # Aperçu reconstruit par le worker à partir du nouveau texte, puis renvoi via la file.
+                cur = await db.execute(
+                    "UPDATE pending_reports SET text = ?, preview_text = NULL, delivery_state = 'queued', "
+                    "delivery_gen = delivery_gen + 1 WHERE report_id = ?",
+                    (new_text, report_id)
+                )
+                updated = cur.rowcount
+                await cur.close()
+        if not claimed:
+            return
+        if not updated:
+            sent = await msg.reply_text("Erreur : signalement introuvable après MAJ.")
+            schedule_delete([msg, sent], 5)
+            return
 
         await admin_outbox_delete(report_id, context.bot)
-
-        preview_text = _make_admin_preview(user_name, text, is_album=len(files) > 1)
-        await send_report_to_admin(context.application, report_id, preview_text, files)
+        await REVIEW_QUEUE.put(report_id)
 
         sent_confirmation = await msg.reply_text("✅ Texte mis à jour.")
-        asyncio.create_task(delete_after_delay([msg, sent_confirmation], 5))
+        schedule_delete([msg, sent_confirmation], 5)
         if prompt_message_id:
             try:
                 await context.bot.delete_message(chat_id=chat_id, message_id=prompt_message_id)
@@ -834,7 +2249,7 @@ async def handle_admin_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
         print(f"[HANDLE ADMIN EDIT] {e}")
         try:
             sent = await msg.reply_text(f"Erreur MAJ : {e}")
-            asyncio.create_task(delete_after_delay([msg, sent], 8))
+            schedule_delete([msg, sent], 8)
         except Exception:
             pass
 
@@ -842,63 +2257,153 @@ async def handle_admin_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE
     msg = update.message
     chat_id = msg.chat_id
     try:
-        async with aiosqlite.connect(DB_NAME) as db:
+        async with DB.write() as db:
             async with db.cursor() as c:
                 await c.execute("SELECT prompt_message_id FROM edit_state WHERE chat_id = ?", (chat_id,))
                 row = await c.fetchone()
             if row:
-                prompt_message_id = row[0]
                 await db.execute("DELETE FROM edit_state WHERE chat_id = ?", (chat_id,))
-                await db.commit()
-                sent = await msg.reply_text("Modification annulée.")
-                await msg.delete()
-                asyncio.create_task(delete_after_delay([sent], 5))
-                if prompt_message_id:
-                    try:
-                        await context.bot.delete_message(chat_id=chat_id, message_id=prompt_message_id)
-                    except Exception:
-                        pass
-            else:
-                sent = await msg.reply_text("Vous n'étiez pas en train de modifier un message.")
-                asyncio.create_task(delete_after_delay([msg, sent], 5))
+        if row:
+            prompt_message_id = row[0]
+            sent = await msg.reply_text("Modification annulée.")
+            await msg.delete()
+            schedule_delete([sent], 5)
+            if prompt_message_id:
+                try:
+                    await context.bot.delete_message(chat_id=chat_id, message_id=prompt_message_id)
+                except Exception:
+                    pass
+        else:
+            sent = await msg.reply_text("Vous n'étiez pas en train de modifier un message.")
+            schedule_delete([msg, sent], 5)
     except Exception as e:
         print(f"[HANDLE ADMIN CANCEL] {e}")
 
+# =========================
+# DASHBOARD — INSTANTANÉ
+# =========================
+class DashboardSnapshot:
+    """
+    Données du /dashboard collectées en parallèle (une connexion lectrice par source BDD,
+    Telegram en même temps) et mises en cache `ttl` secondes : plusieurs admins qui tapent
+    /dashboard coup sur coup ne déclenchent qu'une collecte. Passé le TTL, l'instantané
+    périmé est servi tant qu'il a moins de `max_stale` s et rafraîchi en tâche de fond.
+    Une source en échec n'invalide pas les autres (valeur None, erreur journalisée).
+    """
+
+    def __init__(self, ttl: float = DASHBOARD_TTL_SEC, max_stale: float = DASHBOARD_MAX_STALE_SEC):
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.data = None
+        self.ts = 0.0
+        self.timings = {}   # source -> ms (dernière collecte)
+        self._task = None
+        self.stats = {"hits": 0, "stale": 0, "refreshes": 0, "errors": 0}
+
+    @property
+    def age(self) -> float:
+        return _now() - self.ts
+
+    async def get(self, bot) -> dict:
+        if self.data is not None:
+            age = self.age
+            if age < self.ttl:
+                self.stats["hits"] += 1
+                return self.data
+            if age < self.max_stale:
+                self.stats["stale"] += 1
+                self._refresh(bot)
+                return self.data
+        # Pas d'instantané exploitable : on attend la collecte (partagée si déjà en cours)
+        return await asyncio.shield(self._refresh(bot))
+
+    def _refresh(self, bot) -> asyncio.Task:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._collect(bot))
+        return self._task
+
+    async def _timed(self, name: str, coro, timings: dict):
+        t0 = time.perf_counter()
+        try:
+            return await coro
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"[DASHBOARD {name}] {e}")
+            return None
+        finally:
+            timings[name] = (time.perf_counter() - t0) * 1000
+
+    async def _collect(self, bot) -> dict:
+        timings = {}
+        t0 = time.perf_counter()
+        await self._timed("flush", WRITE_BEHIND.flush(), timings)  # compteurs / événements à jour
+        state, last24, member_count = await asyncio.gather(
+            self._timed("bdd", self._load_state(), timings),
+            self._timed("stats", self._load_last24(), timings),
+            self._timed("telegram", bot.get_chat_member_count(PUBLIC_GROUP_ID), timings),
+        )
+        timings["total"] = (time.perf_counter() - t0) * 1000
+        data = dict(state or {})
+        data["last24"] = last24 or {}
+        data["member_count"] = max(0, member_count - 2) if member_count is not None else None
+        self.data, self.ts, self.timings = data, _now(), timings
+        self.stats["refreshes"] += 1
+        return data
+
+    @staticmethod
+    async def _load_state() -> dict:
+        async with DB.read() as db:
+            async with db.execute(
+                "SELECT (SELECT COUNT(*) FROM pending_reports), (SELECT COUNT(*) FROM edit_state)"
+            ) as cur:
+                pending_count, edit_count = await cur.fetchone()
+            async with db.execute("SELECT key, value FROM counters") as cur:
+                counters = {k: int(v or 0) for k, v in await cur.fetchall()}
+            async with db.execute(
+                "SELECT key, value FROM bot_state WHERE key IN ('last_restart_ts', 'last_crash_ts')"
+            ) as cur:
+                state = {k: int(v) for k, v in await cur.fetchall()}
+        return {
+            "pending_count": pending_count,
+            "edit_count": edit_count,
+            "counters": counters,
+            "last_restart_ts": state.get("last_restart_ts"),
+            "last_crash_ts": state.get("last_crash_ts"),
+        }
+
+    @staticmethod
+    async def _load_last24() -> dict:
+        async with DB.read() as db:
+            return await _rollup_last24(db, ("published", "album_received", "spam_blocked"))
+
+DASHBOARD = DashboardSnapshot()
+
 # =========================
 # DASHBOARD FULL STATS
 # =========================
 async def handle_dashboard(update: Update, context: ContextTypes.DEFAULT_TYPE):
     msg = update.message
+    t0 = time.perf_counter()
     try:
-        async with aiosqlite.connect(DB_NAME) as db:
-            async with db.cursor() as c:
-                await c.execute("SELECT COUNT(*) FROM pending_reports")
-                pending_count = (await c.fetchone())[0]
-                await c.execute("SELECT COUNT(*) FROM muted_users WHERE mute_until_ts > ?", (int(_now()),))
-                muted_count = (await c.fetchone())[0]
-                await c.execute("SELECT COUNT(*) FROM edit_state")
-                edit_count = (await c.fetchone())[0]
-
-            published_total = await _get_counter(db, "published_total")
-            rejected_total = await _get_counter(db, "rejected_total")
-            spam_total = await _get_counter(db, "spam_blocked_total")
-            auto_restarts_total = await _get_counter(db, "auto_restarts_total")
-
-            since_24h = int(time.time()) - 24*3600
-            published_24h = await _count_events(db, "published", since_24h)
-            albums_24h = await _count_events(db, "album_received", since_24h)
-            spam_24h = await _count_events(db, "spam_blocked", since_24h)
-            busiest = await _busiest_hour_range_last24(db)
-
-            async with db.execute("SELECT value FROM bot_state WHERE key='last_restart_ts'") as cur:
-                row = await cur.fetchone()
-                last_restart_ts = int(row[0]) if row else None
-            async with db.execute("SELECT value FROM bot_state WHERE key='last_crash_ts'") as cur:
-                row = await cur.fetchone()
-                last_crash_ts = int(row[0]) if row else None
-
-        member_count = await context.bot.get_chat_member_count(PUBLIC_GROUP_ID)
-        member_count = max(0, member_count - 2)
+        snap = await DASHBOARD.get(context.bot)
+        counters = snap.get("counters", {})
+        last24 = snap["last24"]
+
+        pending_count = snap.get("pending_count", "—")
+        edit_count = snap.get("edit_count", 0)
+        muted_count = len(MUTE_INDEX)
+        published_total = counters.get("published_total", 0)
+        rejected_total = counters.get("rejected_total", 0)
+        spam_total = counters.get("spam_blocked_total", 0)
+        auto_restarts_total = counters.get("auto_restarts_total", 0)
+
+        published_24h = sum(last24.get("published", {}).values())
+        albums_24h = sum(last24.get("album_received", {}).values())
+        spam_24h = sum(last24.get("spam_blocked", {}).values())
+        busiest = _busiest_hour_range(last24.get("published", {}))
+        last_restart_ts = snap.get("last_restart_ts")
+        last_crash_ts = snap.get("last_crash_ts")
+        member_count = snap["member_count"] if snap["member_count"] is not None else "—"
 
         uptime_seconds = int(time.time() - START_TIME)
         m, s = divmod(uptime_seconds, 60)
@@ -914,6 +2419,20 @@ async def handle_dashboard(update: Update, context: ContextTypes.DEFAULT_TYPE):
         def fmt_ts(ts):
             return time.strftime('%d/%m %H:%M', time.localtime(ts)) if ts else "—"
 
+        wb = WRITE_BEHIND.stats
+        rq = REVIEW_QUEUE.stats
+        drain = f"{rq['last_drain_sec']:.1f}s" if rq["last_drain_sec"] is not None else "—"
+        lat = f"{rq['last_latency_sec']:.0f}s" if rq["last_latency_sec"] is not None else "—"
+        bd = BULK_DELETE_STATS
+        sv = SUPERVISOR.stats
+        up = UPDATE_PROCESSOR.stats
+        sv_last = f"{sv['last_recovery_sec']:.0f}s" if sv["last_recovery_sec"] is not None else "—"
+        sources = " · ".join(f"{name} {ms:.0f} ms" for name, ms in DASHBOARD.timings.items())
+        api_line = " · ".join(
+            f"{lane} {st['calls']}/{st['throttled']}/{st['deferred']}/{st['flood_waits']}"
+            for lane, st in API_GOVERNOR.stats.items()
+        )
+
         text = (
 f"📊 <b>𝘿𝘼𝙎𝙃𝘽𝙊𝘼𝙍𝘿 — AccidentsFR Bot</b>\n"
 f"─────────────────────────────\n"
@@ -924,7 +2443,12 @@ f"📌 <b>Modération</b>\n"
 f"• <b>Signalements en attente :</b> {pending_count}\n"
 f"• <b>Publiés :</b> {published_total}   |   <b>Rejetés :</b> {rejected_total} ({rej_pct:.1f} %)\n"
 f"• <b>Utilisateurs mutés :</b> {muted_count}\n"
-f"• <b>Édition en cours :</b> {edit_status}\n\n"
+f"• <b>Édition en cours :</b> {edit_status}\n"
+f"• <b>File admin :</b> {REVIEW_QUEUE.depth} en attente ({REVIEW_QUEUE.inflight} en cours, {REVIEW_WORKERS} workers)\n"
+f"• <b>Envois admin :</b> {rq['delivered']} livrés, {rq['retries']} reprises, {rq['failed']} abandonnés, dernier vidage {drain}, latence {lat}\n"
+f"• <b>API (appels/limités/reportés/429) :</b> {api_line}\n"
+f"• <b>Suppressions groupées :</b> {bd['messages']} messages en {bd['calls']} appels ({bd['saved']} économisés), {len(DELETE_SCHEDULER)} programmées\n"
+f"• <b>Maintenance (durée/lignes) :</b> {MAINTENANCE.summary()}\n\n"
 f"📌 <b>Activité</b>\n"
 f"• <b>Membres (groupe public) :</b> {member_count}\n"
 f"• <b>Signalements validés (24h) :</b> {published_24h}\n"
@@ -932,21 +2456,72 @@ f"• <b>Albums reçus (24h) :</b> {albums_24h}\n"
 f"• <b>Heure la + active :</b> {busiest or '—'}\n\n"
 f"📌 <b>Système & Sécurité</b>\n"
 f"• <b>Redémarrages automatiques :</b> {auto_restarts_total}\n"
+f"• <b>Reprises réseau (depuis le lancement) :</b> {sv['recoveries']}, dernière {sv_last}, max {sv['max_recovery_sec']:.0f}s\n"
 f"• <b>Dernier crash détecté :</b> {fmt_ts(last_crash_ts)} (auto-recover)\n"
-f"• <b>Anti-spam :</b> {spam_24h} bloqués (24h) / total {spam_total}\n\n"
-f"💡 <i>Ce message s’efface dans 60s.</i>"
+f"• <b>Anti-spam :</b> {spam_24h} bloqués (24h) / total {spam_total}\n"
+f"• <b>Updates parallèles :</b> {up['processed']} traités, {up['waited']} ordonnés derrière leur clé (max {up['max_wait_ms']:.0f} ms), pic {up['max_inflight']} simultanés\n"
+f"• <b>Écritures différées :</b> {wb['flushes']} flush, dernier lot {wb['last_batch']} ({wb['last_ms']:.1f} ms, max {wb['max_ms']:.1f} ms), {wb['dropped']} abandonnées\n\n"
+f"💡 <i>Ce message s’efface dans 60s.</i>\n"
+f"<i>Généré en {(time.perf_counter() - t0) * 1000:.0f} ms · données de {DASHBOARD.age:.0f}s ({sources})</i>"
         )
 
         sent = await msg.reply_text(text, parse_mode=ParseMode.HTML)
-        asyncio.create_task(delete_after_delay([msg, sent], 60))
+        schedule_delete([msg, sent], 60)
     except Exception as e:
         print(f"[DASHBOARD] {e}")
         try:
             sent = await msg.reply_text(f"Erreur dashboard : {e}")
-            asyncio.create_task(delete_after_delay([msg, sent], 10))
+            schedule_delete([msg, sent], 10)
         except Exception:
             pass
 
+# =========================
+# /PERF (profilage, ADMIN)
+# =========================
+async def handle_perf(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    msg = update.message
+    try:
+        try:
+            n = max(1, min(20, int(context.args[0]))) if context.args else PERF_TOP_N
+        except ValueError:
+            n = PERF_TOP_N
+
+        def ms(sec):
+            return f"{sec * 1000:.0f} ms" if sec < 1 else f"{sec:.2f} s"
+
+        lag = PROFILER.loop_lag.totals().get("loop")
+        lag_line = f"moy {ms(lag[1] / lag[0])}, max {ms(lag[2])}" if lag else "—"
+        slow_counts = Counter(name for _, name, _, _ in PROFILER.slow)
+
+        lines = [
+            "⏱️ <b>Profil — dernière heure</b>",
+            "─────────────────────────────",
+            f"🔁 <b>Retard boucle :</b> {lag_line}",
+            "",
+            f"📌 <b>Handlers les plus lents</b> (seuil {SLOW_HANDLER_SEC:g}s)",
+        ]
+        for name, count, avg, mx in PROFILER.handlers.top(n):
+            slow = f", {slow_counts[name]} lents" if slow_counts[name] else ""
+            lines.append(f"• <code>{name}</code> — max {ms(mx)}, moy {ms(avg)}, {count} appels{slow}")
+        if not PROFILER.handlers.totals():
+            lines.append("• —")
+        lines += ["", "📌 <b>Requêtes SQL les plus lentes</b>"]
+        for sql, count, avg, mx in PROFILER.sql.top(n):
+            lines.append(f"• <code>{html.escape(sql[:90])}</code> — max {ms(mx)}, moy {ms(avg)}, {count}×")
+        if not PROFILER.sql.totals():
+            lines.append("• —")
+        if PROFILER.slow:
+            lines += ["", "📌 <b>Derniers appels lents</b>"]
+            for ts, name, dur, stack in list(PROFILER.slow)[-n:]:
+                where = f"\n   ↳ <code>{html.escape(stack)}</code>" if stack else ""
+                lines.append(f"• {time.strftime('%H:%M:%S', time.localtime(ts))} <code>{name}</code> {ms(dur)}{where}")
+        lines += ["", "💡 <i>Ce message s’efface dans 60s.</i>"]
+
+        sent = await msg.reply_text("\n".join(lines), parse_mode=ParseMode.HTML)
+        schedule_delete([msg, sent], 60)
+    except Exception as e:
+        print(f"[PERF] {e}")
+
 # =========================
 # /DEPLACER (ADMIN -> PUBLIC)
 # =========================
@@ -956,23 +2531,29 @@ async def handle_deplacer_admin(update: Update, context: ContextTypes.DEFAULT_TY
     if not original_msg:
         try:
             m = await msg.reply_text("Usage: répondez à votre message avec /deplacer pour le publier.")
-            asyncio.create_task(delete_after_delay([msg, m], 6))
+            schedule_delete([msg, m], 6)
+        except Exception: pass
+        return
+
+    try:
+        forced = forced_topic(context.args)
+    except ValueError:
+        try:
+            m = await msg.reply_text("Topic inconnu. Usage: /deplacer [videos|radars|general]")
+            schedule_delete([msg, m], 6)
         except Exception: pass
         return
 
     media_group_id = original_msg.media_group_id
     text_to_analyze = (original_msg.text or original_msg.caption or "").strip()
-    text_lower = text_to_analyze.lower()
-    target_thread_id = PUBLIC_TOPIC_GENERAL_ID
-    if any(word in text_lower for word in accident_keywords):
-        target_thread_id = PUBLIC_TOPIC_VIDEOS_ID
-    elif any(word in text_lower for word in radar_keywords):
-        target_thread_id = PUBLIC_TOPIC_RADARS_ID
+    target_thread_id = (forced or route_topic(text_to_analyze)).thread_id
+    learn_text = text_to_analyze
 
     try:
         if media_group_id:
             album_items, album_caption, message_ids_to_delete = [], "", []
-            async with aiosqlite.connect(DB_NAME) as db:
+            await WRITE_BEHIND.flush()  # l'archive des derniers médias peut être encore en tampon
+            async with DB.read() as db:
                 async with db.cursor() as c:
                     await c.execute(
                         "SELECT message_id, file_type, file_id, caption FROM media_archive WHERE media_group_id = ? AND chat_id = ? ORDER BY message_id",
@@ -985,6 +2566,7 @@ async def handle_deplacer_admin(update: Update, context: ContextTypes.DEFAULT_TY
                 if caption:
                     album_caption = caption
                     break
+            learn_text = learn_text or album_caption
             for i, (msg_id, file_type, file_id, _) in enumerate(rows):
                 message_ids_to_delete.append(msg_id)
                 current_caption = album_caption if i == 0 else None
@@ -993,53 +2575,52 @@ async def handle_deplacer_admin(update: Update, context: ContextTypes.DEFAULT_TY
                 elif file_type == 'video':
                     album_items.append(InputMediaVideo(media=file_id, caption=current_caption))
             await context.bot.send_media_group(
-                chat_id=PUBLIC_GROUP_ID, media=album_items, message_thread_id=target_thread_id
+                chat_id=PUBLIC_GROUP_ID, media=album_items, message_thread_id=target_thread_id,
+                rate_limit_args=LANE_PUBLISH
             )
-            for msg_id in message_ids_to_delete:
-                try:
-                    await context.bot.delete_message(ADMIN_GROUP_ID, msg_id)
-                except Exception as e:
-                    print(f"[DEPLACER_ADMIN] del {msg_id}: {e}")
+            res = await bulk_delete_messages(context.bot, {ADMIN_GROUP_ID: message_ids_to_delete})
+            if res["failed"]:
+                print(f"[DEPLACER_ADMIN] {res['failed']} message(s) non supprimé(s)")
         else:
             photo = original_msg.photo[-1].file_id if original_msg.photo else None
             video = original_msg.video.file_id if original_msg.video else None
             if photo:
                 await context.bot.send_photo(
                     chat_id=PUBLIC_GROUP_ID, photo=photo,
-                    caption=text_to_analyze, message_thread_id=target_thread_id
+                    caption=text_to_analyze, message_thread_id=target_thread_id,
+                    rate_limit_args=LANE_PUBLISH
                 )
             elif video:
                 await context.bot.send_video(
                     chat_id=PUBLIC_GROUP_ID, video=video,
-                    caption=text_to_analyze, message_thread_id=target_thread_id
+                    caption=text_to_analyze, message_thread_id=target_thread_id,
+                    rate_limit_args=LANE_PUBLISH
                 )
             elif text_to_analyze:
                 await context.bot.send_message(
                     chat_id=PUBLIC_GROUP_ID, text=text_to_analyze,
-                    message_thread_id=target_thread_id
+                    message_thread_id=target_thread_id,
+                    rate_limit_args=LANE_PUBLISH
                 )
             else:
                 m = await msg.reply_text("Type non supporté.")
-                asyncio.create_task(delete_after_delay([msg, m], 6))
+                schedule_delete([msg, m], 6)
                 return
             await original_msg.delete()
 
+        if forced:
+            TOPIC_OVERRIDES.remember(learn_text, forced.thread_id)
         m = await msg.reply_text("✅ Message publié dans le groupe public.")
-        asyncio.create_task(delete_after_delay([msg, m], 5))
+        schedule_delete([msg, m], 5)
 
-        try:
-            async with aiosqlite.connect(DB_NAME) as db:
-                await _inc_counter(db, "published_total", 1)
-                await _add_event(db, "published", {"source": "admin_move"})
-                await db.commit()
-        except Exception as e:
-            print(f"[PUBLISH STATS (admin move)] {e}")
+        _inc_counter("published_total", 1)
+        _add_event("published", {"source": "admin_move"})
 
     except Exception as e:
         print(f"[DEPLACER_ADMIN] {e}")
         try:
             m = await msg.reply_text(f"Erreur publication : {e}")
-            asyncio.create_task(delete_after_delay([msg, m], 8))
+            schedule_delete([msg, m], 8)
         except Exception: pass
 
 # =========================
@@ -1068,23 +2649,30 @@ async def handle_deplacer_public(update: Update, context: ContextTypes.DEFAULT_T
     if not original_msg:
         try:
             m = await msg.reply_text("Usage: répondez à un message avec /deplacer")
-            asyncio.create_task(delete_after_delay([msg, m], 6))
+            schedule_delete([msg, m], 6)
+        except Exception: pass
+        return
+
+    try:
+        forced = forced_topic(context.args)
+    except ValueError:
+        try:
+            m = await msg.reply_text("Topic inconnu. Usage: /deplacer [videos|radars|general]")
+            schedule_delete([msg, m], 6)
         except Exception: pass
         return
 
     media_group_id = original_msg.media_group_id
     text_to_analyze = (original_msg.text or original_msg.caption or "").strip()
-    text_lower = text_to_analyze.lower()
-    target_thread_id = PUBLIC_TOPIC_GENERAL_ID
-    if any(word in text_lower for word in accident_keywords):
-        target_thread_id = PUBLIC_TOPIC_VIDEOS_ID
-    elif any(word in text_lower for word in radar_keywords):
-        target_thread_id = PUBLIC_TOPIC_RADARS_ID
+    target_thread_id = (forced or route_topic(text_to_analyze)).thread_id
+    learn_text = text_to_analyze
 
     if original_msg.message_thread_id == target_thread_id:
+        if forced:
+            TOPIC_OVERRIDES.remember(learn_text, forced.thread_id)
         try:
             m = await msg.reply_text("Déjà dans le bon topic.")
-            asyncio.create_task(delete_after_delay([m, msg], 4))
+            schedule_delete([m, msg], 4)
         except Exception:
             pass
         return
@@ -1092,7 +2680,8 @@ async def handle_deplacer_public(update: Update, context: ContextTypes.DEFAULT_T
     try:
         if media_group_id:
             album_items, album_caption, message_ids_to_delete = [], "", []
-            async with aiosqlite.connect(DB_NAME) as db:
+            await WRITE_BEHIND.flush()  # l'archive des derniers médias peut être encore en tampon
+            async with DB.read() as db:
                 async with db.cursor() as c:
                     await c.execute(
                         "SELECT message_id, file_type, file_id, caption FROM media_archive WHERE media_group_id = ? AND chat_id = ? ORDER BY message_id",
@@ -1106,6 +2695,7 @@ async def handle_deplacer_public(update: Update, context: ContextTypes.DEFAULT_T
                 if caption:
                     album_caption = caption
                     break
+            learn_text = learn_text or album_caption
             for i, (msg_id, file_type, file_id, _) in enumerate(rows):
                 message_ids_to_delete.append(msg_id)
                 current_caption = album_caption if i == 0 else None
@@ -1114,44 +2704,44 @@ async def handle_deplacer_public(update: Update, context: ContextTypes.DEFAULT_T
                 elif file_type == 'video':
                     album_items.append(InputMediaVideo(media=file_id, caption=current_caption))
             await context.bot.send_media_group(
-                chat_id=PUBLIC_GROUP_ID, media=album_items, message_thread_id=target_thread_id
+                chat_id=PUBLIC_GROUP_ID, media=album_items, message_thread_id=target_thread_id,
+                rate_limit_args=LANE_PUBLISH
             )
-            for msg_id in message_ids_to_delete:
-                try:
-                    await context.bot.delete_message(PUBLIC_GROUP_ID, msg_id)
-                except Exception as e:
-                    print(f"[DEPLACER] del {msg_id}: {e}")
+            res = await bulk_delete_messages(context.bot, {PUBLIC_GROUP_ID: message_ids_to_delete})
+            if res["failed"]:
+                print(f"[DEPLACER] {res['failed']} message(s) non supprimé(s)")
         else:
             photo = original_msg.photo[-1].file_id if original_msg.photo else None
             video = original_msg.video.file_id if original_msg.video else None
             if photo:
                 await context.bot.send_photo(
                     chat_id=PUBLIC_GROUP_ID, photo=photo,
-                    caption=text_to_analyze, message_thread_id=target_thread_id
+                    caption=text_to_analyze, message_thread_id=target_thread_id,
+                    rate_limit_args=LANE_PUBLISH
                 )
             elif video:
                 await context.bot.send_video(
                     chat_id=PUBLIC_GROUP_ID, video=video,
-                    caption=text_to_analyze, message_thread_id=target_thread_id
+                    caption=text_to_analyze, message_thread_id=target_thread_id,
+                    rate_limit_args=LANE_PUBLISH
                 )
             elif text_to_analyze:
                 await context.bot.send_message(
                     chat_id=PUBLIC_GROUP_ID, text=text_to_analyze,
-                    message_thread_id=target_thread_id
+                    message_thread_id=target_thread_id,
+                    rate_limit_args=LANE_PUBLISH
                 )
             else:
                 mm = await msg.reply_text("Type non supporté.")
-                asyncio.create_task(delete_after_delay([msg, mm], 6))
+                schedule_delete([msg, mm], 6)
                 return
 
-        try:
-            await original_msg.delete()
-        except Exception as e:
-            print(f"[DEPLACER PUBLIC] delete source: {e}")
-        try:
-            await msg.delete()
-        except Exception as e:
-            print(f"[DEPLACER PUBLIC] delete cmd: {e}")
+        if forced:
+            TOPIC_OVERRIDES.remember(learn_text, forced.thread_id)
+        ids = [msg.message_id] if media_group_id else [original_msg.message_id, msg.message_id]
+        res = await bulk_delete_messages(context.bot, {PUBLIC_GROUP_ID: ids})
+        if res["failed"]:
+            print(f"[DEPLACER PUBLIC] {res['failed']} message(s) non supprimé(s)")
 
     except Exception as e:
         print(f"[DEPLACER PUB] {e}")
@@ -1161,14 +2751,16 @@ async def handle_deplacer_public(update: Update, context: ContextTypes.DEFAULT_T
                 photo = original_msg.photo[-1].file_id if original_msg.photo else None
                 video = original_msg.video.file_id if original_msg.video else None
                 if photo:
-                    await context.bot.send_photo(chat_id=PUBLIC_GROUP_ID, photo=photo, caption=text_to_analyze, message_thread_id=target_thread_id)
+                    await context.bot.send_photo(chat_id=PUBLIC_GROUP_ID, photo=photo, caption=text_to_analyze, message_thread_id=target_thread_id, rate_limit_args=LANE_PUBLISH)
                 elif video:
-                    await context.bot.send_video(chat_id=PUBLIC_GROUP_ID, video=video, caption=text_to_analyze, message_thread_id=target_thread_id)
+                    await context.bot.send_video(chat_id=PUBLIC_GROUP_ID, video=video, caption=text_to_analyze, message_thread_id=target_thread_id, rate_limit_args=LANE_PUBLISH)
+                if forced:
+                    TOPIC_OVERRIDES.remember(learn_text, forced.thread_id)
                 await original_msg.delete()
                 await msg.delete()
             else:
                 m = await msg.reply_text(f"Erreur déplacement : {e}")
-                asyncio.create_task(delete_after_delay([m, msg], 8))
+                schedule_delete([m, msg], 8)
         except Exception:
             pass
 
@@ -1199,7 +2791,7 @@ async def handle_modifier_public(update: Update, context: ContextTypes.DEFAULT_T
             m = await msg.reply_text(
                 "Usage : répondez à un message avec /modifier pour l’envoyer en re-modération."
             )
-            asyncio.create_task(delete_after_delay([msg, m], 6))
+            schedule_delete([msg, m], 6)
         except Exception:
             pass
         return
@@ -1219,7 +2811,8 @@ async def handle_modifier_public(update: Update, context: ContextTypes.DEFAULT_T
             rows = []
 
             try:
-                async with aiosqlite.connect(DB_NAME) as db:
+                await WRITE_BEHIND.flush()
+                async with DB.read() as db:
                     async with db.execute(
                         """
                         SELECT message_id, file_type, file_id, caption
@@ -1268,7 +2861,8 @@ async def handle_modifier_public(update: Update, context: ContextTypes.DEFAULT_T
 
             archive_caption = None
             try:
-                async with aiosqlite.connect(DB_NAME) as db:
+                await WRITE_BEHIND.flush()
+                async with DB.read() as db:
                     async with db.execute(
                         "SELECT caption FROM media_archive WHERE message_id = ? AND chat_id = ? LIMIT 1",
                         (original_msg.message_id, PUBLIC_GROUP_ID)
@@ -1307,39 +2901,35 @@ async def handle_modifier_public(update: Update, context: ContextTypes.DEFAULT_T
         created_ts = int(time.time())
         files_json = json.dumps(files_list)
 
-        async with aiosqlite.connect(DB_NAME) as db:
-            await db.execute(
-                "INSERT OR REPLACE INTO pending_reports (report_id, text, files_json, created_ts, user_name) VALUES (?,?,?,?,?)",
-                (report_id, final_text, files_json, created_ts, user_name),
-            )
-            await db.commit()
-
         note = "\n\n♻️ Renvoi en modération depuis le groupe public."
         preview_text = _make_admin_preview(user_name, final_text, is_album=(len(files_list) > 1)) + note
 
-        await REVIEW_QUEUE.put({"report_id": report_id, "preview_text": preview_text, "files": files_list})
+        async with DB.write() as db:
+            # Remplacement d'un renvoi existant : nouvelle génération, une livraison en cours est périmée.
+            await db.execute(
+                "INSERT OR REPLACE INTO pending_reports (report_id, text, files_json, created_ts, user_name, preview_text, delivery_gen) "
+                "VALUES (?,?,?,?,?,?, COALESCE((SELECT delivery_gen + 1 FROM pending_reports WHERE report_id = ?), 0))",
+                (report_id, final_text, files_json, created_ts, user_name, preview_text, report_id),
+            )
+
+        await REVIEW_QUEUE.put(report_id)
 
         # ===== Nettoyage public =====
         if media_group_id and not message_ids_to_delete:
             message_ids_to_delete.append(original_msg.message_id)
 
-        for mid in set(message_ids_to_delete):
-            try:
-                await context.bot.delete_message(PUBLIC_GROUP_ID, mid)
-            except Exception as e:
-                print(f"[MODIFIER] del public {mid}: {e}")
-
-        try:
-            await msg.delete()
-        except Exception:
-            pass
+        res = await bulk_delete_messages(
+            context.bot, {PUBLIC_GROUP_ID: list(message_ids_to_delete) + [msg.message_id]}
+        )
+        if res["failed"]:
+            print(f"[MODIFIER] {res['failed']} message(s) public(s) non supprimé(s)")
 
         try:
             info = await context.bot.send_message(
                 chat_id=PUBLIC_GROUP_ID,
                 text="♻️ Publication retirée — renvoyée en modération.",
             )
-            asyncio.create_task(delete_after_delay([info], 5))
+            schedule_delete([info], 5)
         except Exception:
             pass
 
@@ -1347,7 +2937,7 @@ async def handle_modifier_public(update: Update, context: ContextTypes.DEFAULT_T
         print(f"[MODIFIER PUB] {e}")
         try:
             m = await msg.reply_text(f"Erreur /modifier : {e}")
-            asyncio.create_task(delete_after_delay([msg, m], 8))
+            schedule_delete([msg, m], 8)
         except Exception:
             pass
 
@@ -1362,242 +2952,946 @@ async def on_button_click(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = query.message.chat_id
 
     try:
-        async with aiosqlite.connect(DB_NAME) as db:
-            try:
-                await db.execute("DELETE FROM edit_state WHERE chat_id = ?", (chat_id,))
-                await db.commit()
-            except Exception as e:
-                print(f"[BTN CLEAN EDIT_STATE] {e}")
+        # Seul EDIT (clé 'chat:') remplace l'édition en cours ; un autre clic n'annule que celle de son signalement.
+        try:
+            async with DB.write() as db:
+                if action == "EDIT":
+                    await db.execute("DELETE FROM edit_state WHERE chat_id = ?", (chat_id,))
+                else:
+                    await db.execute(
+                        "DELETE FROM edit_state WHERE chat_id = ? AND report_id = ?", (chat_id, report_id)
+                    )
+        except Exception as e:
+            print(f"[BTN CLEAN EDIT_STATE] {e}")
 
+        async with DB.read() as db:
             async with db.cursor() as c:
                 await c.execute("SELECT text, files_json, user_name FROM pending_reports WHERE report_id = ?", (report_id,))
                 row = await c.fetchone()
 
-            if not row:
-                try:
-                    await admin_outbox_delete(report_id, context.bot)
-                except Exception:
-                    pass
-                return
+        if not row:
+            try:
+                await admin_outbox_delete(report_id, context.bot)
+            except Exception:
+                pass
+            return
 
-            info = {
-                "text": row[0],
-                "files": json.loads(row[1]),
-                "user_name": row[2]
-            }
-
-            if action == "REJECT":
-                m = await context.bot.send_message(ADMIN_GROUP_ID, "❌ Supprimé, non publié.")
-                asyncio.create_task(delete_after_delay([m], 5))
-                await _inc_counter(db, "rejected_total", 1)
-                await _add_event(db, "rejected", {"report_id": report_id})
+        info = {
+            "text": row[0],
+            "files": json.loads(row[1]),
+            "user_name": row[2]
+        }
+
+        if action == "REJECT":
+            m = await context.bot.send_message(ADMIN_GROUP_ID, "❌ Supprimé, non publié.")
+            schedule_delete([m], 5)
+            _inc_counter("rejected_total", 1)
+            _add_event("rejected", {"report_id": report_id})
+            async with DB.write() as db:
                 await db.execute("DELETE FROM pending_reports WHERE report_id = ?", (report_id,))
-                await db.commit()
-                await admin_outbox_delete(report_id, context.bot)
-                return
+            await admin_outbox_delete(report_id, context.bot)
+            return
+
+        if action == "REJECTMUTE":
+            user_id = _extract_user_id_from_report_id(report_id)
+            mute_duration = MUTE_DURATION_SPAM_SUBMISSION
+            mute_until_ts = int(_now() + mute_duration)
 
-            if action == "REJECTMUTE":
-                user_id = _extract_user_id_from_report_id(report_id)
-                mute_duration = MUTE_DURATION_SPAM_SUBMISSION
-                mute_until_ts = int(_now() + mute_duration)
+            async with DB.write() as db:
+                if user_id:
+                    await MUTE_INDEX.mute(db, user_id, mute_until_ts)
+                await db.execute("DELETE FROM pending_reports WHERE report_id = ?", (report_id,))
+            _inc_counter("rejected_total", 1)
+            _add_event("rejected", {"report_id": report_id, "muted": bool(user_id)})
 
+            try:
                 if user_id:
+                    hours = mute_duration // 3600
+                    await context.bot.send_message(
+                        chat_id=user_id,
+                        text=f"❌ Votre soumission a été rejetée.\n\nVous avez été restreint d'envoyer de nouveaux signalements pour {hours} heure(s)."
+                    )
+            except Exception as e:
+                print(f"[NOTIFY USER REJECTMUTE] {e}")
+
+            m = await context.bot.send_message(ADMIN_GROUP_ID, "🔇 Rejeté + mute 1h.")
+            schedule_delete([m], 5)
+            await admin_outbox_delete(report_id, context.bot)
+            return
+
+        if action == "EDIT":
+            current_text = info.get("text", "")
+            try:
+                sent_prompt = await context.bot.send_message(
+                    chat_id=ADMIN_GROUP_ID,
+                    text=f"✏️ **Modification en cours...**\n\n**Texte actuel :**\n`{current_text}`\n\nEnvoyez le nouveau texte. (/cancel pour annuler)",
+                    parse_mode="Markdown"
+                )
+                prompt_message_id = sent_prompt.message_id
+
+                async with DB.write() as db:
                     await db.execute(
-                        "INSERT OR REPLACE INTO muted_users (user_id, mute_until_ts) VALUES (?, ?)",
-                        (user_id, mute_until_ts)
+                        "INSERT OR REPLACE INTO edit_state (chat_id, report_id, prompt_message_id) VALUES (?, ?, ?)",
+                        (chat_id, report_id, prompt_message_id)
                     )
+            except Exception as e:
+                print(f"[EDIT BUTTON] {e}")
+                if 'sent_prompt' in locals():
+                    await sent_prompt.delete()
+                m = await context.bot.send_message(ADMIN_GROUP_ID, "⚠️ Une modification est déjà en cours. /cancel d'abord.")
+                schedule_delete([m], 8)
+            return
 
-                await _inc_counter(db, "rejected_total", 1)
-                await _add_event(db, "rejected", {"report_id": report_id, "muted": bool(user_id)})
+        if action == "APPROVE":
+            files = info["files"]
+            text = (info["text"] or "").strip()
+            caption_for_public = text if text else None
+            target_thread_id = route_topic(text).thread_id
 
-                await db.execute("DELETE FROM pending_reports WHERE report_id = ?", (report_id,))
-                await db.commit()
+            try:
+                if not files:
+                    if text:
+                        await context.bot.send_message(
+                            chat_id=PUBLIC_GROUP_ID, text=text,
+                            message_thread_id=target_thread_id,
+                            rate_limit_args=LANE_PUBLISH
+                        )
+                    else:
+                        m = await context.bot.send_message(ADMIN_GROUP_ID, "❌ Rien à publier (vide).")
+                        schedule_delete([m], 5)
+                        return
+                elif len(files) == 1:
+                    f = files[0]
+                    if f["type"] == "photo":
+                        await context.bot.send_photo(
+                            chat_id=PUBLIC_GROUP_ID, photo=f["file_id"],
+                            caption=caption_for_public, message_thread_id=target_thread_id,
+                            rate_limit_args=LANE_PUBLISH
+                        )
+                    else:
+                        await context.bot.send_video(
+                            chat_id=PUBLIC_GROUP_ID, video=f["file_id"],
+                            caption=caption_for_public, message_thread_id=target_thread_id,
+                            rate_limit_args=LANE_PUBLISH
+                        )
+                else:
+                    media_group = []
+                    for i, f in enumerate(files):
+                        caption = caption_for_public if i == 0 else None
+                        if f["type"] == "photo":
+                            media_group.append(InputMediaPhoto(media=f["file_id"], caption=caption))
+                        else:
+                            media_group.append(InputMediaVideo(media=f["file_id"], caption=caption))
+                    await context.bot.send_media_group(
+                        chat_id=PUBLIC_GROUP_ID, media=media_group,
+                        message_thread_id=target_thread_id,
+                        rate_limit_args=LANE_PUBLISH
+                    )
 
                 try:
-                    if user_id:
-                        hours = mute_duration // 3600
+                    user_chat_id = _extract_user_id_from_report_id(report_id)
+                    if user_chat_id:
                         await context.bot.send_message(
-                            chat_id=user_id,
-                            text=f"❌ Votre soumission a été rejetée.\n\nVous avez été restreint d'envoyer de nouveaux signalements pour {hours} heure(s)."
+                            chat_id=user_chat_id,
+                            text="✅ Ton signalement a été publié dans le canal @AccidentsFR."
                         )
                 except Exception as e:
-                    print(f"[NOTIFY USER REJECTMUTE] {e}")
+                    print(f"[NOTIFY USER APPROVE] {e}")
 
-                m = await context.bot.send_message(ADMIN_GROUP_ID, "🔇 Rejeté + mute 1h.")
-                asyncio.create_task(delete_after_delay([m], 5))
+                _inc_counter("published_total", 1)
+                _add_event("published", {"report_id": report_id})
+                async with DB.write() as db:
+                    await db.execute("DELETE FROM pending_reports WHERE report_id = ?", (report_id,))
+
+                m = await context.bot.send_message(ADMIN_GROUP_ID, "✅ Publié dans le groupe public.")
+                schedule_delete([m], 5)
                 await admin_outbox_delete(report_id, context.bot)
-                return
 
-            if action == "EDIT":
-                current_text = info.get("text", "")
-                try:
-                    sent_prompt = await context.bot.send_message(
-                        chat_id=ADMIN_GROUP_ID,
-                        text=f"✏️ **Modification en cours...**\n\n**Texte actuel :**\n`{current_text}`\n\nEnvoyez le nouveau texte. (/cancel pour annuler)",
-                        parse_mode="Markdown"
-                    )
-                    prompt_message_id = sent_prompt.message_id
+            except Exception as e:
+                print(f"[PUBLISH ERR] {e}")
+                m = await context.bot.send_message(ADMIN_GROUP_ID, f"⚠️ Erreur publication: {e}")
+                schedule_delete([m], 8)
+            return
 
-                    await db.execute(
-                        "INSERT OR REPLACE INTO edit_state (chat_id, report_id, prompt_message_id) VALUES (?, ?, ?)",
-                        (chat_id, report_id, prompt_message_id)
-                    )
-                    await db.commit()
-                except Exception as e:
-                    print(f"[EDIT BUTTON] {e}")
-                    if 'sent_prompt' in locals():
-                        await sent_prompt.delete()
-                    m = await context.bot.send_message(ADMIN_GROUP_ID, "⚠️ Une modification est déjà en cours. /cancel d'abord.")
-                    asyncio.create_task(delete_after_delay([m], 8))
-                return
+    except Exception as e:
+        print(f"[ON_BUTTON_CLICK] {e}")
 
-            if action == "APPROVE":
-                files = info["files"]
-                text = (info["text"] or "").strip()
-                caption_for_public = text if text else None
-                text_lower = text.lower() if text else ""
+# =========================
+# LIMITES API TELEGRAM — GOUVERNEUR
+# =========================
+# Voies de priorité (0 = la plus urgente)
+LANE_ENFORCE, LANE_PUBLISH, LANE_ADMIN, LANE_CLEANUP = 0, 1, 2, 3
+LANE_NAMES = {LANE_ENFORCE: "enforce", LANE_PUBLISH: "publish", LANE_ADMIN: "admin", LANE_CLEANUP: "cleanup"}
 
-                if any(word in text_lower for word in accident_keywords):
-                    target_thread_id = PUBLIC_TOPIC_VIDEOS_ID
-                elif any(word in text_lower for word in radar_keywords):
-                    target_thread_id = PUBLIC_TOPIC_RADARS_ID
-                else:
-                    target_thread_id = PUBLIC_TOPIC_GENERAL_ID
+_ENFORCE_ENDPOINTS = {"restrictChatMember", "banChatMember", "setChatPermissions"}
+_CLEANUP_ENDPOINTS = {"deleteMessage", "deleteMessages"}
+_CHAT_BUDGET_ENDPOINTS = {"copyMessage", "copyMessages", "forwardMessage", "forwardMessages"}
 
-                try:
-                    if not files:
-                        if text:
-                            await context.bot.send_message(
-                                chat_id=PUBLIC_GROUP_ID, text=text,
-                                message_thread_id=target_thread_id
-                            )
-                        else:
-                            m = await context.bot.send_message(ADMIN_GROUP_ID, "❌ Rien à publier (vide).")
-                            asyncio.create_task(delete_after_delay([m], 5))
-                            return
-                    elif len(files) == 1:
-                        f = files[0]
-                        if f["type"] == "photo":
-                            await context.bot.send_photo(
-                                chat_id=PUBLIC_GROUP_ID, photo=f["file_id"],
-                                caption=caption_for_public, message_thread_id=target_thread_id
-                            )
-                        else:
-                            await context.bot.send_video(
-                                chat_id=PUBLIC_GROUP_ID, video=f["file_id"],
-                                caption=caption_for_public, message_thread_id=target_thread_id
-                            )
-                    else:
-                        media_group = []
-                        for i, f in enumerate(files):
-                            caption = caption_for_public if i == 0 else None
-                            if f["type"] == "photo":
-                                media_group.append(InputMediaPhoto(media=f["file_id"], caption=caption))
-                            else:
-                                media_group.append(InputMediaVideo(media=f["file_id"], caption=caption))
-                        await context.bot.send_media_group(
-                            chat_id=PUBLIC_GROUP_ID, media=media_group,
-                            message_thread_id=target_thread_id
-                        )
+_API_LANE = contextvars.ContextVar("api_lane", default=None)
 
-                    try:
-                        user_chat_id = _extract_user_id_from_report_id(report_id)
-                        if user_chat_id:
-                            await context.bot.send_message(
-                                chat_id=user_chat_id,
-                                text="✅ Ton signalement a été publié dans le canal @AccidentsFR."
-                            )
-                    except Exception as e:
-                        print(f"[NOTIFY USER APPROVE] {e}")
+@contextmanager
+def api_lane(lane: int):
+    """Force la voie des appels Bot API faits dans ce bloc (tâches filles comprises)."""
+    token = _API_LANE.set(lane)
+    try:
+        yield
+    finally:
+        _API_LANE.reset(token)
+
+class TokenBucket:
+    """Seau à jetons (rate jetons/s, capacité = rafale max) avec blocage temporaire (flood-wait)."""
+    __slots__ = ("rate", "capacity", "tokens", "ts", "blocked_until")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.ts = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.ts) * self.rate)
+        self.ts = now
+
+    def wait_time(self, n: float = 1) -> float:
+        """Attente (s) avant de pouvoir consommer n jetons, sans les consommer."""
+        now = time.monotonic()
+        self._refill(now)
+        n = min(n, self.capacity)
+        wait = (n - self.tokens) / self.rate if self.tokens < n else 0.0
+        return max(wait, self.blocked_until - now)
+
+    def take(self, n: float = 1):
+        self.tokens -= min(n, self.capacity)
+
+    def block(self, seconds: float):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+class ApiGovernor(BaseRateLimiter):
+    """Ordonnanceur de tous les appels Bot API sortants (branché via ApplicationBuilder.rate_limiter).
+
+    - Budget global (TG_GLOBAL_MSG_PER_SEC) pour tous les appels, budget par chat
+      pour les envois (20/min en groupe, 1/s en privé).
+    - Quand le budget manque, les requêtes attendent dans une file triée par voie :
+      enforce > publish > admin > cleanup. Un chat bloqué ne retarde pas les autres.
+    - RetryAfter : le chat (ou le bot entier) est bloqué une seule fois pour toutes
+      les requêtes en attente, puis la requête est rejouée (GOV_MAX_RETRIES).
+    """
+
+    def __init__(self, max_retries: int = 2):
+        self.max_retries = max_retries
+        self.global_bucket = TokenBucket(TG_GLOBAL_MSG_PER_SEC, TG_GLOBAL_MSG_PER_SEC)
+        self._chats = {}
+        self._pending = []       # (lane, seq, chat_id, cost, future), trié
+        self._seq = 0
+        self._wake = None
+        self._task = None
+        self._loop = None
+        self.stats = {
+            name: {"calls": 0, "throttled": 0, "wait_sec": 0.0, "deferred": 0, "retries": 0, "flood_waits": 0}
+            for name in LANE_NAMES.values()
+        }
 
-                    await _inc_counter(db, "published_total", 1)
-                    await _add_event(db, "published", {"report_id": report_id})
+    async def initialize(self) -> None:
+        self._ensure_scheduler()
 
-                    await db.execute("DELETE FROM pending_reports WHERE report_id = ?", (report_id,))
-                    await db.commit()
+    async def shutdown(self) -> None:
+        # Les requêtes en attente restent en file : Bot.shutdown() puis Bot.initialize() (reprise
+        # réseau du Supervisor) relancent l'ordonnanceur, qui les sert. Les annuler tuerait les
+        # boucles longues qui les attendent (worker_loop, DeletionScheduler.run).
+        if self._task is not None:
+            self._task.cancel()
+        self._task = None
+
+    def _ensure_scheduler(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._task is not None and not self._task.done():
+            return
+        if self._loop is not loop:
+            self._loop = loop
+            self._pending.clear()   # futures d'une autre boucle : inutilisables
+            self._wake = asyncio.Event()
+        self._task = loop.create_task(self._scheduler())
+
+    def _bucket(self, chat_id: int) -> TokenBucket:
+        b = self._chats.get(chat_id)
+        if b is None:
+            if len(self._chats) > 5000:
+                idle = time.monotonic() - 120
+                for cid in [c for c, bk in self._chats.items() if bk.ts < idle and bk.blocked_until < idle]:
+                    del self._chats[cid]
+            if chat_id < 0:
+                b = TokenBucket(TG_GROUP_MSG_PER_MIN / 60.0, TG_GROUP_MSG_PER_MIN)
+            else:
+                b = TokenBucket(TG_PRIVATE_MSG_PER_SEC, TG_PRIVATE_MSG_PER_SEC)
+            self._chats[chat_id] = b
+        return b
+
+    @staticmethod
+    def _lane_for(endpoint: str, rate_limit_args) -> int:
+        if isinstance(rate_limit_args, int) and rate_limit_args in LANE_NAMES:
+            return rate_limit_args
+        lane = _API_LANE.get()
+        if lane is not None:
+            return lane
+        if endpoint in _ENFORCE_ENDPOINTS:
+            return LANE_ENFORCE
+        if endpoint in _CLEANUP_ENDPOINTS:
+            return LANE_CLEANUP
+        return LANE_ADMIN
+
+    def _wait_for(self, chat_id, cost) -> tuple[float, bool]:
+        """(attente, limité_par_le_global)"""
+        g = self.global_bucket.wait_time(1)
+        if g > 0:
+            return g, True
+        if chat_id is None:
+            return 0.0, False
+        return self._bucket(chat_id).wait_time(cost), False
+
+    def _grant(self, chat_id, cost):
+        self.global_bucket.take(1)
+        if chat_id is not None:
+            self._bucket(chat_id).take(cost)
+
+    async def _scheduler(self):
+        while True:
+            next_wait = None
+            granted = False
+            for i, (lane, _, chat_id, cost, fut) in enumerate(self._pending):
+                if fut.done():
+                    del self._pending[i]
+                    granted = True
+                    break
+                wait, global_limited = self._wait_for(chat_id, cost)
+                if wait <= 0:
+                    del self._pending[i]
+                    self._grant(chat_id, cost)
+                    fut.set_result(None)
+                    granted = True
+                    break
+                next_wait = wait if next_wait is None else min(next_wait, wait)
+                if global_limited:
+                    break  # budget global : priorité stricte, les voies basses ne doublent pas
+            if granted:
+                continue
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=next_wait)
+            except asyncio.TimeoutError:
+                pass
 
-                    m = await context.bot.send_message(ADMIN_GROUP_ID, "✅ Publié dans le groupe public.")
-                    asyncio.create_task(delete_after_delay([m], 5))
-                    await admin_outbox_delete(report_id, context.bot)
+    async def _admit(self, lane: int, chat_id, cost: int):
+        st = self.stats[LANE_NAMES[lane]]
+        st["calls"] += 1
+        self._ensure_scheduler()
+        # Chemin rapide : personne n'attend et le budget est là.
+        if not self._pending and self._wait_for(chat_id, cost)[0] <= 0:
+            self._grant(chat_id, cost)
+            return
+        t0 = time.monotonic()
+        blocked = chat_id is not None and self._bucket(chat_id).blocked_until > t0
+        fut = self._loop.create_future()
+        self._seq += 1
+        bisect.insort(self._pending, (lane, self._seq, chat_id, cost, fut), key=lambda it: (it[0], it[1]))
+        self._wake.set()
+        await fut
+        waited = time.monotonic() - t0
+        st["deferred" if blocked else "throttled"] += 1
+        st["wait_sec"] += waited
+
+    def flood_wait(self, chat_id, seconds: float):
+        if chat_id is None:
+            self.global_bucket.block(seconds)
+        else:
+            self._bucket(chat_id).block(seconds)
+        if self._wake is not None:
+            self._wake.set()
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        lane = self._lane_for(endpoint, rate_limit_args)
+        st = self.stats[LANE_NAMES[lane]]
+        # Toujours le chat visé : un flood-wait (suppressions, restrictions d'un raid…) ne bloque que lui.
+        # Le budget d'envoi par chat (cost > 0) ne concerne que les envois ; cost = 0 respecte juste le blocage.
+        try:
+            chat_id = int((data or {}).get("chat_id"))
+        except (TypeError, ValueError):
+            chat_id = None
+        cost = 0
+        if endpoint.startswith("send") or endpoint in _CHAT_BUDGET_ENDPOINTS:
+            cost = max(1, len(data.get("media") or ())) if endpoint == "sendMediaGroup" else 1
+        labels = (("method", endpoint),)
+        for attempt in range(self.max_retries + 1):
+            await self._admit(lane, chat_id, cost)
+            t0 = time.perf_counter()
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                METRICS.inc("afbot_api_errors_total", labels)
+                st["flood_waits"] += 1
+                self.flood_wait(chat_id, _retry_after_sec(e))
+                if attempt >= self.max_retries:
+                    raise
+                st["retries"] += 1
+            except Exception:
+                METRICS.inc("afbot_api_errors_total", labels)
+                raise
+            finally:
+                METRICS.observe("afbot_api_request_seconds", time.perf_counter() - t0, labels)
 
-                except Exception as e:
-                    print(f"[PUBLISH ERR] {e}")
-                    m = await context.bot.send_message(ADMIN_GROUP_ID, f"⚠️ Erreur publication: {e}")
-                    asyncio.create_task(delete_after_delay([m], 8))
-                return
+API_GOVERNOR = ApiGovernor()
+
+def _retry_after_sec(e: RetryAfter) -> float:
+    ra = e.retry_after
+    return float(ra.total_seconds() if hasattr(ra, "total_seconds") else ra)
 
+# =========================
+# FILE DE MODÉRATION (durable)
+# =========================
+REVIEW_RETRY_MIN_SEC = 5
+REVIEW_RETRY_MAX_SEC = 300
+REVIEW_MAX_ATTEMPTS = int(os.getenv("REVIEW_MAX_ATTEMPTS", "8"))   # puis delivery_state = 'failed'
+
+class ReviewQueue:
+    """File de modération durable, adossée à pending_reports.delivery_state.
+
+    La BDD fait foi : un signalement inséré avec delivery_state='queued' sera
+    livré au groupe admin au moins une fois, même après un redémarrage
+    (rejoué par `replay()` dans _post_init). La file mémoire ne transporte
+    que des report_id et sert de réveil pour le worker.
+    """
+
+    def __init__(self):
+        self._q = None
+        self._loop = None
+        self._queued = set()
+        self._delivering = set()    # en cours chez un worker
+        self._again = set()         # remis en file pendant sa livraison : relancé à la fin
+        self._attempts = {}
+        self.inflight = 0
+        self._busy_since = None
+        self.stats = {"delivered": 0, "retries": 0, "failed": 0, "last_drain_sec": None, "last_latency_sec": None}
+
+    def _bind_loop(self):
+        loop = asyncio.get_running_loop()
+        if loop is self._loop:
+            return
+        # Nouvelle boucle (redémarrage) : l'ancienne file est perdue, replay() la reconstruit.
+        self._loop = loop
+        self._q = asyncio.Queue()
+        self._queued.clear()
+        self._delivering.clear()
+        self._again.clear()
+        self.inflight = 0
+        self._busy_since = None
+
+    def qsize(self) -> int:
+        return self._q.qsize() if self._q is not None else 0
+
+    def _put_nowait(self, report_id: str):
+        self._bind_loop()
+        if report_id in self._queued:
+            return
+        if report_id in self._delivering:
+            # Jamais deux livraisons simultanées d'un même signalement : on attend la fin de celle-ci.
+            self._again.add(report_id)
+            return
+        self._queued.add(report_id)
+        if self._busy_since is None:
+            self._busy_since = time.monotonic()
+        self._q.put_nowait(report_id)
+
+    async def put(self, report_id: str):
+        self._put_nowait(report_id)
+
+    def put_later(self, report_id: str, delay: float):
+        self._bind_loop()
+        self._loop.call_later(delay, self._put_nowait, report_id)
+
+    async def get(self) -> str:
+        self._bind_loop()
+        report_id = await self._q.get()
+        self._queued.discard(report_id)
+        self._delivering.add(report_id)
+        self.inflight += 1
+        return report_id
+
+    def task_done(self, report_id: str):
+        self.inflight -= 1
+        self._q.task_done()
+        self._delivering.discard(report_id)
+        if report_id in self._again:
+            self._again.discard(report_id)
+            self._put_nowait(report_id)
+        if self._busy_since is not None and self.inflight == 0 and self._q.empty():
+            self.stats["last_drain_sec"] = time.monotonic() - self._busy_since
+            self._busy_since = None
+
+    @property
+    def depth(self) -> int:
+        return self.qsize() + self.inflight
+
+    def retry_delay(self, report_id: str) -> float:
+        self.stats["retries"] += 1
+        n = self._attempts.get(report_id, 0) + 1
+        self._attempts[report_id] = n
+        return min(REVIEW_RETRY_MIN_SEC * (2 ** (n - 1)), REVIEW_RETRY_MAX_SEC)
+
+    def exhausted(self, report_id: str) -> bool:
+        """Vrai si l'échec en cours est la REVIEW_MAX_ATTEMPTS-ième tentative."""
+        return self._attempts.get(report_id, 0) + 1 >= REVIEW_MAX_ATTEMPTS
+
+    def forget(self, report_id: str):
+        self._attempts.pop(report_id, None)
+
+    async def replay(self) -> int:
+        """Remet en file les signalements jamais livrés (index partiel, pas de scan complet)."""
+        async with DB.read() as db:
+            async with db.execute(
+                "SELECT report_id FROM pending_reports WHERE delivery_state = 'queued' ORDER BY created_ts"
+            ) as cur:
+                rows = await cur.fetchall()
+        for (rid,) in rows:
+            await self.put(rid)
+        return len(rows)
+
+REVIEW_QUEUE = ReviewQueue()
+
+async def _deliver_report(application: Application, report_id: str) -> bool:
+    """Livre un signalement 'queued'. Idempotent : un envoi partiel précédent est d'abord effacé.
+    Le passage à 'delivered' exige la génération lue au départ : si le signalement a été modifié
+    pendant l'envoi, cette livraison est périmée et la suivante (déjà en file) la remplace."""
+    async with DB.read() as db:
+        async with db.execute(
+            "SELECT text, files_json, user_name, preview_text, delivery_state, created_ts, delivery_gen "
+            "FROM pending_reports WHERE report_id = ?",
+            (report_id,)
+        ) as cur:
+            row = await cur.fetchone()
+        if not row or row[4] != "queued":
+            return True  # déjà traité, livré ou purgé
+        async with db.execute("SELECT 1 FROM admin_outbox WHERE report_id = ? LIMIT 1", (report_id,)) as cur:
+            partial = await cur.fetchone()
+
+    text, files_json, user_name, preview_text, _, created_ts, gen = row
+    files = json.loads(files_json or "[]")
+    if partial:
+        await admin_outbox_delete(report_id, application.bot)
+    if not preview_text:
+        preview_text = _make_admin_preview(user_name, text, is_album=len(files) > 1)
+
+    if not await send_report_to_admin(application, report_id, preview_text, files, text):
+        return False
+    async with DB.write() as db:
+        cur = await db.execute(
+            "UPDATE pending_reports SET delivery_state = 'delivered' "
+            "WHERE report_id = ? AND delivery_state = 'queued' AND delivery_gen = ?",
+            (report_id, gen)
+        )
+        delivered = cur.rowcount
+        await cur.close()
+    if not delivered:
+        # Modifié (ou traité) pendant l'envoi : la livraison suivante efface ces messages et renvoie.
+        print(f"[DELIVER] {report_id} : génération {gen} périmée pendant l'envoi")
+        return True
+    REVIEW_QUEUE.stats["delivered"] += 1
+    if created_ts:
+        REVIEW_QUEUE.stats["last_latency_sec"] = max(0.0, _now() - created_ts)
+    return True
+
+async def _fail_report(application: Application, report_id: str, reason: str):
+    """État terminal 'failed' : plus de nouvel essai, envoi partiel effacé, une seule alerte admin."""
+    async with DB.write() as db:
+        cur = await db.execute(
+            "UPDATE pending_reports SET delivery_state = 'failed' WHERE report_id = ? AND delivery_state = 'queued'",
+            (report_id,)
+        )
+        failed = cur.rowcount
+        await cur.close()
+    REVIEW_QUEUE.forget(report_id)
+    if not failed:
+        return  # modifié (re-file) ou traité entre-temps
+    REVIEW_QUEUE.stats["failed"] += 1
+    print(f"[WORKER] {report_id} abandonné : {reason}")
+    try:
+        await admin_outbox_delete(report_id, application.bot)
     except Exception as e:
-        print(f"[ON_BUTTON_CLICK] {e}")
+        print(f"[WORKER] nettoyage {report_id} : {e}")
+    await notify_admin(f"⚠️ Signalement {report_id} impossible à livrer au groupe admin ({reason}).", force=True)
 
 # =========================
 # WORKERS
 # =========================
-async def worker_loop(application: Application):
-    print("👷 Worker démarré")
+async def worker_loop(application: Application, worker_no: int = 0):
+    print(f"👷 Worker {worker_no} démarré")
     while True:
         try:
-            item = await REVIEW_QUEUE.get()
-            rid = item["report_id"]
-            preview = item["preview_text"]
-            files = item["files"]
-            await send_report_to_admin(application, rid, preview, files)
-            REVIEW_QUEUE.task_done()
+            rid = await REVIEW_QUEUE.get()
+            try:
+                try:
+                    ok = await _deliver_report(application, rid)
+                except RetryAfter as e:
+                    # Flood-wait persistant malgré les reprises du gouverneur : on replanifie.
+                    wait = _retry_after_sec(e)
+                    REVIEW_QUEUE.stats["retries"] += 1
+                    print(f"[WORKER {worker_no}] flood-wait {wait:.0f}s, {rid} replanifié")
+                    REVIEW_QUEUE.put_later(rid, wait)
+                    continue
+                except (BadRequest, Forbidden) as e:
+                    # Refus définitif (file_id périmé, légende trop longue, bot exclu…) : rejouer n'y changera rien.
+                    await _fail_report(application, rid, f"{type(e).__name__}: {e}")
+                    continue
+                except asyncio.CancelledError:
+                    if not _foreign_cancel():
+                        raise
+                    print(f"[WORKER {worker_no}] {rid}: envoi annulé")
+                    ok = False
+                except Exception as e:
+                    # Erreurs passagères (NetworkError, TimedOut, BDD occupée) : nouvel essai avec backoff.
+                    print(f"[WORKER {worker_no}] {rid}: {e}")
+                    ok = False
+                if ok:
+                    REVIEW_QUEUE.forget(rid)
+                elif REVIEW_QUEUE.exhausted(rid):
+                    await _fail_report(application, rid, f"{REVIEW_MAX_ATTEMPTS} tentatives échouées")
+                else:
+                    delay = REVIEW_QUEUE.retry_delay(rid)
+                    print(f"[WORKER {worker_no}] {rid} non livré, nouvel essai dans {delay}s")
+                    REVIEW_QUEUE.put_later(rid, delay)
+            finally:
+                REVIEW_QUEUE.task_done(rid)
+        except asyncio.CancelledError:
+            if not _foreign_cancel():
+                raise
+            print(f"[WORKER {worker_no}] annulation externe ignorée")
+            await asyncio.sleep(1)
         except Exception as e:
-            print(f"[WORKER] {e}")
+            print(f"[WORKER {worker_no}] {e}")
             await asyncio.sleep(1)
 
-async def cleaner_loop():
-    print("🧽 Cleaner démarré")
+# =========================
+# MAINTENANCE
+# =========================
+async def _delete_batched(table: str, where: str, params: tuple = ()) -> int:
+    """DELETE par lots de MAINT_BATCH_ROWS (une transaction courte par lot) ; renvoie le nombre de lignes."""
+    total = 0
     while True:
-        await asyncio.sleep(60)
+        async with DB.write() as db:
+            cur = await db.execute(
+                f"DELETE FROM {table} WHERE rowid IN (SELECT rowid FROM {table} WHERE {where} LIMIT ?)",
+                (*params, MAINT_BATCH_ROWS)
+            )
+            n = cur.rowcount
+        total += n
+        if n < MAINT_BATCH_ROWS:
+            return total
+        await asyncio.sleep(MAINT_BATCH_PAUSE_SEC)  # laisse passer les autres écrivains
+
+
+class Maintenance:
+    """
+    Tâches périodiques à échéance réelle : chaque tâche a son intervalle et sa prochaine date,
+    la dernière exécution est mémorisée dans bot_state ('maint:<nom>') pour survivre aux redémarrages.
+    Métriques par tâche : exécutions, lignes, durée dernière/max, erreurs.
+    """
+
+    def __init__(self):
+        self.jobs = {}
+
+    def add(self, name: str, interval_sec: float, fn):
+        self.jobs[name] = {
+            "interval": interval_sec, "fn": fn, "due": 0.0,
+            "runs": 0, "rows": 0, "last_ms": 0.0, "max_ms": 0.0, "errors": 0, "last_ts": None,
+        }
+
+    async def _load_due(self):
         now = _now()
+        async with DB.read() as db:
+            async with db.execute("SELECT key, value FROM bot_state WHERE key LIKE 'maint:%'") as cur:
+                last_runs = {k[6:]: float(v) for k, v in await cur.fetchall()}
+        for name, job in self.jobs.items():
+            last = last_runs.get(name)
+            job["last_ts"] = last
+            job["due"] = (last + job["interval"]) if last else now + 30
+
+    async def _run_job(self, name: str, job: dict):
+        t0 = time.perf_counter()
         try:
-            async with aiosqlite.connect(DB_NAME) as db:
-                cutoff_ts_pending = int(now - CLEAN_MAX_AGE_PENDING)
-                await db.execute("DELETE FROM pending_reports WHERE created_ts < ?", (cutoff_ts_pending,))
-                cutoff_ts_archive = int(now - CLEAN_MAX_AGE_ARCHIVE)
-                await db.execute("DELETE FROM media_archive WHERE timestamp < ?", (cutoff_ts_archive,))
-                if int(now) % (6*3600) == 0:
-                    await db.execute("DELETE FROM edit_state")
-                    await db.execute("DELETE FROM muted_users WHERE mute_until_ts < ?", (int(now),))
-                    await db.execute("DELETE FROM admin_outbox")
-                await db.commit()
+            job["rows"] += int(await job["fn"]() or 0)
+        except Exception as e:
+            job["errors"] += 1
+            print(f"[MAINTENANCE {name}] {e}")
+        ms = (time.perf_counter() - t0) * 1000
+        now = _now()
+        job["runs"] += 1
+        job["last_ms"] = ms
+        job["max_ms"] = max(job["max_ms"], ms)
+        job["last_ts"] = now
+        job["due"] = now + job["interval"]
+        WRITE_BEHIND.add("INSERT OR REPLACE INTO bot_state (key, value) VALUES (?, ?)", (f"maint:{name}", str(now)))
+
+    async def run(self):
+        print("🧽 Maintenance démarrée")
+        try:
+            await self._load_due()
+        except Exception as e:
+            print(f"[MAINTENANCE] échéances : {e}")
+        while True:
+            name, job = min(self.jobs.items(), key=lambda kv: kv[1]["due"])
+            delay = job["due"] - _now()
+            if delay > 0:
+                await asyncio.sleep(min(delay, 60))
+                continue
+            await self._run_job(name, job)
 
-            cutoff_ts_spam = now - CLEAN_MAX_AGE_SPAM
-            for uid in list(LAST_MSG_TIME.keys()):
-                if LAST_MSG_TIME[uid] < cutoff_ts_spam:
-                    LAST_MSG_TIME.pop(uid, None)
-            for uid in list(SPAM_COUNT.keys()):
-                if SPAM_COUNT[uid]["last"] < cutoff_ts_spam:
-                    SPAM_COUNT.pop(uid, None)
+    def summary(self) -> str:
+        return " · ".join(
+            f"{name} {job['last_ms']:.0f}ms/{job['rows']}" + (f"/⚠️{job['errors']}" if job["errors"] else "")
+            for name, job in self.jobs.items() if job["runs"]
+        ) or "—"
 
-            cutoff_ts_albums = now - CLEAN_MAX_AGE_ALBUMS
-            for mgid in list(TEMP_ALBUMS.keys()):
-                if TEMP_ALBUMS[mgid]["ts"] < cutoff_ts_albums:
-                    TEMP_ALBUMS.pop(mgid, None)
 
-        except Exception as e:
-            print(f"[CLEANER] {e}")
+async def _job_pending_reports():
+    return await _delete_batched("pending_reports", "created_ts < ?", (int(_now() - CLEAN_MAX_AGE_PENDING),))
+
+async def _job_media_archive():
+    return await _delete_batched("media_archive", "timestamp < ?", (int(_now() - CLEAN_MAX_AGE_ARCHIVE),))
+
+async def _job_memory():
+    now = _now()
+    n = MUTE_INDEX.evict(int(now))
+    n += PUBLIC_RATE.prune(CLEAN_MAX_AGE_SPAM)
+    n += PRIVATE_RATE.prune(CLEAN_MAX_AGE_SPAM)
+    cutoff_ts_albums = now - CLEAN_MAX_AGE_ALBUMS
+    for mgid in list(TEMP_ALBUMS.keys()):
+        if TEMP_ALBUMS[mgid]["ts"] < cutoff_ts_albums:
+            stale = TEMP_ALBUMS.pop(mgid, None)
+            if stale and stale["timer"] is not None:
+                stale["timer"].cancel()
+            n += 1
+    cutoff_ts_forwarded = now - CLEAN_MAX_AGE_FORWARDED
+    for mgid in list(ALREADY_FORWARDED_ALBUMS.keys()):
+        if ALREADY_FORWARDED_ALBUMS[mgid] < cutoff_ts_forwarded:
+            ALREADY_FORWARDED_ALBUMS.pop(mgid, None)
+            n += 1
+    return n
+
+async def _job_edit_state():
+    return await _delete_batched("edit_state", "1")
+
+async def _job_muted_users():
+    return await _delete_batched("muted_users", "mute_until_ts < ?", (int(_now()),))
+
+async def _job_admin_outbox():
+    # Orphelins : messages admin dont le signalement n'existe plus (purgé par âge)
+    return await _delete_batched(
+        "admin_outbox",
+        "NOT EXISTS (SELECT 1 FROM pending_reports p WHERE p.report_id = admin_outbox.report_id)"
+    )
+
+async def _job_scheduled_deletions():
+    return await _delete_batched("scheduled_deletions", "due_ts < ?", (_now() - DELETE_MAX_AGE_SEC,))
+
+async def _job_stats():
+    now = _now()
+    n = await _delete_batched("stats_events", "ts < ?", (int(now - STATS_RAW_RETENTION_DAYS * 86400),))
+    # stats_rollup est WITHOUT ROWID et ne perd que quelques seaux par passage : DELETE direct
+    async with DB.write() as db:
+        cur = await db.execute(
+            "DELETE FROM stats_rollup WHERE hour_ts < ?", (int(now - STATS_ROLLUP_RETENTION_DAYS * 86400),)
+        )
+        n += cur.rowcount
+    return n
+
+async def _job_vacuum():
+    async with DB.write() as db:
+        async with db.execute("PRAGMA auto_vacuum") as cur:
+            mode = (await cur.fetchone())[0]
+        if mode == 2:  # INCREMENTAL
+            async with db.execute(f"PRAGMA incremental_vacuum({MAINT_VACUUM_PAGES})") as cur:
+                await cur.fetchall()
+        await db.execute("PRAGMA optimize")
+    return 0
+
+
+MAINTENANCE = Maintenance()
+MAINTENANCE.add("memory", 60, _job_memory)
+MAINTENANCE.add("pending", 60, _job_pending_reports)
+MAINTENANCE.add("archive", 300, _job_media_archive)
+MAINTENANCE.add("edit_state", 6 * 3600, _job_edit_state)
+MAINTENANCE.add("muted", 6 * 3600, _job_muted_users)
+MAINTENANCE.add("outbox", 6 * 3600, _job_admin_outbox)
+MAINTENANCE.add("deletions", 6 * 3600, _job_scheduled_deletions)
+MAINTENANCE.add("stats", 6 * 3600, _job_stats)
+MAINTENANCE.add("vacuum", 24 * 3600, _job_vacuum)
 
 # =========================
-# KEEP ALIVE + Flask
+# CLIENT HTTP SORTANT (notifications, keep-alive)
 # =========================
-def keep_alive():
+class OutboundHttp:
+    """httpx.AsyncClient partagé (connexions réutilisées), recréé si la boucle change."""
+
+    def __init__(self):
+        self._client = None
+        self._loop = None
+
+    def client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            self._client = httpx.AsyncClient(timeout=5, limits=httpx.Limits(max_connections=4))
+            self._loop = loop
+        return self._client
+
+    async def aclose(self):
+        client, self._client, self._loop = self._client, None, None
+        if client is not None:
+            try:
+                await client.aclose()
+            except Exception as e:
+                print(f"[HTTP OUT] {e}")
+
+HTTP_OUT = OutboundHttp()
+
+
+async def notify_admin(text: str, *, force: bool = False):
+    """Message au groupe admin par appel HTTP direct : utilisable quand l'Application est arrêtée."""
+    global _last_admin_notify_ts
+    now = _now()
+    if not force and (now - _last_admin_notify_ts) < ADMIN_NOTIFY_COOLDOWN_SEC:
+        print("[NOTIFY_ADMIN] Skipped (cooldown)")
+        return
+    try:
+        await HTTP_OUT.client().post(
+            f"{TELEGRAM_API_URL}{BOT_TOKEN}/sendMessage", data={"chat_id": ADMIN_GROUP_ID, "text": text}
+        )
+        _last_admin_notify_ts = now
+    except Exception as e:
+        print(f"[NOTIFY_ADMIN ERR] {e}")
+
+
+async def keep_alive_loop():
+    # Mode polling uniquement : en webhook, les updates poussées gardent l'instance éveillée.
     while True:
         try:
-            requests.get(KEEP_ALIVE_URL, timeout=5)
+            await HTTP_OUT.client().get(KEEP_ALIVE_URL)
         except Exception:
             pass
-        time.sleep(600)
+        await asyncio.sleep(KEEP_ALIVE_INTERVAL_SEC)
 
-flask_app = Flask(__name__)
+# =========================
+# SERVEUR HTTP (aiohttp, même boucle que le bot)
+# =========================
+_WH_ACCEPTED = (("status", "accepted"),)
+_WH_FORBIDDEN = (("status", "forbidden"),)
+_WH_INVALID = (("status", "invalid"),)
+
+
+async def metrics_scrape() -> str:
+    await WRITE_BEHIND.flush()  # compteurs à jour
+    async with DB.read() as db:
+        async with db.execute("SELECT key, value FROM counters") as cur:
+            for key, value in await cur.fetchall():
+                METRICS.set("afbot_counter_total", int(value or 0), (("key", key),))
+    METRICS.set("afbot_review_queue_depth", REVIEW_QUEUE.depth)
+    METRICS.set("afbot_write_behind_pending", WRITE_BEHIND.pending)
+    METRICS.set("afbot_updates_inflight", UPDATE_PROCESSOR.inflight)
+    return METRICS.render()
+
+
+class HttpServer:
+    """
+    Serveur HTTP sur PORT, démarré dans _post_init sur la boucle de l'Application :
+    `/`, `/healthz`, `/readyz`, `/metrics` et, en mode webhook, POST WEBHOOK_PATH. Les updates reçues sont validées (X-Telegram-Bot-Api-Secret-Token)
+    puis déposées dans application.update_queue, comme le ferait l'Updater.
+    """
+
+    def __init__(self):
+        self.application = None
+        self._runner = None
+
+    def build_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/", self._hello)
+        app.router.add_get("/healthz", self._healthz)
+        app.router.add_get("/readyz", self._readyz)
+        app.router.add_get("/metrics", self._metrics)
+        if WEBHOOK_URL:
+            app.router.add_post(WEBHOOK_PATH, self._webhook)
+        return app
+
+    async def start(self, application: Application):
+        self.application = application
+        self._runner = web.AppRunner(self.build_app(), access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, "0.0.0.0", PORT).start()
+        print(f"🌐 Serveur HTTP sur :{PORT}" + (f" (webhook {WEBHOOK_PATH})" if WEBHOOK_URL else ""))
+
+    async def stop(self):
+        runner, self._runner = self._runner, None
+        if runner is not None:
+            await runner.cleanup()
+
+    async def _hello(self, request):
+        return web.Response(text="OK - bot alive")
+
+    async def _healthz(self, request):
+        now = _now()
+        last_ok = HEARTBEAT["last_ok_ts"]
+        get_me_age = round(now - last_ok, 1) if last_ok else None
+        if HEARTBEAT["failures"] >= HEARTBEAT_MAX_FAILURES or get_me_age is None or get_me_age > HEALTH_MAX_GET_ME_AGE_SEC:
+            status = "down"
+        elif HEARTBEAT["failures"]:
+            status = "degraded"
+        else:
+            status = "ok"
+        body = {
+            "status": status,
+            "mode": "webhook" if WEBHOOK_URL else "polling",
+            "uptime_sec": int(now - START_TIME),
+            "heartbeat": {
+                "running": HEARTBEAT["running"],
+                "failures": HEARTBEAT["failures"],
+                "last_check_age_sec": round(now - HEARTBEAT["last_check_ts"], 1) if HEARTBEAT["last_check_ts"] else None,
+            },
+            "last_get_me_age_sec": get_me_age,
+            "network_recovering": SUPERVISOR.recovering,
+            "network_recoveries": SUPERVISOR.stats["recoveries"],
+            "review_queue_depth": REVIEW_QUEUE.depth,
+            "write_behind_pending": WRITE_BEHIND.pending,
+        }
+        return web.json_response(body, status=503 if status == "down" else 200)
+
+    async def _readyz(self, request):
+        # Prêt = Application démarrée (webhook déjà enregistré le cas échéant) et BDD ouverte
+        ready = self.application is not None and self.application.running and DB.is_open
+        return web.Response(status=200 if ready else 503, text="ready" if ready else "not ready")
+
+    async def _metrics(self, request):
+        try:
+            body = await metrics_scrape()
+        except Exception as e:
+            print(f"[METRICS] {e}")
+            return web.Response(status=503, text="scrape indisponible\n")
+        return web.Response(body=body.encode(), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+    async def _webhook(self, request):
+        token = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+        if not hmac.compare_digest(token, WEBHOOK_SECRET):
+            METRICS.inc("afbot_webhook_updates_total", _WH_FORBIDDEN)
+            return web.Response(status=403)
+        try:
+            update = Update.de_json(await request.json(), self.application.bot)
+        except Exception as e:
+            # 200 malgré tout : sinon Telegram renverrait indéfiniment la même update
+            METRICS.inc("afbot_webhook_updates_total", _WH_INVALID)
+            print(f"[WEBHOOK] update illisible : {e}")
+            return web.Response(text="ignored")
+        await self.application.update_queue.put(update)
+        METRICS.inc("afbot_webhook_updates_total", _WH_ACCEPTED)
+        return web.Response(text="ok")
 
-@flask_app.route("/", methods=["GET"])
-def hello():
-    return "OK - bot alive"
+HTTP_SERVER = HttpServer()
 
-def run_flask():
-    flask_app.run(host="0.0.0.0", port=PORT, debug=False)
 
 # =========================
 # COMMANDES /lock et /unlock
@@ -1635,6 +3929,35 @@ LOCK_PERMISSIONS = ChatPermissions(
     can_pin_messages=False,
 )
 
+async def _delete_lock_notice(bot):
+    async with DB.read() as db:
+        async with db.cursor() as c:
+            await c.execute("SELECT value FROM bot_state WHERE key = 'lock_message_id'")
+            row = await c.fetchone()
+    if row:
+        try:
+            await bot.delete_message(PUBLIC_GROUP_ID, int(row[0]))
+        except Exception: pass
+
+async def _lock_public_group(bot, notice: str):
+    """Verrouille le groupe public et remplace l'avis de verrouillage (partagé /lock et auto-lock)."""
+    await bot.set_chat_permissions(chat_id=PUBLIC_GROUP_ID, permissions=LOCK_PERMISSIONS)
+    await _delete_lock_notice(bot)
+    sent_msg = await bot.send_message(chat_id=PUBLIC_GROUP_ID, text=notice)
+    async with DB.write() as db:
+        await db.execute(
+            "INSERT OR REPLACE INTO bot_state (key, value) VALUES (?, ?)",
+            ("lock_message_id", str(sent_msg.message_id))
+        )
+
+async def _unlock_public_group(bot):
+    await bot.set_chat_permissions(chat_id=PUBLIC_GROUP_ID, permissions=DEFAULT_PERMISSIONS)
+    await _delete_lock_notice(bot)
+    async with DB.write() as db:
+        await db.execute("DELETE FROM bot_state WHERE key = 'lock_message_id'")
+    sent_msg = await bot.send_message(chat_id=PUBLIC_GROUP_ID, text="🔓 Le chat est déverrouillé.")
+    schedule_delete([sent_msg], 5)
+
 async def handle_lock(update: Update, context: ContextTypes.DEFAULT_TYPE):
     msg = update.message
 
@@ -1645,38 +3968,15 @@ async def handle_lock(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     try:
-        await context.bot.set_chat_permissions(
-            chat_id=PUBLIC_GROUP_ID,
-            permissions=LOCK_PERMISSIONS
-        )
-
-        async with aiosqlite.connect(DB_NAME) as db:
-            async with db.cursor() as c:
-                await c.execute("SELECT value FROM bot_state WHERE key = 'lock_message_id'")
-                row = await c.fetchone()
-            if row:
-                try:
-                    await context.bot.delete_message(PUBLIC_GROUP_ID, int(row[0]))
-                except Exception: pass
-
-        sent_msg = await context.bot.send_message(
-            chat_id=PUBLIC_GROUP_ID,
-            text="🔒 Le chat a été temporairement verrouillé par un administrateur."
-        )
-        async with aiosqlite.connect(DB_NAME) as db:
-            await db.execute(
-                "INSERT OR REPLACE INTO bot_state (key, value) VALUES (?, ?)",
-                ("lock_message_id", str(sent_msg.message_id))
-            )
-            await db.commit()
-
+        RAID.note_manual_lock()  # un raid en cours ou terminé ne déverrouillera pas par-dessus
+        await _lock_public_group(context.bot, "🔒 Le chat a été temporairement verrouillé par un administrateur.")
         await msg.delete()
 
     except Exception as e:
         print(f"[LOCK] Erreur: {e}")
         try:
             m = await msg.reply_text(f"Erreur lors du verrouillage: {e}")
-            asyncio.create_task(delete_after_delay([msg, m], 10))
+            schedule_delete([msg, m], 10)
         except Exception: pass
 
 async def handle_unlock(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -1689,36 +3989,15 @@ async def handle_unlock(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     try:
-        await context.bot.set_chat_permissions(
-            chat_id=PUBLIC_GROUP_ID,
-            permissions=DEFAULT_PERMISSIONS
-        )
-
-        async with aiosqlite.connect(DB_NAME) as db:
-            async with db.cursor() as c:
-                await c.execute("SELECT value FROM bot_state WHERE key = 'lock_message_id'")
-                row = await c.fetchone()
-            if row:
-                try:
-                    await context.bot.delete_message(PUBLIC_GROUP_ID, int(row[0]))
-                except Exception: pass
-
-            await db.execute("DELETE FROM bot_state WHERE key = 'lock_message_id'")
-            await db.commit()
-
-        sent_msg = await context.bot.send_message(
-            chat_id=PUBLIC_GROUP_ID,
-            text="🔓 Le chat est déverrouillé."
-        )
-
+        RAID.note_manual_lock()  # déjà rouvert à la main : plus de déverrouillage auto à faire
+        await _unlock_public_group(context.bot)
         await msg.delete()
-        asyncio.create_task(delete_after_delay([sent_msg], 5))
 
     except Exception as e:
         print(f"[UNLOCK] Erreur: {e}")
         try:
             m = await msg.reply_text(f"Erreur lors du déverrouillage: {e}")
-            asyncio.create_task(delete_after_delay([msg, m], 10))
+            schedule_delete([msg, m], 10)
         except Exception: pass
 
 # NOUVEAU : cleanup commandes admin tapées par non-admin
@@ -1730,125 +4009,784 @@ async def handle_public_admin_command_cleanup(update: Update, context: ContextTy
         except Exception:
             pass
 
+# =========================
+# MODE RAID
+# =========================
+class RaidDetector:
+    """
+    Surveille le groupe public : arrivées, spammeurs distincts (liens, charabia, ou simple
+    excès de débit d'un compte arrivé depuis moins de RAID_NEWCOMER_SEC) et afflux de messages.
+    Au-delà des seuils : verrouillage (LOCK_PERMISSIONS), suppressions regroupées via
+    deleteMessages, mutes sans notification individuelle, puis un seul message admin
+    tenu à jour et finalisé à la fin du raid.
+    """
+
+    def __init__(self):
+        self.active = False
+        self._joins = deque()
+        self._newcomers = {}        # user_id -> arrivée (moins de RAID_NEWCOMER_SEC)
+        self._spammers = {}         # user_id -> dernier spam (fenêtre de détection)
+        self._to_delete = []
+        self._started = 0.0
+        self._last_activity = 0.0
+        self._reason = ""
+        self._generation = 0        # numéro du dernier raid : seul son _run peut déverrouiller
+        self._manual_lock_ts = 0.0  # dernier /lock ou /unlock d'un admin
+        self._task = None           # référence forte : une tâche non référencée peut être ramassée
+        self.stats = {}
+
+    def _prune(self, now: float):
+        cutoff = now - RAID_WINDOW_SEC
+        while self._joins and self._joins[0] < cutoff:
+            self._joins.popleft()
+        if len(self._spammers) >= RAID_SPAMMER_THRESHOLD:
+            self._spammers = {u: t for u, t in self._spammers.items() if t >= cutoff}
+
+    def is_newcomer(self, user_id: int, now: float) -> bool:
+        joined = self._newcomers.get(user_id)
+        return joined is not None and now - joined < RAID_NEWCOMER_SEC
+
+    def on_join(self, bot, user_ids: list, now: float):
+        count = len(user_ids)
+        cutoff = now - RAID_NEWCOMER_SEC
+        if self._newcomers and next(iter(self._newcomers.values())) < cutoff:
+            self._newcomers = {u: t for u, t in self._newcomers.items() if t >= cutoff}
+        for uid in user_ids:
+            self._newcomers.pop(uid, None)      # réinsertion : le dict reste trié par date d'arrivée
+            self._newcomers[uid] = now
+        if self.active:
+            self.stats["joins"] += count
+            self._last_activity = now
+            return
+        self._joins.extend([now] * count)
+        self._prune(now)
+        if len(self._joins) >= RAID_JOIN_THRESHOLD:
+            self._start(bot, now, f"{len(self._joins)} arrivées en {RAID_WINDOW_SEC:g}s", joins=len(self._joins))
+
+    def on_spam(self, bot, user_id: int, now: float):
+        if self.active:
+            self.stats["spammers"].add(user_id)
+            self._last_activity = now
+            return
+        self._spammers[user_id] = now
+        self._prune(now)
+        if len(self._spammers) >= RAID_SPAMMER_THRESHOLD:
+            self._start(bot, now, f"{len(self._spammers)} spammeurs en {RAID_WINDOW_SEC:g}s")
+
+    def on_flood(self, bot, now: float):
+        if self.active:
+            self._last_activity = now
+        else:
+            self._start(bot, now, f"{FLOOD_CHAT_MSGS} messages en {FLOOD_WINDOW_SEC:g}s")
+
+    def defer_delete(self, message_id: int):
+        self._to_delete.append(message_id)
+        self.stats["deleted"] += 1
+
+    def note_mute(self, user_id: int):
+        self.stats["muted"].add(user_id)
+
+    def note_manual_lock(self):
+        self._manual_lock_ts = _now()
+
+    def _start(self, bot, now: float, reason: str, joins: int = 0):
+        self.active = True
+        self._started = self._last_activity = now
+        self._reason = reason
+        self.stats = {"joins": joins, "deleted": 0, "muted": set(), "spammers": set(self._spammers)}
+        self._joins.clear()
+        self._spammers.clear()
+        _inc_counter("raids_total", 1)
+        _add_event("raid", {"reason": reason})
+        print(f"🚨 Raid détecté : {reason}")
+        self._generation += 1
+        self._task = asyncio.create_task(self._run(bot, self._generation))
+
+    def _render(self, done: bool) -> str:
+        st = self.stats
+        mins = int((_now() - self._started) // 60)
+        state = f"terminé après {mins} min" if done else f"en cours depuis {mins} min"
+        lock = "🔒 Groupe verrouillé" if FLOOD_AUTOLOCK else "🔓 Verrouillage auto désactivé"
+        if FLOOD_AUTOLOCK and done:
+            lock += " (déverrouillage auto)" if FLOOD_AUTOUNLOCK_SEC else " — /unlock pour rouvrir"
+        return (
+            f"🚨 Raid ({self._reason}) — {state}\n"
+            f"👥 Arrivées : {st['joins']}\n"
+            f"👤 Spammeurs : {len(st['spammers'])}\n"
+            f"🔇 Mutés : {len(st['muted'])}\n"
+            f"🧹 Messages supprimés : {st['deleted']}\n"
+            f"{lock}"
+        )
+
+    async def _flush(self, bot):
+        ids, self._to_delete = self._to_delete, []
+        if ids:
+            with api_lane(LANE_ENFORCE):
+                await bulk_delete_messages(bot, {PUBLIC_GROUP_ID: ids})
+
+    def _may_unlock(self, generation: int, started: float) -> bool:
+        """Déverrouillage auto permis : aucun raid plus récent, aucun /lock ou /unlock manuel depuis le début."""
+        return generation == self._generation and not self.active and self._manual_lock_ts < started
+
+    async def _run(self, bot, generation: int):
+        started = self._started
+        unlock_at = started + FLOOD_AUTOUNLOCK_SEC
+        summary = None
+        try:
+            if FLOOD_AUTOLOCK:
+                with api_lane(LANE_ENFORCE):
+                    await _lock_public_group(bot, "🔒 Afflux suspect : le chat est temporairement verrouillé.")
+            summary = await bot.send_message(ADMIN_GROUP_ID, self._render(done=False))
+        except Exception as e:
+            print(f"[RAID] démarrage : {e}")
+        while self.active:
+            await asyncio.sleep(RAID_FLUSH_SEC)
+            await self._flush(bot)
+            if _now() - self._last_activity > RAID_QUIET_SEC:
+                self.active = False
+        await self._flush(bot)
+        try:
+            if summary is not None:
+                await summary.edit_text(self._render(done=True))
+            else:
+                await bot.send_message(ADMIN_GROUP_ID, self._render(done=True))
+        except Exception as e:
+            print(f"[RAID] résumé : {e}")
+        if FLOOD_AUTOLOCK and FLOOD_AUTOUNLOCK_SEC:
+            # Échéance propre à ce raid ; vérifiée à chaque RAID_FLUSH_SEC pour abandonner dès
+            # qu'un raid plus récent ou un /lock manuel prend la main.
+            while self._may_unlock(generation, started) and _now() < unlock_at:
+                await asyncio.sleep(min(RAID_FLUSH_SEC, max(0.0, unlock_at - _now())))
+            if self._may_unlock(generation, started):
+                try:
+                    await _unlock_public_group(bot)
+                except Exception as e:
+                    print(f"[RAID] déverrouillage auto : {e}")
+
+RAID = RaidDetector()
+
+# =========================
+# TRAITEMENT CONCURRENT DES UPDATES
+# =========================
+def update_keys(update) -> tuple:
+    """
+    Clés d'ordonnancement d'un update : deux updates partageant une clé sont traités dans l'ordre
+    d'arrivée, les autres en parallèle.
+    - boutons : 'report:<id>' ; EDIT prend aussi 'chat:<id>' (il remplace l'état d'édition du chat),
+      les autres clics ne touchent qu'à l'état d'édition de leur propre signalement
+    - groupe admin : 'chat:<admin>' (le texte qui suit EDIT doit voir l'état d'édition)
+    - ailleurs : 'user:<id>' (soumissions privées, spam public) + 'album:<media_group_id>'
+    """
+    if not isinstance(update, Update):
+        return ("global",)
+    keys = set()
+    q = update.callback_query
+    if q is not None:
+        action, _, report_id = (q.data or "").partition("|")
+        if report_id:
+            keys.add(f"report:{report_id}")
+        if action == "EDIT" and q.message is not None:
+            keys.add(f"chat:{q.message.chat.id}")
+        return tuple(sorted(keys)) or ("global",)
+
+    chat = update.effective_chat
+    user = update.effective_user
+    msg = update.effective_message
+    if chat is not None and chat.id == ADMIN_GROUP_ID:
+        keys.add(f"chat:{chat.id}")
+    elif user is not None:
+        keys.add(f"user:{user.id}")
+    elif chat is not None:
+        keys.add(f"chat:{chat.id}")
+    if msg is not None and msg.media_group_id:
+        keys.add(f"album:{msg.media_group_id}")
+    return tuple(sorted(keys)) or ("global",)
+
+
+class KeyedUpdateProcessor(BaseUpdateProcessor):
+    """
+    Traitement concurrent des updates (branché via ApplicationBuilder.concurrent_updates) avec ordre
+    garanti par clé (cf. update_keys). À son arrivée, un update prend sa place dans la file de chacune
+    de ses clés en une seule étape, puis attend d'être en tête de toutes : l'ordre par clé suit l'ordre
+    d'arrivée et le plus ancien update est toujours en tête de ses files (pas d'interblocage).
+    Limite PTB : l'attente de clé occupe une place du sémaphore global, d'où une limite large.
+    """
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        self._queues = {}   # clé -> deque de futures (tête = update en cours)
+        self.inflight = 0
+        self.stats = {"processed": 0, "waited": 0, "max_wait_ms": 0.0, "max_inflight": 0, "max_keys": 0}
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def _release(self, key: str, fut):
+        q = self._queues.get(key)
+        if q is None:
+            return
+        if q[0] is fut:
+            q.popleft()
+            # Suivants déjà annulés (leur finally n'a pas encore tourné) : sautés, ils ne sont plus attendus
+            while q and q[0].done():
+                q.popleft()
+            if q:
+                q[0].set_result(None)  # réveille le suivant de même clé
+            else:
+                del self._queues[key]
+        else:
+            try:
+                q.remove(fut)       # annulé pendant l'attente
+            except ValueError:
+                pass                # déjà sauté par le _release d'un prédécesseur
+            if not q:
+                del self._queues[key]
+
+    async def do_process_update(self, update, coroutine) -> None:
+        loop = asyncio.get_running_loop()
+        tickets = []
+        blocked = False
+        for key in update_keys(update):
+            q = self._queues.get(key)
+            if q is None:
+                q = self._queues[key] = deque()
+            fut = loop.create_future()
+            if q:
+                blocked = True
+            else:
+                fut.set_result(None)
+            q.append(fut)
+            tickets.append((key, fut))
+        st = self.stats
+        st["max_keys"] = max(st["max_keys"], len(self._queues))
+        started = False
+        try:
+            if blocked:
+                t0 = time.perf_counter()
+                for _, fut in tickets:
+                    await fut
+                waited = time.perf_counter() - t0
+                st["waited"] += 1
+                st["max_wait_ms"] = max(st["max_wait_ms"], waited * 1000)
+                METRICS.observe("afbot_update_key_wait_seconds", waited)
+            started = True
+            self.inflight += 1
+            st["max_inflight"] = max(st["max_inflight"], self.inflight)
+            try:
+                await coroutine
+            finally:
+                self.inflight -= 1
+                st["processed"] += 1
+        finally:
+            if not started:
+                coroutine.close()
+            for key, fut in tickets:
+                self._release(key, fut)
+
+UPDATE_PROCESSOR = KeyedUpdateProcessor(UPDATE_CONCURRENCY)
+
+
 # =========================
 # MAIN + AUTO-RESTART
 # =========================
 async def _post_init(application: Application):
     try:
+        try:
+            await HTTP_SERVER.start(application)
+        except OSError as e:
+            print(f"[HTTP] {e}")
+        await DB.open()
         await init_db()
-        asyncio.create_task(worker_loop(application))
-        asyncio.create_task(cleaner_loop())
+        await TOPIC_OVERRIDES.load()
+        await MUTE_INDEX.load()
+        pending_deletes = await DELETE_SCHEDULER.load()
+        if pending_deletes:
+            print(f"🧹 {pending_deletes} suppression(s) programmée(s) reprise(s)")
+        replayed = await REVIEW_QUEUE.replay()
+        if replayed:
+            print(f"📬 {replayed} signalement(s) non livré(s) remis en file")
+        for i in range(max(1, REVIEW_WORKERS)):
+            asyncio.create_task(worker_loop(application, i))
+        asyncio.create_task(MAINTENANCE.run())
+        asyncio.create_task(write_behind_loop())
+        asyncio.create_task(DELETE_SCHEDULER.run(application.bot))
         asyncio.create_task(heartbeat_loop(application))
+        asyncio.create_task(loop_lag_monitor())
+        if not WEBHOOK_URL:
+            asyncio.create_task(keep_alive_loop())
         try:
             await application.bot.send_message(
                 chat_id=ADMIN_GROUP_ID,
-                text="🟢 Bot relancé (polling activé)."
+                text="🟢 Bot relancé (webhook activé)." if WEBHOOK_URL else "🟢 Bot relancé (polling activé)."
             )
         except Exception:
             pass
     except Exception as e:
         print(f"[POST_INIT] {e}")
 
-def _notify_admin_sync(text: str, *, force: bool = False):
-    global _last_admin_notify_ts
-    now = _now()
-    if not force and (now - _last_admin_notify_ts) < ADMIN_NOTIFY_COOLDOWN_SEC:
-        print("[NOTIFY_ADMIN_SYNC] Skipped (cooldown)")
-        return
+async def _post_shutdown(application: Application):
     try:
-        url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
-        data = {"chat_id": ADMIN_GROUP_ID, "text": text}
-        requests.post(url, data=data, timeout=5)
-        _last_admin_notify_ts = now
+        await WRITE_BEHIND.flush()
     except Exception as e:
-        print(f"[NOTIFY_ADMIN_SYNC ERR] {e}")
-
-def main():
-    threading.Thread(target=keep_alive, daemon=True).start()
-    threading.Thread(target=run_flask, daemon=True).start()
-
-    backoff = 2
-
-    while True:
+        print(f"[POST_SHUTDOWN] flush: {e}")
+    await DB.close()
+    await HTTP_SERVER.stop()
+    await HTTP_OUT.aclose()
+
+class Supervisor:
+    """
+    Une seule boucle asyncio pour toute la vie du processus : l'Application (handlers, BDD,
+    files, caches mémoire) est initialisée une fois. Quand le heartbeat perd Telegram,
+    seule la couche réseau est relancée — Updater (ou enregistrement du webhook) et client
+    HTTP du Bot — avec un backoff exponentiel RESTART_MIN_SLEEP_SEC -> RESTART_MAX_SLEEP_SEC.
+    Métriques : nombre de reprises, durée de la dernière / de la plus longue.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.recovering = False
+        self._lost = False
+        self._wake = None
+        self._stop = None
+        self.stats = {"recoveries": 0, "attempts": 0, "last_recovery_sec": None, "max_recovery_sec": 0.0}
+
+    def network_lost(self):
+        if not self.recovering and self._wake is not None:
+            self._lost = True
+            self._wake.set()
+
+    def stop(self):
+        if self._stop is not None:
+            self._stop.set()
+            self._wake.set()
+
+    async def _sleep(self, delay: float):
+        # Attente interrompue par un arrêt demandé (SIGTERM / Ctrl-C)
         try:
-            app = (ApplicationBuilder()
-                   .token(BOT_TOKEN)
-                   .post_init(_post_init)
-                   .build())
-
-            # ====== Handlers (unique) ======
-            app.add_handler(CommandHandler("start", handle_start, filters=filters.ChatType.PRIVATE))
-
-            # Admin room
-            app.add_handler(CommandHandler("cancel", handle_admin_cancel, filters=filters.Chat(ADMIN_GROUP_ID)))
-            app.add_handler(CommandHandler("dashboard", handle_dashboard, filters=filters.Chat(ADMIN_GROUP_ID)))
-            app.add_handler(CommandHandler("deplacer", handle_deplacer_admin, filters=filters.Chat(ADMIN_GROUP_ID) & filters.REPLY))
-            app.add_handler(MessageHandler(filters.Chat(ADMIN_GROUP_ID) & filters.TEXT & ~filters.COMMAND, handle_admin_edit))
-
-            # Public
-            app.add_handler(CommandHandler("lock", handle_lock, filters=filters.Chat(PUBLIC_GROUP_ID)))
-            app.add_handler(CommandHandler("unlock", handle_unlock, filters=filters.Chat(PUBLIC_GROUP_ID)))
-            app.add_handler(CommandHandler("deplacer", handle_deplacer_public, filters=filters.Chat(PUBLIC_GROUP_ID) & filters.REPLY))
-            app.add_handler(CommandHandler("modifier", handle_modifier_public, filters=filters.Chat(PUBLIC_GROUP_ID) & filters.REPLY))
-
-            app.add_handler(CommandHandler(["dashboard", "cancel", "deplacer", "modifier"],
-                                           handle_public_admin_command_cleanup,
-                                           filters=filters.Chat(PUBLIC_GROUP_ID) & ~filters.REPLY))
-
-            # Boutons
-            app.add_handler(CallbackQueryHandler(on_button_click))
+            await asyncio.wait_for(self._stop.wait(), timeout=delay)
+        except asyncio.TimeoutError:
+            pass
 
-            # Catch-all
-            app.add_handler(MessageHandler(filters.ALL & ~filters.COMMAND, handle_user_message))
-            # ====== fin handlers ======
+    async def _until_up(self, start, what: str) -> int:
+        """Réessaie `start` avec backoff jusqu'au succès ; renvoie le nombre de tentatives."""
+        delay = RESTART_MIN_SLEEP_SEC
+        attempt = 0
+        while True:
+            attempt += 1
+            self.stats["attempts"] += 1
+            try:
+                await start()
+                return attempt
+            except Exception as e:
+                if self._stop.is_set():
+                    raise
+                print(f"[SUPERVISOR] {what} : tentative {attempt} échouée ({e}), nouvel essai dans {delay}s")
+                await self._sleep(delay)
+                if self._stop.is_set():
+                    raise
+                delay = min(delay * 2, RESTART_MAX_SLEEP_SEC)
+
+    async def _start_network(self):
+        if WEBHOOK_URL:
+            await self.app.bot.set_webhook(
+                url=WEBHOOK_URL + WEBHOOK_PATH,
+                secret_token=WEBHOOK_SECRET,
+                allowed_updates=Update.ALL_TYPES,
+                max_connections=WEBHOOK_MAX_CONNECTIONS,
+            )
+        else:
+            await self.app.updater.start_polling(poll_interval=POLL_INTERVAL, timeout=POLL_TIMEOUT)
 
-            print("🚀 Bot démarré, en écoute…")
-            app.run_polling(poll_interval=POLL_INTERVAL, timeout=POLL_TIMEOUT, close_loop=False)
+    async def _restart_network(self):
+        updater = self.app.updater
+        if updater is not None and updater.running:
+            await updater.stop()
+        try:
+            await self.app.bot.shutdown()   # ferme le client httpx du Bot (la file du gouverneur est conservée)…
+        except Exception as e:
+            print(f"[SUPERVISOR] arrêt client : {e}")
+        await self.app.bot.initialize()     # …le recrée et refait get_me
+        await self._start_network()
+
+    async def _recover(self):
+        self.recovering = True
+        t0 = time.monotonic()
+        print("🔌 Connexion Telegram perdue : relance de la couche réseau…")
+        try:
+            attempts = await self._until_up(self._restart_network, "reprise réseau")
+        finally:
+            self.recovering = False
+            self._lost = False
+        elapsed = time.monotonic() - t0
+        st = self.stats
+        st["recoveries"] += 1
+        st["last_recovery_sec"] = elapsed
+        st["max_recovery_sec"] = max(st["max_recovery_sec"], elapsed)
+        METRICS.observe("afbot_network_recovery_seconds", elapsed)
+        HEARTBEAT.update(failures=0, last_ok_ts=_now())
+        _inc_counter("auto_restarts_total", 1)
+        _add_event("restart", {"recovery_sec": round(elapsed, 1), "attempts": attempts})
+        WRITE_BEHIND.add("INSERT OR REPLACE INTO bot_state (key, value) VALUES ('last_restart_ts', ?)", (str(int(_now())),))
+        print(f"🔌 Couche réseau relancée en {elapsed:.1f}s ({attempts} tentative(s))")
+        try:
+            await self.app.bot.send_message(
+                chat_id=ADMIN_GROUP_ID,
+                text=f"🟢 Connexion Telegram rétablie en {elapsed:.0f}s ({attempts} tentative(s)), sans redémarrage."
+            )
+        except Exception:
+            pass
 
-            _notify_admin_sync("🟠 Bot redémarre (watchdog).")
+    async def run(self, app: Application):
+        self.app = app
+        self._wake = asyncio.Event()
+        self._stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
             try:
-                asyncio.run(_log_restart())
-            except Exception:
+                loop.add_signal_handler(sig, self.stop)
+            except (NotImplementedError, RuntimeError):
                 pass
+        try:
+            await self._until_up(app.initialize, "initialisation")
+            if app.post_init:
+                await app.post_init(app)
+            await self._until_up(self._start_network, "démarrage réseau")
+            await app.start()
+            while not self._stop.is_set():
+                await self._wake.wait()
+                self._wake.clear()
+                if self._lost and not self._stop.is_set():
+                    await self._recover()
+        finally:
+            if app.updater is not None and app.updater.running:
+                await app.updater.stop()
+            if app.running:
+                await app.stop()
+            await app.shutdown()
+            if app.post_shutdown:
+                await app.post_shutdown(app)
+
+SUPERVISOR = Supervisor()
+
+
+def build_application() -> Application:
+    builder = (ApplicationBuilder()
+               .token(BOT_TOKEN)
+               .base_url(TELEGRAM_API_URL)
+               .post_init(_post_init)
+               .post_shutdown(_post_shutdown)
+               .rate_limiter(API_GOVERNOR)
+               .concurrent_updates(UPDATE_PROCESSOR))
+    if WEBHOOK_URL:
+        builder = builder.updater(None)
+    app = builder.build()
+
+    # ====== Handlers (unique) ======
+    app.add_handler(CommandHandler("start", handle_start, filters=filters.ChatType.PRIVATE))
+
+    # Admin room
+    app.add_handler(CommandHandler("cancel", handle_admin_cancel, filters=filters.Chat(ADMIN_GROUP_ID)))
+    app.add_handler(CommandHandler("dashboard", handle_dashboard, filters=filters.Chat(ADMIN_GROUP_ID)))
+    app.add_handler(CommandHandler("perf", handle_perf, filters=filters.Chat(ADMIN_GROUP_ID)))
+    app.add_handler(CommandHandler("deplacer", handle_deplacer_admin, filters=filters.Chat(ADMIN_GROUP_ID) & filters.REPLY))
+    app.add_handler(MessageHandler(filters.Chat(ADMIN_GROUP_ID) & filters.TEXT & ~filters.COMMAND, handle_admin_edit))
+
+    # Public
+    app.add_handler(CommandHandler("lock", handle_lock, filters=filters.Chat(PUBLIC_GROUP_ID)))
+    app.add_handler(CommandHandler("unlock", handle_unlock, filters=filters.Chat(PUBLIC_GROUP_ID)))
+    app.add_handler(CommandHandler("deplacer", handle_deplacer_public, filters=filters.Chat(PUBLIC_GROUP_ID) & filters.REPLY))
+    app.add_handler(CommandHandler("modifier", handle_modifier_public, filters=filters.Chat(PUBLIC_GROUP_ID) & filters.REPLY))
+
+    app.add_handler(CommandHandler(["dashboard", "perf", "cancel", "deplacer", "modifier"],
+                                   handle_public_admin_command_cleanup,
+                                   filters=filters.Chat(PUBLIC_GROUP_ID) & ~filters.REPLY))
+
+    # Boutons
+    app.add_handler(CallbackQueryHandler(on_button_click))
+
+    # Catch-all
+    app.add_handler(MessageHandler(filters.ALL & ~filters.COMMAND, handle_user_message))
+    # ====== fin handlers ======
+    instrument_handlers(app)
+    return app
 
-            backoff = 2
 
+def main():
+    # Dernier recours : ne boucle que si le superviseur lui-même plante (erreur non réseau).
+    backoff = RESTART_MIN_SLEEP_SEC
+    while True:
+        try:
+            if WEBHOOK_URL:
+                print(f"🚀 Bot démarré, webhook {WEBHOOK_URL}{WEBHOOK_PATH}")
+            else:
+                print("🚀 Bot démarré, en écoute…")
+            asyncio.run(SUPERVISOR.run(build_application()))
+            return  # arrêt demandé
+        except (KeyboardInterrupt, SystemExit):
+            return
         except Exception as e:
             print(f"[MAIN LOOP ERR] {e}")
-            _notify_admin_sync(f"🔴 Bot crash détecté. Redémarrage…\n{e}")
             try:
-                asyncio.run(_log_crash_and_plan_restart())
+                asyncio.run(_log_crash_and_plan_restart(e))
             except Exception:
                 pass
             time.sleep(backoff)
-            backoff = min(backoff * 2, 30)
-
-            try:
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-            except Exception:
-                pass
-
-            continue
+            backoff = min(backoff * 2, RESTART_MAX_SLEEP_SEC)
 
-async def _log_restart():
+async def _log_crash_and_plan_restart(error: Exception):
+    await notify_admin(f"🔴 Bot crash détecté. Redémarrage…\n{error}")
     try:
-        async with aiosqlite.connect(DB_NAME) as db:
-            await _inc_counter(db, "auto_restarts_total", 1)
-            await _add_event(db, "restart")
-            await db.execute("INSERT OR REPLACE INTO bot_state(key,value) VALUES('last_restart_ts',?)", (str(int(time.time())),))
-            await db.commit()
-    except Exception as e:
-        print(f"[LOG RESTART] {e}")
-
-async def _log_crash_and_plan_restart():
-    try:
-        async with aiosqlite.connect(DB_NAME) as db:
-            await _add_event(db, "crash")
+        _add_event("crash")
+        async with DB.write() as db:
             await db.execute("INSERT OR REPLACE INTO bot_state(key,value) VALUES('last_crash_ts',?)", (str(int(time.time())),))
-            await db.commit()
+        await WRITE_BEHIND.flush()
     except Exception as e:
         print(f"[LOG CRASH] {e}")
+    finally:
+        await DB.close()
+        await HTTP_OUT.aclose()
+
+# =========================
+# CLI : évaluation hors ligne du routage
+# =========================
+def _legacy_topic(text: str):
+    """Règle d'origine (premier mot-clé trouvé, accident avant radar), gardée comme référence pour eval-router."""
+    text_lower = (text or "").lower()
+    if any(word in text_lower for word in accident_keywords):
+        return PUBLIC_TOPIC_VIDEOS_ID
+    if any(word in text_lower for word in radar_keywords):
+        return PUBLIC_TOPIC_RADARS_ID
+    return PUBLIC_TOPIC_GENERAL_ID
+
+
+def _load_labelled_tsv(path: str) -> list:
+    """Corpus étiqueté 'topic<TAB>légende' (ex. bench/captions_fr.tsv) -> [(source, légende, thread_id)]."""
+    ids = {"videos": PUBLIC_TOPIC_VIDEOS_ID, "radars": PUBLIC_TOPIC_RADARS_ID, "general": PUBLIC_TOPIC_GENERAL_ID}
+    samples = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip() and not line.startswith("#"):
+                topic, caption = line.rstrip("\n").split("\t", 1)
+                samples.append(("corpus", caption, ids[topic]))
+    return samples
+
+
+def _load_labelled_db(db_path: str) -> list | None:
+    import sqlite3
+    con = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    samples = []
+    try:
+        for key, tid in con.execute("SELECT caption_key, thread_id FROM topic_overrides"):
+            samples.append(("admin", key, tid))
+        for caption, tid in con.execute(
+            "SELECT caption, thread_id FROM media_archive "
+            "WHERE chat_id = ? AND thread_id IS NOT NULL AND caption <> '' "
+            "GROUP BY COALESCE(media_group_id, message_id)",
+            (PUBLIC_GROUP_ID,)
+        ):
+            samples.append(("archive", caption, tid))
+    except sqlite3.OperationalError as e:
+        print(f"[EVAL ROUTER] base non migrée ? {e}")
+        return None
+    finally:
+        con.close()
+    return samples
+
+
+def eval_router_cli(db_path: str = DB_NAME):
+    """
+    python bot.py eval-router [chemin.db | corpus.tsv]
+    Rejoue les règles (sans le cache de corrections) sur les légendes dont le topic final est connu :
+    corrections admin (topic_overrides) et médias archivés du groupe public (media_archive.thread_id),
+    ou un corpus étiqueté .tsv. L'ancienne règle (premier mot-clé trouvé) sert de référence.
+    """
+    if db_path.endswith(".tsv"):
+        samples = _load_labelled_tsv(db_path)
+    else:
+        samples = _load_labelled_db(db_path)
+    if samples is None:
+        return
+    if not samples:
+        print("Aucune légende étiquetée à évaluer.")
+        return
+
+    names = ("videos", "radars", "general")
+    confusion = {(a, b): 0 for a in names for b in names}
+    per_source, misses, low_conf, legacy_ok = {}, [], 0, 0
+    t0 = time.perf_counter()
+    for source, caption, expected in samples:
+        got = TOPIC_ROUTER.classify(caption)
+        exp_name, got_name = _topic_name(expected), _topic_name(got.thread_id)
+        confusion[(exp_name, got_name)] += 1
+        ok_n, total_n = per_source.get(source, (0, 0))
+        per_source[source] = (ok_n + (exp_name == got_name), total_n + 1)
+        if got.confidence < 0.5:
+            low_conf += 1
+        if exp_name != got_name and len(misses) < 15:
+            misses.append((exp_name, got_name, got.score, caption[:70].replace("\n", " ")))
+    elapsed_ms = (time.perf_counter() - t0) * 1000
+    for _, caption, expected in samples:
+        legacy_ok += _topic_name(_legacy_topic(caption)) == _topic_name(expected)
+
+    ok = sum(confusion[(n, n)] for n in names)
+    print(f"Légendes évaluées : {len(samples)} — exactitude {ok / len(samples):.1%} "
+          f"({elapsed_ms / len(samples):.3f} ms/légende)")
+    print(f"Ancienne règle (premier mot-clé) : exactitude {legacy_ok / len(samples):.1%}")
+    for source, (ok_n, total_n) in sorted(per_source.items()):
+        print(f"  {source:<8} {ok_n}/{total_n}")
+    print(f"Confiance < 0.5 : {low_conf}")
+    print("\nattendu \\ prédit " + " ".join(f"{n:>8}" for n in names))
+    for a in names:
+        print(f"{a:<17}" + " ".join(f"{confusion[(a, b)]:>8}" for b in names))
+    if misses:
+        print("\nErreurs (extrait) :")
+        for exp_name, got_name, score, caption in misses:
+            print(f"  {exp_name} -> {got_name} (score {score:.2f}) : {caption}")
+
+
+def score_captions_cli(db_path: str = DB_NAME):
+    """
+    python bot.py score-captions [chemin.db]
+    Note toutes les légendes archivées et affiche la distribution de chaque caractéristique,
+    pour régler les seuils GIB_* sur des données réelles.
+    """
+    import sqlite3
+    con = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        captions = [r[0] for r in con.execute(
+            "SELECT caption FROM media_archive WHERE caption <> '' "
+            "UNION ALL SELECT text FROM pending_reports WHERE text <> ''"
+        )]
+    except sqlite3.OperationalError as e:
+        print(f"[SCORE CAPTIONS] {e}")
+        return
+    finally:
+        con.close()
+    if not captions:
+        print("Aucune légende à noter.")
+        return
+
+    t0 = time.perf_counter()
+    scores = score_captions(captions)
+    elapsed_ms = (time.perf_counter() - t0) * 1000
+
+    def pct(values, q):
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+    print(f"Légendes notées : {len(scores)} ({elapsed_ms / len(scores):.3f} ms/légende)")
+    print(f"{'caractéristique':<16} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8}")
+    for field in TextQuality._fields[1:]:
+        values = sorted(getattr(q, field) for q in scores)
+        print(f"{field:<16} {pct(values, .5):>8} {pct(values, .9):>8} {pct(values, .99):>8} {values[-1]:>8}")
+    flagged = [(q, c) for q, c in zip(scores, captions) if q.gibberish]
+    print(f"\nJugées charabia (ratio consonnes > {GIB_CONSONANT_RATIO}) : {len(flagged)} ({len(flagged) / len(scores):.1%})")
+    for q, c in flagged[:10]:
+        print(f"  ratio={q.consonant_ratio} rép={q.repetition} H={q.entropy} : {c[:60]!r}")
+    suspects = [(q, c) for q, c in zip(scores, captions) if q.suspect]
+    print(f"\nEn plus avec les seuils candidats (rép > {GIB_REPETITION}, H < {GIB_MIN_ENTROPY}, non appliqués) : "
+          f"{len(suspects)} ({len(suspects) / len(scores):.1%})")
+    for q, c in suspects[:10]:
+        print(f"  ratio={q.consonant_ratio} rép={q.repetition} H={q.entropy} : {c[:60]!r}")
+
+
+def fake_telegram_cli(port: int = 8081, count: int = 20):
+    """
+    python bot.py fake-telegram [port] [nb_updates]
+    Faux serveur Bot API pour tester le mode webhook hors ligne. Lancer le bot à côté avec
+    TELEGRAM_API_URL=http://127.0.0.1:<port>/bot WEBHOOK_URL=http://127.0.0.1:<PORT>.
+    Dès que le bot appelle setWebhook, envoie `count` messages privés /start signés avec le
+    secret reçu (plus un avec un mauvais secret) et mesure le délai jusqu'à la réponse du bot.
+    """
+    import aiohttp
+
+    me = {"id": 1, "is_bot": True, "first_name": "FakeBot", "username": "fake_bot",
+          "can_join_groups": True, "can_read_all_group_messages": True, "supports_inline_queries": False}
+    state = {"message_id": 0, "sent": {}, "latencies": []}
+
+    def message(chat_id, text=None):
+        state["message_id"] += 1
+        chat_type = "private" if chat_id > 0 else "supergroup"
+        return {"message_id": state["message_id"], "date": int(time.time()),
+                "chat": {"id": chat_id, "type": chat_type}, "from": me, "text": text}
+
+    async def push_updates(url, secret):
+        await asyncio.sleep(0.5)  # laisse le bot finir app.start()
+        async with aiohttp.ClientSession() as session:
+            async with session.post(url, json={"update_id": 1}, headers={"X-Telegram-Bot-Api-Secret-Token": "faux"}) as r:
+                print(f"Mauvais secret -> HTTP {r.status}")
+            for i in range(count):
+                uid = 10_000 + i
+                update = {"update_id": 100 + i, "message": {
+                    "message_id": 1, "date": int(time.time()), "text": "/start",
+                    "chat": {"id": uid, "type": "private", "first_name": "Test"},
+                    "from": {"id": uid, "is_bot": False, "first_name": "Test"},
+                    "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+                }}
+                state["sent"][uid] = time.perf_counter()
+                async with session.post(url, json=update, headers={"X-Telegram-Bot-Api-Secret-Token": secret}) as r:
+                    if r.status != 200:
+                        print(f"Update {i} -> HTTP {r.status}")
+        for _ in range(100):
+            if len(state["latencies"]) >= count:
+                break
+            await asyncio.sleep(0.1)
+        lat = sorted(state["latencies"])
+        if lat:
+            print(f"Réponses : {len(lat)}/{count}, latence p50 {lat[len(lat) // 2]:.1f} ms, max {lat[-1]:.1f} ms")
+        else:
+            print(f"Réponses : 0/{count}")
+
+    async def api(request):
+        method = request.match_info["method"]
+        if request.content_type == "application/json":
+            params = await request.json()
+        else:
+            params = dict(await request.post())
+        chat_id = int(params["chat_id"]) if "chat_id" in params else None
+        if method == "getMe":
+            result = me
+        elif method == "setWebhook":
+            print(f"setWebhook {params.get('url')}")
+            asyncio.get_running_loop().create_task(push_updates(params["url"], params.get("secret_token", "")))
+            result = True
+        elif method == "sendMessage":
+            t0 = state["sent"].pop(chat_id, None)
+            if t0 is not None:
+                state["latencies"].append((time.perf_counter() - t0) * 1000)
+            result = message(chat_id, params.get("text"))
+        elif method in ("sendPhoto", "sendVideo", "editMessageText", "editMessageCaption"):
+            result = message(chat_id)
+        elif method == "sendMediaGroup":
+            result = [message(chat_id) for _ in json.loads(params.get("media") or "[]")]
+        elif method == "copyMessage":
+            state["message_id"] += 1
+            result = {"message_id": state["message_id"]}
+        elif method == "getChatMemberCount":
+            result = 42
+        elif method == "getChatMember":
+            result = {"status": "member", "user": {"id": int(params.get("user_id", 0)), "is_bot": False, "first_name": "Test"}}
+        elif method in ("getChatAdministrators", "getUpdates"):
+            result = []
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    app = web.Application()
+    app.router.add_post("/bot{token}/{method}", api)
+    print(f"🧪 Faux Telegram sur http://127.0.0.1:{port}/bot (Ctrl-C pour quitter)")
+    print(f"   Bot : TELEGRAM_API_URL=http://127.0.0.1:{port}/bot WEBHOOK_URL=http://127.0.0.1:{PORT}")
+    web.run_app(app, host="127.0.0.1", port=port, print=None)
+
 
 if __name__ == "__main__":
-    main()
+    if len(sys.argv) > 1 and sys.argv[1] == "eval-router":
+        eval_router_cli(sys.argv[2] if len(sys.argv) > 2 else DB_NAME)
+    elif len(sys.argv) > 1 and sys.argv[1] == "score-captions":
+        score_captions_cli(sys.argv[2] if len(sys.argv) > 2 else DB_NAME)
+    elif len(sys.argv) > 1 and sys.argv[1] == "fake-telegram":
+        fake_telegram_cli(*(int(a) for a in sys.argv[2:4]))
+    else:
+        main()
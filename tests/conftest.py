@@ -0,0 +1,103 @@
+import itertools
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+import pytest
+
+# bot.py lit sa configuration à l'import : environnement de test avant tout `import bot`.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("BOT_TOKEN", "123:test")
+os.environ["DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="afbot-tests-"), "bot.db")
+
+import bot  # noqa: E402
+
+_ids = itertools.count(1000)
+
+
+class FakeBot:
+    """Bot Telegram factice : chaque appel d'API est enregistré dans `calls` et renvoie un faux message."""
+
+    defaults = None
+
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, method):
+        if method.startswith("_"):
+            raise AttributeError(method)
+
+        async def call(*args, **kwargs):
+            self.calls.append((method, args, kwargs))
+            mid, chat_id = next(_ids), kwargs.get("chat_id")
+
+            async def edit_text(text, **kw):
+                self.calls.append(("edit_message_text", (), {"chat_id": chat_id, "message_id": mid, "text": text, **kw}))
+
+            return SimpleNamespace(message_id=mid, chat_id=chat_id, delete=_noop, edit_text=edit_text)
+
+        return call
+
+    def sent(self, method: str = "send_message") -> list:
+        return [kw for m, _, kw in self.calls if m == method]
+
+    def deleted(self) -> set:
+        """message_id supprimés via delete_message / delete_messages (appels positionnels ou nommés)."""
+        ids = set()
+        for m, args, kw in self.calls:
+            if m == "delete_message":
+                ids.add(kw.get("message_id", args[1] if len(args) > 1 else None))
+            elif m == "delete_messages":
+                ids.update(kw.get("message_ids", args[1] if len(args) > 1 else ()))
+        return ids
+
+
+async def _noop(*args, **kwargs):
+    return True
+
+
+@pytest.fixture
+def fake_bot():
+    return FakeBot()
+
+
+@pytest.fixture
+def context(fake_bot):
+    return SimpleNamespace(bot=fake_bot, bot_data={})
+
+
+@pytest.fixture
+async def db(tmp_path, monkeypatch):
+    """Base SQLite neuve par test ; les singletons qui en dépendent sont remplacés aussi."""
+    pool = bot.DBPool(str(tmp_path / "bot.db"))
+    monkeypatch.setattr(bot, "DB", pool)
+    monkeypatch.setattr(bot, "WRITE_BEHIND", bot.WriteBehind())
+    monkeypatch.setattr(bot, "REVIEW_QUEUE", bot.ReviewQueue())
+    monkeypatch.setattr(bot, "MUTE_INDEX", bot.MuteIndex())
+    await pool.open()
+    await bot.init_db()
+    yield pool
+    await pool.close()
+
+
+@pytest.fixture
+def private_update(fake_bot):
+    """Fabrique d'updates « message privé » (texte, photo, morceau d'album)."""
+    return lambda *args, **kwargs: _private_update(fake_bot, *args, **kwargs)
+
+
+def _private_update(bot_obj, user_id: int, message_id: int, *, text=None, photo=None, media_group_id=None):
+    msg = {
+        "message_id": message_id, "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private"},
+        "from": {"id": user_id, "is_bot": False, "first_name": "U", "username": f"u{user_id}"},
+    }
+    if text is not None:
+        msg["text" if photo is None else "caption"] = text
+    if photo is not None:
+        msg["photo"] = [{"file_id": photo, "file_unique_id": photo, "width": 90, "height": 90}]
+    if media_group_id is not None:
+        msg["media_group_id"] = media_group_id
+    return bot.Update.de_json({"update_id": message_id, "message": msg}, bot_obj)
@@ -0,0 +1,109 @@
+import asyncio
+import json
+import random
+
+import pytest
+
+import bot
+
+USERS = 50
+PIECES = bot.ALBUM_MAX_ITEMS
+
+
+@pytest.fixture
+def albums(db, monkeypatch):
+    monkeypatch.setattr(bot, "ALBUM_QUIET_SEC", 0.05)
+    monkeypatch.setattr(bot, "TEMP_ALBUMS", {})
+    monkeypatch.setattr(bot, "ALREADY_FORWARDED_ALBUMS", {})
+    monkeypatch.setattr(bot, "PRIVATE_RATE", bot.RateLimitEngine())
+    finalized = []
+    original = bot.finalize_album_later
+
+    async def counting(media_group_id, context):
+        finalized.append(media_group_id)
+        await original(media_group_id, context)
+
+    monkeypatch.setattr(bot, "finalize_album_later", counting)
+    return finalized
+
+
+async def _wait_finalized(n: int, finalized: list, timeout: float = 5.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while (bot.TEMP_ALBUMS or len(finalized) < n) and loop.time() < deadline:
+        await asyncio.sleep(0.02)
+
+
+async def _pending_reports():
+    async with bot.DB.read() as db:
+        async with db.execute("SELECT report_id, text, files_json FROM pending_reports") as cur:
+            return {rid: (text, json.loads(files)) for rid, text, files in await cur.fetchall()}
+
+
+async def test_concurrent_album_bursts(albums, context, private_update):
+    """50 albums de 10 photos qui arrivent entrelacés, en quelques ms : un rapport et une mise en file par album."""
+    pieces = [
+        private_update(uid, uid * 100 + i, photo=f"p{uid}_{i}", media_group_id=f"mg{uid}",
+                       text="Accident A7" if i == 0 else None)
+        for uid in range(1, USERS + 1) for i in range(PIECES)
+    ]
+    random.Random(3).shuffle(pieces)
+    await asyncio.gather(*(bot.handle_user_message(u, context) for u in pieces))
+
+    # Un seul minuteur par album, réarmé à chaque morceau (pas N tâches)
+    assert len(bot.TEMP_ALBUMS) == USERS
+    assert all(a["timer"] is not None for a in bot.TEMP_ALBUMS.values())
+
+    await _wait_finalized(USERS, albums)
+    assert sorted(albums) == sorted(f"mg{uid}" for uid in range(1, USERS + 1))  # une finalisation chacun
+    reports = await _pending_reports()
+    assert len(reports) == USERS
+    for uid in range(1, USERS + 1):
+        text, files = reports[f"{uid}_mg{uid}"]
+        assert text == "Accident A7"
+        assert [f["file_id"] for f in files] == [f"p{uid}_{i}" for i in range(PIECES)]  # ordre des messages
+    assert bot.REVIEW_QUEUE.qsize() == USERS
+    assert not bot.TEMP_ALBUMS
+
+    await bot.WRITE_BEHIND.flush()
+    async with bot.DB.read() as db:
+        async with db.execute("SELECT count(*) FROM stats_events WHERE event_type = 'album_received'") as cur:
+            assert (await cur.fetchone())[0] == USERS
+    assert len(context.bot.sent()) == USERS  # un seul accusé de réception par album
+
+    # Morceau tardif d'un album déjà en modération : ignoré
+    await bot.handle_user_message(private_update(1, 199, photo="late", media_group_id="mg1"), context)
+    assert not bot.TEMP_ALBUMS
+
+
+async def test_album_kept_and_retried_when_insert_fails(albums, context, private_update):
+    async with bot.DB.write() as db:
+        await db.execute("ALTER TABLE pending_reports RENAME TO pending_reports_off")
+    for i in range(3):
+        await bot.handle_user_message(private_update(7, 700 + i, photo=f"f{i}", media_group_id="mg7"), context)
+
+    # Premier essai en échec : l'album reste en mémoire, réarmé pour un nouvel essai
+    while len(albums) < 1:
+        await asyncio.sleep(0.01)
+    await asyncio.sleep(0.01)
+    assert "mg7" in bot.TEMP_ALBUMS and bot.TEMP_ALBUMS["mg7"]["attempts"] == 1
+
+    async with bot.DB.write() as db:
+        await db.execute("ALTER TABLE pending_reports_off RENAME TO pending_reports")
+    await _wait_finalized(2, albums)
+    reports = await _pending_reports()
+    assert [f["file_id"] for f in reports["7_mg7"][1]] == ["f0", "f1", "f2"]
+    assert bot.REVIEW_QUEUE.qsize() == 1
+
+
+async def test_album_error_reply_after_last_attempt(albums, context, private_update):
+    async with bot.DB.write() as db:
+        await db.execute("DROP TABLE pending_reports")
+    await bot.handle_user_message(private_update(8, 800, photo="f", media_group_id="mg8"), context)
+    await _wait_finalized(bot.ALBUM_INSERT_ATTEMPTS, albums)
+
+    assert len(albums) == bot.ALBUM_INSERT_ATTEMPTS
+    assert not bot.TEMP_ALBUMS and "mg8" not in bot.ALREADY_FORWARDED_ALBUMS
+    assert bot.REVIEW_QUEUE.qsize() == 0
+    [reply] = context.bot.sent()
+    assert reply["chat_id"] == 8 and "pas pu être enregistré" in reply["text"]
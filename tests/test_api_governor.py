@@ -0,0 +1,103 @@
+import asyncio
+import time
+
+import pytest
+from telegram.error import RetryAfter
+
+import bot
+
+GROUP, OTHER = -1001, -1002
+
+
+@pytest.fixture
+async def governor():
+    gov = bot.ApiGovernor(max_retries=0)
+    await gov.initialize()
+    yield gov
+    await gov.shutdown()
+
+
+def _call(result="ok", error=None):
+    calls = []
+
+    async def callback(*args, **kwargs):
+        calls.append(time.monotonic())
+        if error is not None and len(calls) == 1:
+            raise error
+        return result
+
+    callback.calls = calls
+    return callback
+
+
+async def test_lanes_served_by_priority(governor):
+    governor.global_bucket = bot.TokenBucket(100, 1)
+    governor.global_bucket.take(1)                      # budget global épuisé : tout passe par la file
+    order = []
+
+    async def admit(lane):
+        await governor._admit(lane, None, 1)
+        order.append(lane)
+
+    arrival = [bot.LANE_CLEANUP, bot.LANE_ADMIN, bot.LANE_CLEANUP, bot.LANE_PUBLISH, bot.LANE_ENFORCE, bot.LANE_ADMIN]
+    tasks = []
+    for lane in arrival:
+        tasks.append(asyncio.create_task(admit(lane)))
+        await asyncio.sleep(0)
+    await asyncio.wait_for(asyncio.gather(*tasks), 2)
+
+    assert order == sorted(arrival)                     # enforce > publish > admin > cleanup, FIFO par voie
+    assert governor.stats["enforce"]["throttled"] == 1 and governor.stats["cleanup"]["throttled"] == 2
+
+
+@pytest.mark.parametrize("endpoint", ["deleteMessages", "restrictChatMember", "setChatPermissions", "sendMessage"])
+async def test_flood_wait_scoped_to_chat(governor, endpoint):
+    flooded = _call(error=RetryAfter(30))
+    with pytest.raises(RetryAfter):
+        await governor.process_request(flooded, (), {}, endpoint, {"chat_id": GROUP}, None)
+
+    assert governor.global_bucket.blocked_until < time.monotonic()     # le bot entier n'est pas bloqué
+    assert governor._bucket(GROUP).blocked_until > time.monotonic() + 25
+    # Les autres chats, toutes voies confondues, passent immédiatement
+    other = _call()
+    t0 = time.monotonic()
+    assert await governor.process_request(other, (), {}, "restrictChatMember", {"chat_id": OTHER}, None) == "ok"
+    assert await governor.process_request(other, (), {}, "getMe", {}, None) == "ok"
+    assert time.monotonic() - t0 < 0.5
+    # Le chat bloqué attend, même pour un appel hors budget d'envoi
+    waiting = asyncio.create_task(governor.process_request(_call(), (), {}, "deleteMessage", {"chat_id": GROUP}, None))
+    await asyncio.sleep(0.05)
+    assert not waiting.done()
+    waiting.cancel()
+
+
+async def test_flood_wait_without_chat_blocks_globally(governor):
+    with pytest.raises(RetryAfter):
+        await governor.process_request(_call(error=RetryAfter(30)), (), {}, "getMe", {}, None)
+    assert governor.global_bucket.blocked_until > time.monotonic() + 25
+
+
+async def test_send_budget_only_for_sends(governor):
+    # 20 envois / min par groupe : les suppressions dans ce groupe n'entament pas ce budget
+    cb = _call()
+    for _ in range(50):
+        await asyncio.wait_for(governor.process_request(cb, (), {}, "deleteMessage", {"chat_id": GROUP}, None), 0.5)
+    for _ in range(bot.TG_GROUP_MSG_PER_MIN):
+        await asyncio.wait_for(governor.process_request(cb, (), {}, "sendMessage", {"chat_id": GROUP}, None), 0.5)
+    over = asyncio.create_task(governor.process_request(cb, (), {}, "sendMessage", {"chat_id": GROUP}, None))
+    await asyncio.sleep(0.1)
+    assert not over.done()                              # budget d'envoi du groupe épuisé
+    over.cancel()
+
+
+async def test_retry_after_replayed_after_chat_block():
+    gov = bot.ApiGovernor(max_retries=1)
+    await gov.initialize()
+    try:
+        cb = _call(error=RetryAfter(1))
+        t0 = time.monotonic()
+        assert await gov.process_request(cb, (), {}, "deleteMessages", {"chat_id": GROUP}, None) == "ok"
+        assert len(cb.calls) == 2 and cb.calls[1] - t0 >= 0.9
+        assert gov.stats["admin"]["retries"] == 0 and gov.stats["cleanup"]["retries"] == 1
+    finally:
+        await gov.shutdown()
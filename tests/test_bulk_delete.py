@@ -0,0 +1,57 @@
+import pytest
+
+import bot
+from conftest import FakeBot
+
+CHAT = -100123
+
+
+class PickyBot(FakeBot):
+    """deleteMessages refuse tout lot contenant un id de `bad` ; deleteMessage refuse ces ids un à un."""
+
+    def __init__(self, bad=()):
+        super().__init__()
+        self.bad = set(bad)
+
+    async def delete_messages(self, chat_id, message_ids, **kwargs):
+        self.calls.append(("delete_messages", (chat_id, list(message_ids)), {}))
+        if self.bad & set(message_ids):
+            raise bot.BadRequest("Message can't be deleted")
+        return True
+
+    async def delete_message(self, chat_id, message_id, **kwargs):
+        self.calls.append(("delete_message", (chat_id, message_id), {}))
+        if message_id in self.bad:
+            raise bot.BadRequest("Message to delete not found")
+        return True
+
+
+@pytest.fixture(autouse=True)
+def fresh_stats(monkeypatch):
+    monkeypatch.setattr(bot, "BULK_DELETE_STATS", {k: 0 for k in bot.BULK_DELETE_STATS})
+
+
+async def test_chunks_of_100_per_chat():
+    b = PickyBot()
+    res = await bot.bulk_delete_messages(b, {CHAT: list(range(1, 251)), bot.ADMIN_GROUP_ID: [7]})
+    batches = [(args[0], len(args[1])) for m, args, _ in b.calls if m == "delete_messages"]
+    assert batches == [(CHAT, 100), (CHAT, 100), (CHAT, 50)]
+    assert [args for m, args, _ in b.calls if m == "delete_message"] == [(bot.ADMIN_GROUP_ID, 7)]
+    assert res == {"deleted": 251, "failed": 0, "calls": 4, "saved": 247}
+    assert bot.BULK_DELETE_STATS["saved"] == 247
+
+
+async def test_pairs_are_grouped_and_deduplicated():
+    b = PickyBot()
+    res = await bot.bulk_delete_messages(b, [(CHAT, 1), (CHAT, 2), (CHAT, 1), (CHAT, None), (CHAT, 3)])
+    assert [args for m, args, _ in b.calls] == [(CHAT, [1, 2, 3])]
+    assert res["deleted"] == 3 and res["calls"] == 1
+
+
+async def test_failed_chunk_falls_back_to_single_deletes_for_that_chunk_only():
+    b = PickyBot(bad={150})
+    res = await bot.bulk_delete_messages(b, {CHAT: list(range(1, 251))})
+    singles = [args[1] for m, args, _ in b.calls if m == "delete_message"]
+    assert singles == list(range(101, 201))              # seule la 2e tranche repasse à l'unité
+    assert res == {"deleted": 249, "failed": 1, "calls": 103, "saved": 147}
+    assert bot.BULK_DELETE_STATS["fallbacks"] == 1
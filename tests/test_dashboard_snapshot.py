@@ -0,0 +1,68 @@
+import asyncio
+
+import bot
+from conftest import FakeBot
+
+T0 = 1_700_000_000.0
+
+
+class CountingBot(FakeBot):
+    """get_chat_member_count bloqué tant que `gate` est fermé ; chaque collecte renvoie un nombre croissant."""
+
+    def __init__(self):
+        super().__init__()
+        self.gate = asyncio.Event()
+        self.gate.set()
+        self.collections = 0
+        self.fail = False
+
+    async def get_chat_member_count(self, chat_id):
+        self.collections += 1
+        await self.gate.wait()
+        if self.fail:
+            raise bot.NetworkError("timeout")
+        return 100 + self.collections
+
+
+async def test_single_flight_ttl_and_stale_serving(db, monkeypatch):
+    clock = [T0]
+    monkeypatch.setattr(bot, "_now", lambda: clock[0])
+    snap = bot.DashboardSnapshot(ttl=60, max_stale=600)
+    fake = CountingBot()
+    fake.gate.clear()
+
+    waiting = [asyncio.create_task(snap.get(fake)) for _ in range(5)]
+    await asyncio.sleep(0.05)
+    assert fake.collections == 1                                     # une seule collecte pour 5 admins
+    fake.gate.set()
+    first = await asyncio.wait_for(asyncio.gather(*waiting), 2)
+    assert all(d is first[0] for d in first) and first[0]["member_count"] == 99
+
+    clock[0] = T0 + 30                                               # dans le TTL : cache
+    assert await snap.get(fake) is first[0]
+    assert fake.collections == 1 and snap.stats["hits"] == 1
+
+    clock[0] = T0 + 120                                              # périmé mais servi, rafraîchi en fond
+    fake.gate.clear()
+    assert await asyncio.wait_for(snap.get(fake), 0.5) is first[0]
+    assert await asyncio.wait_for(snap.get(fake), 0.5) is first[0]
+    await asyncio.sleep(0)
+    assert fake.collections == 2 and snap.stats["stale"] == 2        # un seul rafraîchissement en cours
+    fake.gate.set()
+    await asyncio.wait_for(snap._task, 2)
+    assert (await snap.get(fake))["member_count"] == 100
+
+    clock[0] = T0 + 120 + 601                                        # trop vieux : on attend la collecte
+    fresh = await asyncio.wait_for(snap.get(fake), 2)
+    assert fresh["member_count"] == 101 and snap.stats["refreshes"] == 3
+
+
+async def test_failed_source_does_not_sink_snapshot(db, monkeypatch):
+    monkeypatch.setattr(bot, "_now", lambda: T0)
+    bot._inc_counter("published_total", 4)
+    fake = CountingBot()
+    fake.fail = True
+    data = await bot.DashboardSnapshot().get(fake)
+    assert data["member_count"] is None
+    assert data["counters"]["published_total"] == 4
+    assert set(data["last24"]) == {"published", "album_received", "spam_blocked"}
@@ -0,0 +1,68 @@
+import asyncio
+
+import bot
+from conftest import FakeBot
+
+T0 = 1_700_000_000.0
+CHAT = -100123
+
+
+async def _rows() -> set:
+    async with bot.DB.read() as conn:
+        async with conn.execute("SELECT chat_id, message_id FROM scheduled_deletions") as cur:
+            return set(await cur.fetchall())
+
+
+async def _wait_deleted(fake: FakeBot, ids: set, timeout: float = 2.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not ids <= fake.deleted():
+        assert loop.time() < deadline, f"non supprimés : {ids - fake.deleted()}"
+        await asyncio.sleep(0.01)
+
+
+async def test_reload_after_restart_skips_expired(db, monkeypatch):
+    clock = [T0]
+    monkeypatch.setattr(bot, "_now", lambda: clock[0])
+    before = bot.DeletionScheduler()
+    before.schedule([(CHAT, 1), (CHAT, 2)], 5)                        # échéance T0+5
+    before.schedule([(CHAT, 3)], 3600)                                # échéance T0+3600
+    before.schedule([(bot.ADMIN_GROUP_ID, 4)], 10)
+    await bot.WRITE_BEHIND.flush()                                    # puis arrêt brutal
+
+    clock[0] = T0 + bot.DELETE_MAX_AGE_SEC + 11                      # les échéances à T0+5 / T0+10 ont plus de 47 h
+    after = bot.DeletionScheduler()
+    assert await after.load() == 1
+    assert len(after) == 1
+
+    clock[0] = T0 + 2 * 3600
+    after = bot.DeletionScheduler()
+    assert await after.load() == 4
+    fake = FakeBot()
+    runner = asyncio.create_task(after.run(fake))
+    try:
+        await _wait_deleted(fake, {1, 2, 3, 4})
+    finally:
+        runner.cancel()
+    assert [(m, args) for m, args, _ in fake.calls if m == "delete_messages"] == [("delete_messages", (CHAT, [1, 2, 3]))]
+    assert after.stats["deleted"] == 4 and len(after) == 0
+    await bot.WRITE_BEHIND.flush()
+    assert await _rows() == set()
+
+
+async def test_not_yet_due_items_wait(db, monkeypatch):
+    clock = [T0]
+    monkeypatch.setattr(bot, "_now", lambda: clock[0])
+    sched = bot.DeletionScheduler()
+    sched.schedule([(CHAT, 1)], 0)
+    sched.schedule([(CHAT, 2)], 600)
+    fake = FakeBot()
+    runner = asyncio.create_task(sched.run(fake))
+    try:
+        await _wait_deleted(fake, {1})
+        await asyncio.sleep(0.05)
+        assert 2 not in fake.deleted() and len(sched) == 1
+    finally:
+        runner.cancel()
+    await bot.WRITE_BEHIND.flush()
+    assert await _rows() == {(CHAT, 2)}
@@ -0,0 +1,78 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+import bot
+
+T0 = 1_700_000_000.0
+
+
+@pytest.fixture
+async def health(db, monkeypatch):
+    clock = [T0]
+    heartbeat = {"running": True, "failures": 0, "last_ok_ts": T0, "last_check_ts": T0}
+    monkeypatch.setattr(bot, "_now", lambda: clock[0])
+    monkeypatch.setattr(bot, "HEARTBEAT", heartbeat)
+    async with TestClient(TestServer(bot.HttpServer().build_app())) as c:
+        async def status():
+            resp = await c.get("/healthz")
+            body = await resp.json()
+            return resp.status, body["status"]
+        yield SimpleNamespace(clock=clock, heartbeat=heartbeat, status=status)
+
+
+@pytest.mark.parametrize("failures, ok_age, expected", [
+    (0, 10, (200, "ok")),
+    (1, 10, (200, "degraded")),
+    (bot.HEARTBEAT_MAX_FAILURES - 1, 10, (200, "degraded")),
+    (bot.HEARTBEAT_MAX_FAILURES, 10, (503, "down")),
+    (0, bot.HEALTH_MAX_GET_ME_AGE_SEC + 1, (503, "down")),    # getMe trop ancien malgré 0 échec
+    (0, None, (503, "down")),                                  # jamais de getMe réussi
+])
+async def test_status_from_heartbeat(health, failures, ok_age, expected):
+    health.heartbeat.update(failures=failures, last_ok_ts=None if ok_age is None else T0 - ok_age)
+    assert await health.status() == expected
+
+
+async def test_heartbeat_drives_transitions(health, monkeypatch):
+    """ok -> degraded au premier getMe raté -> ok dès qu'il répond ; down + reprise réseau au seuil."""
+    replies = asyncio.Queue()
+    lost = []
+
+    async def get_me():
+        ok = await replies.get()
+        health.clock[0] += bot.HEARTBEAT_INTERVAL_SEC
+        if not ok:
+            raise bot.NetworkError("timeout")
+
+    async def next_beat(ok: bool):
+        await replies.put(ok)
+        while not replies.empty():
+            await asyncio.sleep(0.005)
+        await asyncio.sleep(0.01)
+
+    app = SimpleNamespace(bot=SimpleNamespace(get_me=get_me, send_message=lambda **kw: asyncio.sleep(0)))
+    monkeypatch.setattr(bot, "HEARTBEAT_INTERVAL_SEC", 0)
+    monkeypatch.setattr(bot, "SUPERVISOR", SimpleNamespace(
+        recovering=False, stats={"recoveries": 0}, network_lost=lambda: lost.append(health.clock[0])))
+    loop = asyncio.create_task(bot.heartbeat_loop(app))
+    try:
+        await next_beat(True)
+        assert await health.status() == (200, "ok")
+        await next_beat(False)
+        assert await health.status() == (200, "degraded")
+        await next_beat(True)
+        assert await health.status() == (200, "ok")
+        for _ in range(bot.HEARTBEAT_MAX_FAILURES - 1):
+            await next_beat(False)
+        assert await health.status() == (200, "degraded") and lost == []
+        await next_beat(False)
+        assert len(lost) == 1                                      # couche réseau relancée au seuil
+        health.clock[0] = bot.HEARTBEAT["last_ok_ts"] + bot.HEALTH_MAX_GET_ME_AGE_SEC + 1
+        assert await health.status() == (503, "down")              # toujours pas de getMe réussi
+        await next_beat(True)
+        assert await health.status() == (200, "ok")
+    finally:
+        loop.cancel()
@@ -0,0 +1,115 @@
+import time
+
+import pytest
+from hypothesis import given, settings, strategies as st
+
+import bot
+
+ENGINE = bot.LINK_ENGINE
+TLDS = bot._LINK_TLDS.split("|")
+
+words = st.sampled_from([
+    "Paris", "bouchon", "accident", "A7", "rond-point", "De", "To", "St-Etienne", "Info", "radar",
+    "sortie", "N104", "péage", "Évry", "tv", "info", "fr", "com", "me", "be", "nombreux", "continued",
+    "Lyon", "ça", "roule", "bien", "km/h", "12h30", "merci",
+])
+separators = st.sampled_from([" ", "  ", ", ", ". ", ".", "!", "?", " - ", "\n", "…", "/"])
+label = st.from_regex(r"[a-z][a-z0-9]{1,10}", fullmatch=True)
+host = st.builds(lambda parts, tld: ".".join(parts) + "." + tld, st.lists(label, min_size=1, max_size=3), st.sampled_from(TLDS))
+filler = st.lists(words, max_size=6).map(" ".join)
+
+
+@st.composite
+def plain_french(draw):
+    parts = draw(st.lists(words, min_size=1, max_size=12))
+    out = parts[0]
+    for w in parts[1:]:
+        out += draw(separators) + w
+    return out
+
+
+@given(plain_french())
+@settings(max_examples=500)
+def test_plain_text_without_explicit_link_passes(text):
+    """Mots collés par un point ("Paris.De", "bouchon.info") : jamais un lien sans schéma, www. ni t.me."""
+    assert not ENGINE.check_text(text).blocked
+
+
+@given(filler, st.sampled_from(["http://", "https://", "HTTPS://", "www."]), host, st.from_regex(r"(/[a-z0-9]{0,8}){0,2}", fullmatch=True), filler)
+@settings(max_examples=300)
+def test_explicit_links_are_blocked(before, scheme, h, path, after):
+    verdict = ENGINE.check_text(f"{before} {scheme}{h}{path} {after}")
+    assert verdict.blocked and verdict.reason == "url"
+    assert verdict.host.endswith(h)
+
+
+obfuscations = st.sampled_from([
+    lambda h: h.replace(".", "[.]"),
+    lambda h: h.replace(".", " [.] "),
+    lambda h: h.replace(".", "(.)"),
+    lambda h: h.replace(".", "{dot}"),
+    lambda h: h.replace(".", " dot "),
+    lambda h: "hxxps://" + h,
+    lambda h: h.replace(".", "​."),
+    lambda h: "".join(chr(ord(c) + 0xFEE0) if "!" <= c <= "~" else c for c in h),  # pleine chasse
+])
+
+
+@given(filler, obfuscations, host, filler)
+@settings(max_examples=300)
+def test_obfuscated_hosts_are_blocked(before, obfuscate, h, after):
+    verdict = ENGINE.check_text(f"{before} {obfuscate(h)} {after}")
+    assert verdict.blocked
+    assert verdict.host == h
+
+
+@given(st.sampled_from(sorted(ENGINE.allowed)), st.sampled_from(["t.me/", "https://t.me/", "telegram.me/", "t .me/", "@"]), filler)
+def test_allowlisted_channels_pass(username, prefix, rest):
+    assert not ENGINE.check_text(f"Rejoignez {prefix}{username} {rest}").blocked
+
+
+@given(label.filter(lambda u: u not in ENGINE.allowed), st.sampled_from(["t.me/", "https://t.me/", "telegram.me/", "t .me/", "t[.]me/"]))
+def test_other_telegram_links_are_blocked(username, prefix):
+    verdict = ENGINE.check_text(f"viens sur {prefix}{username}")
+    assert verdict.blocked and verdict.reason == "tg_link" and verdict.host == f"t.me/{username}"
+
+
+@given(st.text(max_size=300))
+@settings(max_examples=1000)
+def test_never_raises(text):
+    assert isinstance(ENGINE.check_text(text), bot.LinkVerdict)
+
+
+@pytest.mark.parametrize("text", [
+    "Paris.De nombreux bouchons ce matin",
+    "bouchon.To be continued",
+    "rond-point.tv",
+    "bouchon.info",
+    "St-Etienne.fr",
+    "Accident à St-Étienne.fr, prudence",
+    "Contrôle (radar) à 200 m",
+    "Suivez @AccidentsFR",
+    "Paris Paris Paris.De/Paris…Paris",     # « … » normalisé en « ... » après l'hôte écrit tel quel
+])
+def test_reported_false_positives(text):
+    assert not ENGINE.check_text(text).blocked
+
+
+@pytest.mark.parametrize("text, reason", [
+    ("t.me/+AbCdEf", "tg_invite"),
+    ("https://t.me/joinchat/xyz", "tg_invite"),
+    ("tg://resolve?domain=autre", "tg_link"),
+    ("xn--80ak6aa92e.com", "punycode"),
+    ("http://xn--80ak6aa92e.com", "punycode"),
+])
+def test_structured_verdicts(text, reason):
+    assert ENGINE.check_text(text).reason == reason
+
+
+def test_throughput_floor():
+    """Garde-fou grossier : le bench détaillé est bench/bench_links.py."""
+    texts = ["Accident A7 sortie 15, bouchon.info", "https://spam.xyz/x", "RAS sur la N7"] * 1000
+    t0 = time.perf_counter()
+    for t in texts:
+        ENGINE.check_text(t)
+    assert len(texts) / (time.perf_counter() - t0) > 20_000
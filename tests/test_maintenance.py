@@ -0,0 +1,63 @@
+import re
+
+import bot
+
+T0 = 1_700_000_000.0
+
+
+def _jobs(calls: list) -> bot.Maintenance:
+    async def purge():
+        calls.append("purge")
+        return 12
+
+    async def broken():
+        calls.append("broken")
+        raise RuntimeError("table verrouillée")
+
+    m = bot.Maintenance()
+    m.add("purge", 3600, purge)
+    m.add("broken", 600, broken)
+    m.add("idle", 86400, purge)
+    return m
+
+
+async def test_due_times_survive_restart(db, monkeypatch):
+    clock = [T0]
+    monkeypatch.setattr(bot, "_now", lambda: clock[0])
+    calls = []
+    m = _jobs(calls)
+    await m._run_job("purge", m.jobs["purge"])
+    clock[0] = T0 + 5
+    await m._run_job("broken", m.jobs["broken"])
+    assert calls == ["purge", "broken"]
+    assert m.jobs["purge"]["rows"] == 12 and m.jobs["purge"]["due"] == T0 + 3600
+    assert m.jobs["broken"]["errors"] == 1 and m.jobs["broken"]["due"] == T0 + 5 + 600   # replanifiée malgré l'échec
+    assert re.fullmatch(r"purge \d+ms/12 · broken \d+ms/0/⚠️1", m.summary())
+    await bot.WRITE_BEHIND.flush()
+
+    clock[0] = T0 + 1800                                     # redémarrage
+    restarted = _jobs([])
+    await restarted._load_due()
+    assert restarted.jobs["purge"]["due"] == T0 + 3600       # pas de nouvelle exécution au démarrage
+    assert restarted.jobs["broken"]["due"] == T0 + 605
+    assert restarted.jobs["idle"]["due"] == T0 + 1800 + 30   # jamais exécutée : peu après le démarrage
+    assert restarted.jobs["purge"]["last_ts"] == T0
+
+
+async def test_delete_batched_deletes_matching_rows_in_batches(db, monkeypatch):
+    monkeypatch.setattr(bot, "MAINT_BATCH_ROWS", 10)
+    monkeypatch.setattr(bot, "MAINT_BATCH_PAUSE_SEC", 0)
+    async with bot.DB.write() as conn:
+        await conn.executemany(
+            "INSERT INTO stats_events (event_type, ts, meta) VALUES ('e', ?, NULL)", [(ts,) for ts in range(35)]
+        )
+    writes = []
+    write = bot.DB.write
+    monkeypatch.setattr(bot.DB, "write", lambda: writes.append(1) or write())
+
+    assert await bot._delete_batched("stats_events", "ts < ?", (25,)) == 25
+    assert len(writes) == 3                                  # 10 + 10 + 5 : une transaction courte par lot
+    async with bot.DB.read() as conn:
+        async with conn.execute("SELECT MIN(ts), COUNT(*) FROM stats_events") as cur:
+            assert await cur.fetchone() == (25, 10)
+    assert await bot._delete_batched("stats_events", "ts < ?", (25,)) == 0
@@ -0,0 +1,56 @@
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+from prometheus_client.parser import text_string_to_metric_families
+
+import bot
+
+
+@pytest.fixture
+async def client(db, monkeypatch):
+    monkeypatch.setattr(bot, "METRICS", bot.Metrics())
+    async with TestClient(TestServer(bot.HttpServer().build_app())) as c:
+        yield c
+
+
+async def _scrape(client) -> dict:
+    resp = await client.get("/metrics")
+    assert resp.status == 200
+    assert resp.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+    return {f.name: f for f in text_string_to_metric_families(await resp.text())}
+
+
+async def test_scrape_parses_as_prometheus_text(client):
+    for v in (0.0005, 0.001, 0.02, 0.3, 42.0):
+        bot.METRICS.observe("afbot_handler_seconds", v, (("handler", "handle_user_message"),))
+    bot.METRICS.inc("afbot_handler_errors_total", (("handler", 'quote"back\\slash\nnewline'),), 2)
+    bot.METRICS.set("afbot_loop_lag_last_seconds", 0.004)
+    bot._inc_counter("published_total", 3)
+
+    families = await _scrape(client)
+
+    h = families["afbot_handler_seconds"]
+    assert h.type == "histogram"
+    samples = {(s.name, s.labels.get("le")): s.value for s in h.samples}
+    assert samples[("afbot_handler_seconds_bucket", "0.001")] == 2       # bornes incluses (le)
+    assert samples[("afbot_handler_seconds_bucket", "+Inf")] == 5
+    assert samples[("afbot_handler_seconds_count", None)] == 5
+    assert samples[("afbot_handler_seconds_sum", None)] == pytest.approx(42.3215)
+    buckets = [s.value for s in h.samples if s.name.endswith("_bucket")]
+    assert buckets == sorted(buckets)                                    # seaux cumulés
+
+    (err,) = families["afbot_handler_errors"].samples                    # famille sans _total côté parseur
+    assert err.labels["handler"] == 'quote"back\\slash\nnewline' and err.value == 2
+
+    assert families["afbot_loop_lag_last_seconds"].samples[0].value == 0.004
+    counters = {s.labels["key"]: s.value for s in families["afbot_counter"].samples}
+    assert counters["published_total"] == 3                              # write-behind vidé avant le scrape
+    assert families["afbot_review_queue_depth"].type == "gauge"
+    assert families["afbot_updates_inflight"].samples[0].value == 0
+
+
+async def test_scrape_without_database_is_503(client, monkeypatch):
+    async def broken():
+        raise RuntimeError("base indisponible")
+    monkeypatch.setattr(bot, "metrics_scrape", broken)
+    resp = await client.get("/metrics")
+    assert resp.status == 503
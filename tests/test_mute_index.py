@@ -0,0 +1,113 @@
+import pytest
+
+import bot
+
+NOW = 1_700_000_000
+
+
+@pytest.fixture
+async def restart(db, monkeypatch):
+    """Arrêt (flush + fermeture du pool) puis démarrage à froid sur le même fichier, comme _post_init."""
+    pools = []
+
+    async def _restart() -> bot.MuteIndex:
+        await bot.WRITE_BEHIND.flush()
+        await bot.DB.close()
+        pool = bot.DBPool(db.path)
+        pools.append(pool)
+        monkeypatch.setattr(bot, "DB", pool)
+        return await _cold_start(monkeypatch)
+
+    yield _restart
+    for pool in pools:
+        await pool.close()
+
+
+async def _cold_start(monkeypatch) -> bot.MuteIndex:
+    monkeypatch.setattr(bot, "WRITE_BEHIND", bot.WriteBehind())
+    await bot.init_db()
+    index = bot.MuteIndex()
+    monkeypatch.setattr(bot, "MUTE_INDEX", index)
+    await index.load()
+    return index
+
+
+async def _rows() -> dict:
+    async with bot.DB.read() as db:
+        async with db.execute("SELECT user_id, mute_until_ts FROM muted_users") as cur:
+            return dict(await cur.fetchall())
+
+
+async def test_mutes_survive_restart(restart, monkeypatch):
+    clock = [NOW]
+    monkeypatch.setattr(bot, "_now", lambda: clock[0])
+    async with bot.DB.write() as conn:
+        await bot.MUTE_INDEX.mute(conn, 1, NOW + 3600)
+        await bot.MUTE_INDEX.mute(conn, 2, NOW + 60)
+    assert bot.MUTE_INDEX.remaining(1) == 3600
+
+    clock[0] = NOW + 30
+    index = await restart()
+    assert (index.remaining(1), index.remaining(2), index.remaining(3)) == (3570, 30, 0)
+    assert len(index) == 2
+
+
+async def test_expired_mutes_not_reloaded_and_rows_purged(restart, monkeypatch):
+    clock = [NOW]
+    monkeypatch.setattr(bot, "_now", lambda: clock[0])
+    async with bot.DB.write() as conn:
+        await bot.MUTE_INDEX.mute(conn, 1, NOW + 10)
+        await bot.MUTE_INDEX.mute(conn, 2, NOW + 1000)
+
+    clock[0] = NOW + 20
+    assert bot.MUTE_INDEX.remaining(1) == 0     # expiration paresseuse -> DELETE différé
+    index = await restart()
+    assert index.remaining(1) == 0 and index.remaining(2) == 980
+    assert await _rows() == {2: NOW + 1000}
+
+    # Ligne expirée restée en base (arrêt brutal avant le flush) : ignorée au chargement
+    async with bot.DB.write() as conn:
+        await conn.execute("INSERT INTO muted_users (user_id, mute_until_ts) VALUES (3, ?)", (NOW,))
+    index = await restart()
+    assert index.remaining(3) == 0 and len(index) == 1
+
+
+async def test_remute_not_undone_by_pending_eviction(restart, monkeypatch):
+    clock = [NOW]
+    monkeypatch.setattr(bot, "_now", lambda: clock[0])
+    async with bot.DB.write() as conn:
+        await bot.MUTE_INDEX.mute(conn, 1, NOW + 10)
+
+    clock[0] = NOW + 20
+    assert bot.MUTE_INDEX.evict() == 1          # DELETE ... mute_until_ts <= NOW+10 en tampon
+    async with bot.DB.write() as conn:          # nouveau mute avant le flush
+        await bot.MUTE_INDEX.mute(conn, 1, NOW + 600)
+
+    index = await restart()
+    assert index.remaining(1) == 580
+    assert await _rows() == {1: NOW + 600}
+
+
+async def test_remute_extends_and_stale_heap_entry_ignored(restart, monkeypatch):
+    clock = [NOW]
+    monkeypatch.setattr(bot, "_now", lambda: clock[0])
+    async with bot.DB.write() as conn:
+        await bot.MUTE_INDEX.mute(conn, 1, NOW + 10)
+        await bot.MUTE_INDEX.mute(conn, 1, NOW + 1000)
+
+    clock[0] = NOW + 20
+    assert bot.MUTE_INDEX.evict() == 0          # ancienne échéance du tas : périmée, ignorée
+    assert bot.MUTE_INDEX.remaining(1) == 980
+    index = await restart()
+    assert index.remaining(1) == 980
+
+
+async def test_rolled_back_mute_not_mirrored(restart, monkeypatch):
+    monkeypatch.setattr(bot, "_now", lambda: NOW)
+    with pytest.raises(RuntimeError):
+        async with bot.DB.write() as conn:
+            await bot.MUTE_INDEX.mute(conn, 1, NOW + 600)
+            raise RuntimeError("échec après l'INSERT")
+    assert bot.MUTE_INDEX.remaining(1) == 0
+    index = await restart()
+    assert index.remaining(1) == 0 and await _rows() == {}
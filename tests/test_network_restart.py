@@ -0,0 +1,111 @@
+"""Reprise réseau (Supervisor._restart_network) : Bot.shutdown() puis Bot.initialize() sans perdre les appelants."""
+import asyncio
+
+import pytest
+
+import bot
+
+
+async def _until(predicate, timeout: float = 2.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not predicate():
+        assert loop.time() < deadline, "délai dépassé"
+        await asyncio.sleep(0.005)
+
+
+def _cancelled_wait():
+    """Attente dont la future est annulée par un tiers (et non la tâche qui attend)."""
+    fut = asyncio.get_running_loop().create_future()
+    fut.cancel()
+    return fut
+
+
+@pytest.fixture
+async def governor():
+    gov = bot.ApiGovernor()
+    await gov.initialize()
+    gov.global_bucket = bot.TokenBucket(50, 1)      # un appel tout de suite, puis un toutes les 20 ms
+    yield gov
+    await gov.shutdown()
+
+
+async def test_governor_keeps_waiters_across_restart(governor):
+    waiters = [asyncio.create_task(governor._admit(bot.LANE_ADMIN, None, 1)) for _ in range(6)]
+    await asyncio.sleep(0)
+    assert len(governor._pending) == 5
+
+    await governor.shutdown()                       # ce que fait Bot.shutdown() pendant la reprise
+    await asyncio.sleep(0.05)
+    assert not any(w.cancelled() for w in waiters)
+    await governor.initialize()                     # Bot.initialize()
+
+    await asyncio.wait_for(asyncio.gather(*waiters), 2)
+    assert governor.stats["admin"]["throttled"] == 5
+
+
+async def test_worker_waiting_on_governor_survives_restart(governor, monkeypatch):
+    monkeypatch.setattr(bot, "REVIEW_QUEUE", bot.ReviewQueue())
+    delivered = []
+
+    async def deliver(application, report_id):
+        await governor._admit(bot.LANE_PUBLISH, None, 1)
+        delivered.append(report_id)
+        return True
+
+    monkeypatch.setattr(bot, "_deliver_report", deliver)
+    worker = asyncio.create_task(bot.worker_loop(None))
+    for rid in ("r1", "r2", "r3"):
+        await bot.REVIEW_QUEUE.put(rid)
+    await _until(lambda: governor._pending)
+    await governor.shutdown()
+    await governor.initialize()
+
+    await _until(lambda: len(delivered) == 3)
+    assert delivered == ["r1", "r2", "r3"] and not worker.done()
+    worker.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await worker
+
+
+async def test_worker_retries_report_after_foreign_cancel(monkeypatch):
+    monkeypatch.setattr(bot, "REVIEW_QUEUE", bot.ReviewQueue())
+    monkeypatch.setattr(bot, "REVIEW_RETRY_MIN_SEC", 0.01)
+    attempts = []
+
+    async def deliver(application, report_id):
+        attempts.append(report_id)
+        if len(attempts) == 1:
+            await _cancelled_wait()
+        return True
+
+    monkeypatch.setattr(bot, "_deliver_report", deliver)
+    worker = asyncio.create_task(bot.worker_loop(None))
+    await bot.REVIEW_QUEUE.put("r1")
+    await _until(lambda: len(attempts) == 2)
+    await _until(lambda: bot.REVIEW_QUEUE.depth == 0)
+    assert not worker.done()
+    worker.cancel()                                 # un vrai cancel() de la tâche l'arrête toujours
+    with pytest.raises(asyncio.CancelledError):
+        await worker
+
+
+async def test_deletion_scheduler_survives_foreign_cancel(db, fake_bot, monkeypatch):
+    scheduler = bot.DeletionScheduler()
+    batches = []
+
+    async def bulk_delete(bot_obj, per_chat):
+        batches.append(per_chat)
+        if len(batches) == 1:
+            await _cancelled_wait()
+        return {"deleted": sum(map(len, per_chat.values())), "failed": 0, "calls": 1, "saved": 0}
+
+    monkeypatch.setattr(bot, "bulk_delete_messages", bulk_delete)
+    task = asyncio.create_task(scheduler.run(fake_bot))
+    scheduler.schedule([(-100, 1), (-100, 2)], 0)
+    await _until(lambda: len(batches) == 2, timeout=3)
+    assert batches[1] == {-100: [1, 2]} and scheduler.stats["deleted"] == 2
+    assert not task.done()
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+import bot
+
+
+@pytest.fixture
+def profiler(monkeypatch):
+    p = bot.Profiler()
+    monkeypatch.setattr(bot, "PROFILER", p)
+    monkeypatch.setattr(bot, "METRICS", bot.Metrics())
+    monkeypatch.setattr(bot, "SLOW_HANDLER_SEC", 0.05)
+    monkeypatch.setattr(bot, "PERF_SAMPLE_STACKS", True)
+    return p
+
+
+def test_perf_window_aggregates_per_minute_and_expires(monkeypatch):
+    clock = [60 * 1000.0]
+    monkeypatch.setattr(bot.time, "time", lambda: clock[0])
+    w = bot.PerfWindow(minutes=3)
+    w.record("a", 0.2)
+    w.record("a", 0.4)
+    clock[0] += 60
+    w.record("a", 0.1)
+    w.record("b", 1.0)
+    assert w.top(5) == [("b", 1, 1.0, 1.0), ("a", 3, pytest.approx(0.7 / 3), 0.4)]
+
+    clock[0] += 3 * 60                                        # la première minute sort de la fenêtre
+    w.record("c", 0.01)
+    assert w.totals() == {"c": [1, 0.01, 0.01]}
+    assert len(w._buckets) == 1                               # mémoire bornée à la fenêtre
+
+
+async def test_slow_handler_logged_with_sampled_stack(profiler):
+    async def fetch_remote():
+        await asyncio.sleep(0.12)
+
+    async def on_slow(update, context):
+        await fetch_remote()
+
+    async def on_fast(update, context):
+        return "ok"
+
+    assert await bot.timed_handler(on_fast)(None, None) == "ok"
+    await bot.timed_handler(on_slow)(None, None)
+
+    assert [name for _, name, _, _ in profiler.slow] == ["on_slow"]
+    _, _, dur, stack = profiler.slow[0]
+    assert dur >= 0.1
+    assert "on_slow" in stack and "fetch_remote" in stack and "sleep" in stack
+    assert {key for key, *_ in profiler.handlers.top(5)} == {"on_slow", "on_fast"}
+
+
+async def test_handler_errors_counted_and_reraised(profiler):
+    async def broken(update, context):
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        await bot.timed_handler(broken)(None, None)
+    assert bot.METRICS.counters[("afbot_handler_errors_total", (("handler", "broken"),))] == 1
+    assert profiler.handlers.totals()["broken"][0] == 1
+
+
+async def test_sql_timed_per_normalised_statement(db, profiler):
+    async with bot.DB.read() as conn:
+        for _ in range(3):
+            async with conn.execute("SELECT   COUNT(*)\n  FROM pending_reports") as cur:
+                assert (await cur.fetchone())[0] == 0
+    async with bot.DB.write() as conn:
+        await conn.executemany("INSERT INTO counters (key, value) VALUES (?, ?)", [("a", 1), ("b", 2)])
+    totals = profiler.sql.totals()
+    assert totals["SELECT COUNT(*) FROM pending_reports"][0] == 3
+    assert totals["INSERT INTO counters (key, value) VALUES (?, ?)"][0] == 1
@@ -0,0 +1,180 @@
+"""
+Simulateur de raid : rejoue un afflux synthétique dans le groupe public contre le FakeBot,
+en horloge simulée, et vérifie ce que le bot envoie réellement à l'API.
+"""
+import asyncio
+import itertools
+import random
+
+import pytest
+
+import bot
+
+T0 = 1_700_000_000.0
+ADMIN = 1
+_mids = itertools.count(1)
+
+
+def _group_update(fake_bot, user_id: int, *, text: str | None = None, joined: list | None = None):
+    mid = next(_mids)
+    msg = {
+        "message_id": mid, "date": int(T0),
+        "chat": {"id": bot.PUBLIC_GROUP_ID, "type": "supergroup", "title": "AccidentsFR"},
+        "from": {"id": user_id, "is_bot": False, "first_name": "U"},
+    }
+    if joined is not None:
+        msg["new_chat_members"] = [{"id": u, "is_bot": False, "first_name": "N"} for u in joined]
+    else:
+        msg["text"] = text
+    return bot.Update.de_json({"update_id": mid, "message": msg}, fake_bot)
+
+
+class Simulation:
+    """Horloge simulée + rejeu d'événements (arrivées, messages) dans handle_user_message."""
+
+    def __init__(self, context, monkeypatch):
+        self.context = context
+        self.clock = T0
+        monkeypatch.setattr(bot, "_now", lambda: self.clock)
+        monkeypatch.setattr(bot, "RAID", bot.RaidDetector())
+        monkeypatch.setattr(bot, "PUBLIC_RATE", bot.RateLimitEngine())
+        monkeypatch.setattr(bot, "CHAT_FLOOD", bot.ChatFloodDetector())
+        monkeypatch.setattr(bot, "RAID_FLUSH_SEC", 0.01)
+        monkeypatch.setattr(bot, "FLOOD_AUTOUNLOCK_SEC", 0)     # voir les tests de déverrouillage auto
+        context.bot_data[f"admin_cache_{bot.PUBLIC_GROUP_ID}"] = ({ADMIN}, float("inf"))
+
+    async def join(self, *user_ids):
+        await bot.handle_user_message(_group_update(self.context.bot, user_ids[0], joined=list(user_ids)), self.context)
+
+    async def say(self, user_id: int, text: str):
+        await bot.handle_user_message(_group_update(self.context.bot, user_id, text=text), self.context)
+
+    async def raid(self, first_id: int):
+        await self.join(*range(first_id, first_id + bot.RAID_JOIN_THRESHOLD))
+        assert bot.RAID.active
+
+    async def command(self, text: str):
+        handler = {"/lock": bot.handle_lock, "/unlock": bot.handle_unlock}[text]
+        await handler(_group_update(self.context.bot, ADMIN, text=text), self.context)
+
+    async def advance(self, seconds: float):
+        self.clock += seconds
+        await asyncio.sleep(0.05)       # laisse tourner la tâche du raid (flush, fin, déverrouillage)
+
+    def admin_messages(self) -> list:
+        """Textes envoyés au groupe admin (send_message positionnel ou nommé)."""
+        out = []
+        for m, args, kw in self.context.bot.calls:
+            if m == "send_message" and kw.get("chat_id", args[0] if args else None) == bot.ADMIN_GROUP_ID:
+                out.append(kw.get("text", args[1] if len(args) > 1 else ""))
+        return out
+
+    def muted(self) -> set:
+        return {kw["user_id"] for kw in self.context.bot.sent("restrict_chat_member")}
+
+    def locks(self) -> list:
+        return [kw["permissions"] for kw in self.context.bot.sent("set_chat_permissions")]
+
+
+@pytest.fixture
+async def sim(db, context, monkeypatch):
+    simulation = Simulation(context, monkeypatch)
+    yield simulation
+    if bot.RAID.active:                         # termine la tâche du raid avant de fermer la base
+        await simulation.advance(bot.RAID_QUIET_SEC + 1)
+
+
+async def test_synthetic_raid_is_batched(sim):
+    rnd = random.Random(13)
+    raiders = list(range(5000, 5030))
+    for i in range(0, 10, 5):                   # 10 arrivées : sous RAID_JOIN_THRESHOLD
+        await sim.join(*raiders[i:i + 5])
+        await sim.advance(1)
+    assert not bot.RAID.active
+    expect_muted = set()
+    raid_start = None
+    for uid in raiders:
+        text = rnd.choice(["rejoins t.me/arnaque", "xkcdvbnmqwrtzplkjh", "promo promo"])
+        await sim.say(uid, text)
+        await sim.say(uid, text)                # second message sous le cooldown
+        # « promo promo » n'est qu'un excès de débit : raideur seulement s'il vient d'arriver
+        if bot.RAID.active and (text != "promo promo" or uid < 5010):
+            expect_muted.add(uid)
+        if bot.RAID.active and raid_start is None:
+            raid_start = len(sim.context.bot.calls)
+        sim.clock += 0.2                        # rafale : la tâche du raid ne tourne qu'après
+
+    await sim.advance(bot.RAID_QUIET_SEC + 1)
+    await sim.advance(1)
+
+    fake = sim.context.bot
+    summaries = sim.admin_messages()
+    assert len(summaries) == 1 and "Raid" in summaries[0]   # un seul message admin, édité à la fin
+    assert "terminé" in fake.sent("edit_message_text")[-1]["text"]
+    assert sim.locks()[0] == bot.LOCK_PERMISSIONS
+    assert sim.muted() == expect_muted and len(expect_muted) > 15
+    during = [m for m, _, _ in fake.calls[raid_start:]]
+    assert "delete_messages" in during          # suppressions regroupées (deleteMessages)
+    assert "delete_message" not in during       # plus aucune suppression unitaire une fois le raid détecté
+
+
+async def test_chatty_regulars_do_not_trigger_raid(sim):
+    # 5 habitués qui enchaînent deux messages, deux fois dans la minute : 10 coups de cooldown
+    regulars = [1, 2, 3, 4, 5]
+    for _ in range(2):
+        for uid in regulars:
+            await sim.say(uid, "bouchon sur l'A7")
+            await sim.say(uid, "toujours bloqué ici")
+        await sim.advance(20)
+
+    assert not bot.RAID.active
+    assert sim.locks() == []
+    assert sim.muted() == set()                 # MUTE_THRESHOLD avertissements requis hors raid
+    assert sim.admin_messages() == []
+
+
+async def test_regular_not_muted_on_first_hit_during_raid(sim):
+    await sim.join(*range(9000, 9000 + bot.RAID_JOIN_THRESHOLD))
+    assert bot.RAID.active
+    await sim.say(42, "bouchon sur l'A7")
+    await sim.say(42, "toujours bloqué ici")
+    assert 42 not in sim.muted()
+    await sim.say(9000, "salut")
+    await sim.say(9000, "salut")                 # nouveau venu : mute immédiat en raid
+    assert 9000 in sim.muted()
+
+
+async def test_auto_unlock(sim, monkeypatch):
+    monkeypatch.setattr(bot, "FLOOD_AUTOUNLOCK_SEC", 300)
+    await sim.raid(9000)
+    await sim.advance(bot.RAID_QUIET_SEC + 1)
+    assert not bot.RAID.active
+    await sim.advance(100)
+    assert sim.locks() == [bot.LOCK_PERMISSIONS]            # échéance pas encore atteinte
+    await sim.advance(100)
+    assert sim.locks() == [bot.LOCK_PERMISSIONS, bot.DEFAULT_PERMISSIONS]
+
+
+async def test_back_to_back_raids_unlock_on_latest_deadline(sim, monkeypatch):
+    monkeypatch.setattr(bot, "FLOOD_AUTOUNLOCK_SEC", 300)
+    await sim.raid(9000)                                     # raid 1 : T0, échéance T0+300
+    await sim.advance(bot.RAID_QUIET_SEC + 1)
+    await sim.advance(80)
+    assert not bot.RAID.active
+    await sim.raid(9100)                                     # raid 2 : T0+201, échéance T0+501
+    await sim.advance(bot.RAID_QUIET_SEC + 1)
+    await sim.advance(10)                                    # T0+333 : échéance du raid 1 dépassée
+    assert not bot.RAID.active
+    assert sim.locks() == [bot.LOCK_PERMISSIONS, bot.LOCK_PERMISSIONS]
+    await sim.advance(170)                                   # T0+503
+    assert sim.locks() == [bot.LOCK_PERMISSIONS, bot.LOCK_PERMISSIONS, bot.DEFAULT_PERMISSIONS]
+
+
+async def test_manual_lock_after_raid_not_undone(sim, monkeypatch):
+    monkeypatch.setattr(bot, "FLOOD_AUTOUNLOCK_SEC", 300)
+    await sim.raid(9000)
+    await sim.advance(bot.RAID_QUIET_SEC + 1)
+    await sim.command("/lock")
+    await sim.advance(400)
+    assert sim.locks() == [bot.LOCK_PERMISSIONS, bot.LOCK_PERMISSIONS]   # raid, puis /lock : reste fermé
+    assert bot.RAID._task.done()
@@ -0,0 +1,275 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+from telegram.error import NetworkError
+
+import bot
+from conftest import FakeBot
+
+REPORT = "42_900"
+
+
+class SlowMediaBot(FakeBot):
+    """L'envoi d'album vers le groupe admin reste bloqué tant que `gate` n'est pas ouvert."""
+
+    def __init__(self):
+        super().__init__()
+        self.gate = asyncio.Event()
+        self.media_started = asyncio.Event()
+        self.media_sent = []
+
+    async def send_media_group(self, chat_id, media, **kwargs):
+        self.calls.append(("send_media_group", (), {"chat_id": chat_id}))
+        self.media_started.set()
+        await self.gate.wait()
+        msgs = [SimpleNamespace(message_id=5000 + len(self.media_sent) * 10 + i) for i in range(len(media))]
+        self.media_sent.append([m.message_id for m in msgs])
+        return msgs
+
+
+async def _insert_report(text: str = "ancien texte"):
+    files = [{"type": "photo", "file_id": f"F{i}"} for i in range(3)]
+    async with bot.DB.write() as db:
+        await db.execute(
+            "INSERT INTO pending_reports (report_id, text, files_json, created_ts, user_name) VALUES (?, ?, ?, ?, 'u')",
+            (REPORT, text, json.dumps(files), int(time.time()))
+        )
+
+
+async def _row():
+    async with bot.DB.read() as db:
+        async with db.execute(
+            "SELECT text, delivery_state, delivery_gen FROM pending_reports WHERE report_id = ?", (REPORT,)
+        ) as cur:
+            return await cur.fetchone()
+
+
+async def _outbox() -> set:
+    async with bot.DB.read() as db:
+        async with db.execute("SELECT message_id FROM admin_outbox WHERE report_id = ?", (REPORT,)) as cur:
+            return {mid for (mid,) in await cur.fetchall()}
+
+
+async def _drained(timeout: float = 5.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while bot.REVIEW_QUEUE.depth and loop.time() < deadline:
+        await asyncio.sleep(0.01)
+
+
+async def test_edit_while_media_pending_redelivers(db):
+    """Édition pendant que les médias attendent leur tour : l'ancienne livraison est périmée, la nouvelle part."""
+    slow = SlowMediaBot()
+    app = SimpleNamespace(bot=slow)
+    await _insert_report()
+    worker = asyncio.create_task(bot.worker_loop(app))
+    try:
+        await bot.REVIEW_QUEUE.put(REPORT)
+        await asyncio.wait_for(slow.media_started.wait(), 2)
+        stale_preview = slow.sent()[0]
+
+        # Bouton EDIT déjà actif sur l'aperçu : l'admin envoie le nouveau texte
+        async with bot.DB.write() as db:
+            await db.execute("INSERT INTO edit_state (chat_id, report_id, prompt_message_id) VALUES (?, ?, 0)",
+                             (bot.ADMIN_GROUP_ID, REPORT))
+        edit = bot.Update.de_json({"update_id": 1, "message": {
+            "message_id": 77, "date": int(time.time()), "text": "nouveau texte",
+            "chat": {"id": bot.ADMIN_GROUP_ID, "type": "supergroup"},
+            "from": {"id": 5, "is_bot": False, "first_name": "Admin"}}}, slow)
+        await bot.handle_admin_edit(edit, SimpleNamespace(bot=slow, bot_data={}))
+        assert await _row() == ("nouveau texte", "queued", 1)
+
+        slow.gate.set()
+        await _drained()
+    finally:
+        worker.cancel()
+
+    text, state, gen = await _row()
+    assert (text, state, gen) == ("nouveau texte", "delivered", 1)
+    previews = [kw for kw in slow.sent() if kw.get("reply_markup") is not None]
+    assert [p["text"] for p in previews] == [stale_preview["text"], bot._make_admin_preview("u", "nouveau texte", True)]
+    stale_media, fresh_media = slow.media_sent
+    assert set(stale_media) <= slow.deleted()          # plus d'albums orphelins sans boutons
+    assert not set(fresh_media) & slow.deleted()
+    assert set(fresh_media) <= await _outbox()
+    assert bot.REVIEW_QUEUE.stats["delivered"] == 1
+
+
+async def test_no_concurrent_delivery_of_same_report(db):
+    slow = SlowMediaBot()
+    app = SimpleNamespace(bot=slow)
+    await _insert_report()
+    workers = [asyncio.create_task(bot.worker_loop(app, i)) for i in range(3)]
+    try:
+        await bot.REVIEW_QUEUE.put(REPORT)
+        await asyncio.wait_for(slow.media_started.wait(), 2)
+        await bot.REVIEW_QUEUE.put(REPORT)   # remis en file pendant la livraison (édition, /modifier…)
+        await asyncio.sleep(0.05)
+        assert len(slow.sent("send_media_group")) == 1   # les autres workers n'y touchent pas
+        slow.gate.set()
+        await _drained()
+    finally:
+        for w in workers:
+            w.cancel()
+    assert (await _row())[1] == "delivered"
+
+
+class FailingMediaBot(FakeBot):
+    """L'album part toujours en erreur (`error` instanciée à chaque appel)."""
+
+    def __init__(self, error):
+        super().__init__()
+        self.error = error
+
+    async def send_media_group(self, chat_id, media, **kwargs):
+        self.calls.append(("send_media_group", (), {"chat_id": chat_id}))
+        raise self.error
+
+
+async def _run_worker_until(predicate, app, timeout: float = 5.0):
+    worker = asyncio.create_task(bot.worker_loop(app))
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    try:
+        while not await predicate():
+            assert loop.time() < deadline, "délai dépassé"
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.05)       # aucun nouvel essai derrière l'état terminal
+    finally:
+        worker.cancel()
+
+
+async def test_permanent_error_fails_once(db, monkeypatch):
+    alerts = []
+
+    async def notify(text, **kwargs):
+        alerts.append(text)
+
+    monkeypatch.setattr(bot, "notify_admin", notify)
+    monkeypatch.setattr(bot, "REVIEW_RETRY_MIN_SEC", 0.01)
+    failing = FailingMediaBot(bot.BadRequest("Wrong file identifier/http url specified"))
+    await _insert_report()
+    await bot.REVIEW_QUEUE.put(REPORT)
+    await _run_worker_until(lambda: _state_is("failed"), SimpleNamespace(bot=failing))
+
+    assert len(failing.sent("send_media_group")) == 1     # pas de nouvel essai sur un refus définitif
+    assert len(failing.sent()) == 1                        # un seul aperçu posté…
+    assert await _outbox() == set()                        # …puis effacé
+    assert len(alerts) == 1 and REPORT in alerts[0] and "BadRequest" in alerts[0]
+    assert bot.REVIEW_QUEUE.stats["failed"] == 1 and bot.REVIEW_QUEUE.depth == 0
+
+
+async def test_transient_errors_capped(db, monkeypatch):
+    alerts = []
+
+    async def notify(text, **kwargs):
+        alerts.append(text)
+
+    monkeypatch.setattr(bot, "notify_admin", notify)
+    monkeypatch.setattr(bot, "REVIEW_RETRY_MIN_SEC", 0.01)
+    monkeypatch.setattr(bot, "REVIEW_MAX_ATTEMPTS", 3)
+    failing = FailingMediaBot(NetworkError("connexion perdue"))
+    await _insert_report()
+    await bot.REVIEW_QUEUE.put(REPORT)
+    await _run_worker_until(lambda: _state_is("failed"), SimpleNamespace(bot=failing))
+
+    assert len(failing.sent("send_media_group")) == 3
+    assert len(alerts) == 1 and "3 tentatives" in alerts[0]
+
+
+async def _state_is(state: str) -> bool:
+    return (await _row())[1] == state
+
+
+
+async def test_click_on_other_report_keeps_edit_in_progress(db, fake_bot):
+    """Un clic ne remet à zéro que l'édition de son propre signalement (il ne prend pas la clé du chat)."""
+    ctx = SimpleNamespace(bot=fake_bot, bot_data={})
+    await _insert_report()
+    async with bot.DB.write() as conn:
+        await conn.execute("INSERT INTO edit_state (chat_id, report_id, prompt_message_id) VALUES (?, ?, 0)",
+                           (bot.ADMIN_GROUP_ID, REPORT))
+    admin = {"id": 5, "is_bot": False, "first_name": "Admin"}
+    chat = {"id": bot.ADMIN_GROUP_ID, "type": "supergroup"}
+
+    def click(update_id: int, data: str) -> bot.Update:
+        return bot.Update.de_json({"update_id": update_id, "callback_query": {
+            "id": str(update_id), "chat_instance": "c", "data": data, "from": admin,
+            "message": {"message_id": 9, "date": int(time.time()), "text": "p", "chat": chat}}}, fake_bot)
+
+    def text(update_id: int, body: str) -> bot.Update:
+        return bot.Update.de_json({"update_id": update_id, "message": {
+            "message_id": 70 + update_id, "date": int(time.time()), "text": body,
+            "chat": chat, "from": admin}}, fake_bot)
+
+    await bot.on_button_click(click(1, "REJECT|43_900"), ctx)          # autre signalement
+    await bot.handle_admin_edit(text(2, "nouveau texte"), ctx)
+    assert await _row() == ("nouveau texte", "queued", 1)
+
+    async with bot.DB.write() as conn:
+        await conn.execute("INSERT INTO edit_state (chat_id, report_id, prompt_message_id) VALUES (?, ?, 0)",
+                           (bot.ADMIN_GROUP_ID, REPORT))
+    await bot.on_button_click(click(3, f"REJECT|{REPORT}"), ctx)       # le signalement édité lui-même
+    await bot.handle_admin_edit(text(4, "trop tard"), ctx)
+    assert await _row() is None
+    async with bot.DB.read() as conn:
+        async with conn.execute("SELECT COUNT(*) FROM edit_state") as cur:
+            assert (await cur.fetchone())[0] == 0
+
+
+async def _insert_reports(report_ids):
+    files = json.dumps([{"type": "photo", "file_id": f"F{i}"} for i in range(3)])
+    async with bot.DB.write() as conn:
+        await conn.executemany(
+            "INSERT INTO pending_reports (report_id, text, files_json, created_ts, user_name) VALUES (?, 't', ?, ?, 'u')",
+            [(rid, files, int(time.time())) for rid in report_ids]
+        )
+
+
+async def test_workers_deliver_distinct_reports_in_parallel(db):
+    slow = SlowMediaBot()
+    app = SimpleNamespace(bot=slow)
+    reports = [f"{i}_900" for i in range(1, 4)]
+    await _insert_reports(reports)
+    workers = [asyncio.create_task(bot.worker_loop(app, i)) for i in range(3)]
+    try:
+        for rid in reports:
+            await bot.REVIEW_QUEUE.put(rid)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + 2
+        while len(slow.sent("send_media_group")) < 3:           # trois albums en vol, aucun encore terminé
+            assert loop.time() < deadline, "les workers ne livrent pas en parallèle"
+            await asyncio.sleep(0.01)
+        assert bot.REVIEW_QUEUE.inflight == 3
+        slow.gate.set()
+        await _drained()
+    finally:
+        for w in workers:
+            w.cancel()
+    assert bot.REVIEW_QUEUE.stats["delivered"] == 3
+
+
+class FloodOnceBot(FakeBot):
+    """Premier album refusé avec un flood-wait, les suivants passent."""
+
+    def __init__(self):
+        super().__init__()
+        self.flooded = False
+
+    async def send_media_group(self, chat_id, media, **kwargs):
+        self.calls.append(("send_media_group", (), {"chat_id": chat_id}))
+        if not self.flooded:
+            self.flooded = True
+            raise bot.RetryAfter(0)
+        return [SimpleNamespace(message_id=6000 + i) for i in range(len(media))]
+
+
+async def test_flood_wait_reschedules_instead_of_dropping(db):
+    flood = FloodOnceBot()
+    await _insert_report()
+    await bot.REVIEW_QUEUE.put(REPORT)
+    await _run_worker_until(lambda: _state_is("delivered"), SimpleNamespace(bot=flood))
+    assert len(flood.sent("send_media_group")) == 2
+    assert bot.REVIEW_QUEUE.stats["retries"] == 1 and bot.REVIEW_QUEUE.stats["failed"] == 0
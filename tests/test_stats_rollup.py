@@ -0,0 +1,69 @@
+import random
+import time
+
+import bot
+
+TYPES = ("published", "album_received", "spam_blocked")
+
+
+async def _raw_by_hour(conn) -> dict:
+    async with conn.execute(
+        "SELECT event_type, ts - ts % 3600, COUNT(*) FROM stats_events GROUP BY 1, 2"
+    ) as cur:
+        return {(et, h): n for et, h, n in await cur.fetchall()}
+
+
+async def _rollup(conn) -> dict:
+    async with conn.execute("SELECT event_type, hour_ts, count FROM stats_rollup") as cur:
+        return {(et, h): n for et, h, n in await cur.fetchall()}
+
+
+async def test_v4_backfills_rollup_from_raw_events(db):
+    rnd = random.Random(18)
+    now = int(time.time())
+    events = [(rnd.choice(TYPES), now - rnd.randint(0, 3 * 86400)) for _ in range(2000)]
+    async with bot.DB.write() as conn:                     # base restée en v3 : pas encore d'agrégats
+        await conn.execute("DROP TABLE stats_rollup")
+        await conn.execute("UPDATE bot_state SET value = '3' WHERE key = 'schema_version'")
+        await conn.executemany("INSERT INTO stats_events (event_type, ts, meta) VALUES (?, ?, '{}')", events)
+
+    await bot.init_db()
+
+    async with bot.DB.read() as conn:
+        assert await _rollup(conn) == await _raw_by_hour(conn)
+        async with conn.execute("SELECT value FROM bot_state WHERE key = 'schema_version'") as cur:
+            assert int((await cur.fetchone())[0]) == bot.MIGRATIONS[-1][0]
+        last24 = await bot._rollup_last24(conn, TYPES)
+    since = now - now % 3600 - 23 * 3600
+    for et in TYPES:
+        assert sum(last24[et].values()) == sum(1 for t, ts in events if t == et and ts >= since)
+
+
+async def test_live_events_keep_rollup_in_step_with_raw(db):
+    rnd = random.Random(180)
+    now = int(time.time())
+    for _ in range(500):
+        bot._add_event(rnd.choice(TYPES), ts=now - rnd.randint(0, 2 * 86400))
+    await bot.WRITE_BEHIND.flush()
+    for _ in range(300):                                    # deuxième lot : upsert sur les seaux existants
+        bot._add_event(rnd.choice(TYPES), ts=now - rnd.randint(0, 2 * 86400))
+    await bot.WRITE_BEHIND.flush()
+    async with bot.DB.read() as conn:
+        raw = await _raw_by_hour(conn)
+        assert await _rollup(conn) == raw
+    assert sum(raw.values()) == 800
+
+
+async def test_stats_job_purges_raw_but_keeps_rollups(db, monkeypatch):
+    now = int(time.time())
+    monkeypatch.setattr(bot, "_now", lambda: now)
+    old = now - (bot.STATS_RAW_RETENTION_DAYS + 1) * 86400
+    ancient = now - (bot.STATS_ROLLUP_RETENTION_DAYS + 1) * 86400
+    for ts in (old, old, now, ancient):
+        bot._add_event("published", ts=ts)
+    await bot.WRITE_BEHIND.flush()
+
+    assert await bot._job_stats() == 3 + 1                  # 3 bruts périmés + 1 seau hors rétention
+    async with bot.DB.read() as conn:
+        assert await _raw_by_hour(conn) == {("published", now - now % 3600): 1}
+        assert await _rollup(conn) == {("published", now - now % 3600): 1, ("published", old - old % 3600): 2}
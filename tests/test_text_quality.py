@@ -0,0 +1,54 @@
+import pytest
+
+import bot
+
+
+def baseline_gibberish(text: str) -> bool:
+    """Règle d'origine (deux passes de générateurs sur le texte en minuscules)."""
+    text = text.strip().lower()
+    if len(text) < 12:
+        return False
+    consonnes = sum(1 for c in text if c in "bcdfghjklmnpqrstvwxyz")
+    voyelles = sum(1 for c in text if c in "aeiouy")
+    return consonnes / (voyelles + 1) > 5
+
+
+LEGIT = [
+    "Bravo bravo bravo bravo",
+    "A7 A7 A7 A7 bouchon",
+    "les les les les les les",
+    "🚗🚗🚗🚗🚗🚗🚒🚒🚒🚒🚒🚒",
+    "noooooooon pas encore un accident",
+    "Accident sur l'A7 à hauteur de Montélimar, prudence",
+    "Merci pour l'info 👍",
+]
+JUNK = [
+    "sdfghjklmqsdfghjk",
+    "xkcdvbnmqwrtzplkjh",
+    "bcdfg hjklm npqrs tvwxz",
+]
+
+
+@pytest.mark.parametrize("text", LEGIT)
+def test_legit_messages_not_gibberish(text):
+    assert not bot.text_quality(text.lower()).gibberish
+
+
+@pytest.mark.parametrize("text", JUNK)
+def test_keyboard_mash_is_gibberish(text):
+    assert bot.text_quality(text.lower()).gibberish
+
+
+@pytest.mark.parametrize("text", LEGIT + JUNK + ["RN7 km 12 : 2 VL + 1 PL"])
+def test_enforcement_matches_baseline(text):
+    assert bot.text_quality(text.lower()).gibberish == baseline_gibberish(text)
+
+
+def test_accented_vowels_count_as_vowels():
+    text = "brûlé crêpé brûlé crêpé"
+    assert baseline_gibberish(text) and not bot.text_quality(text).gibberish
+
+
+def test_candidate_thresholds_reported_not_enforced():
+    q = bot.text_quality("bravo bravo bravo bravo")
+    assert q.suspect and not q.gibberish
@@ -0,0 +1,43 @@
+import os
+
+import pytest
+
+import bot
+
+CORPUS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bench", "captions_fr.tsv")
+VIDEOS, RADARS, GENERAL = bot.PUBLIC_TOPIC_VIDEOS_ID, bot.PUBLIC_TOPIC_RADARS_ID, bot.PUBLIC_TOPIC_GENERAL_ID
+
+
+@pytest.mark.parametrize("caption, expected", [
+    # La négation ne porte que sur le mot-clé qui la suit
+    ("Pas de blessé dans l'accident de ce matin sur l'A7", VIDEOS),
+    ("Aucun blessé lors de cet accident sur la N7", VIDEOS),
+    ("Sans permis il a percuté une voiture", VIDEOS),
+    ("Pas d'accident, juste un contrôle de police", RADARS),
+    ("Pas de radar aujourd'hui sur la N7", GENERAL),
+    ("Aucun  accident signalé", GENERAL),
+    # Un mot-clé ambigu seul suffit encore
+    ("Police à la sortie de Vienne", RADARS),
+    ("Gendarmerie au rond-point", RADARS),
+    ("Gros impact sur la portière", VIDEOS),
+    # Mots entiers : pas de correspondance au milieu d'un mot
+    ("chocolat renversé", GENERAL),
+    ("Choc violent sur l'A7", VIDEOS),
+    # Pluriel / féminin et accents
+    ("3 accidents sur la rocade", VIDEOS),
+    ("Deux radars mobiles à Lyon", RADARS),
+    ("Flashée à 56, controle laser", RADARS),
+    ("Voiture percutée par un camion", VIDEOS),
+    # Expressions et départage pondéré
+    ("Accident voiture contre bus à Lyon, police sur place", VIDEOS),
+    ("Voiture de police banalisée sur la rocade", RADARS),
+])
+def test_routing(caption, expected):
+    assert bot.TOPIC_ROUTER.classify(caption).thread_id == expected
+
+
+def test_corpus_not_worse_than_legacy_rule():
+    samples = bot._load_labelled_tsv(CORPUS)
+    ok = sum(bot.TOPIC_ROUTER.classify(c).thread_id == tid for _, c, tid in samples)
+    legacy = sum(bot._legacy_topic(c) == tid for _, c, tid in samples)
+    assert ok >= legacy
@@ -0,0 +1,151 @@
+import asyncio
+import itertools
+import random
+import time
+
+import pytest
+
+import bot
+
+_uids = itertools.count(1)
+
+
+def _message(user_id: int, chat_id: int, *, chat_type="private", media_group_id=None) -> dict:
+    uid = next(_uids)
+    msg = {
+        "message_id": uid, "date": int(time.time()), "text": "x",
+        "chat": {"id": chat_id, "type": chat_type},
+        "from": {"id": user_id, "is_bot": False, "first_name": "U"},
+    }
+    if media_group_id:
+        msg["media_group_id"] = media_group_id
+    return {"update_id": uid, "message": msg}
+
+
+def _callback(data: str) -> dict:
+    uid = next(_uids)
+    return {"update_id": uid, "callback_query": {
+        "id": str(uid), "chat_instance": "c", "data": data,
+        "from": {"id": 7, "is_bot": False, "first_name": "A"},
+        "message": {"message_id": 5, "date": int(time.time()), "text": "p",
+                    "chat": {"id": bot.ADMIN_GROUP_ID, "type": "supergroup"}},
+    }}
+
+
+def _mixed_updates(n: int, rnd: random.Random) -> list:
+    """MP, albums du groupe public, boutons admin et texte du groupe admin, entrelacés."""
+    raw = []
+    for _ in range(n):
+        r = rnd.random()
+        if r < .4:
+            uid = rnd.randint(1, 30)
+            raw.append(_message(uid, uid))
+        elif r < .6:
+            raw.append(_message(rnd.randint(1, 30), bot.PUBLIC_GROUP_ID, chat_type="supergroup",
+                                media_group_id=f"g{rnd.randint(1, 8)}"))
+        elif r < .8:
+            raw.append(_callback(f"{rnd.choice(['APPROVE', 'EDIT', 'REJECT'])}|r{rnd.randint(1, 20)}"))
+        else:
+            raw.append(_message(99, bot.ADMIN_GROUP_ID, chat_type="supergroup"))
+    return [bot.Update.de_json(d, None) for d in raw]
+
+
+async def test_stress_per_key_order_and_no_overlap():
+    rnd = random.Random(25)
+    proc = bot.KeyedUpdateProcessor(64)
+    updates = _mixed_updates(3000, rnd)
+    running, order, overlaps = {}, {}, []
+
+    async def handler(update, i):
+        keys = bot.update_keys(update)
+        for k in keys:
+            if running.get(k):
+                overlaps.append(k)
+            running[k] = True
+            order.setdefault(k, []).append(i)
+        await asyncio.sleep(rnd.random() * 0.002)
+        for k in keys:
+            running[k] = False
+
+    await asyncio.wait_for(asyncio.gather(*(
+        asyncio.create_task(proc.process_update(u, handler(u, i))) for i, u in enumerate(updates)
+    )), 30)
+
+    assert overlaps == []
+    assert all(seq == sorted(seq) for seq in order.values())
+    assert proc._queues == {} and proc.inflight == 0
+    assert proc.stats["processed"] == 3000 and proc.stats["max_inflight"] > 1
+
+
+async def test_stress_with_random_cancellations():
+    rnd = random.Random(7)
+    proc = bot.KeyedUpdateProcessor(64)
+    updates = _mixed_updates(1500, rnd)
+    done = []
+
+    async def handler(i):
+        await asyncio.sleep(rnd.random() * 0.002)
+        done.append(i)
+
+    coros = [handler(i) for i in range(len(updates))]
+    tasks = [asyncio.create_task(proc.process_update(u, c)) for u, c in zip(updates, coros)]
+    for _ in range(20):
+        await asyncio.sleep(0.003)
+        for t in rnd.sample(tasks, 15):
+            t.cancel()
+    results = await asyncio.wait_for(asyncio.gather(*tasks, return_exceptions=True), 30)
+    for c in coros:
+        c.close()       # annulés avant même leur tour (attente du sémaphore PTB) : jamais démarrés
+
+    finished = [i for i, r in enumerate(results) if not isinstance(r, BaseException)]
+    assert sorted(done) == finished
+    assert proc._queues == {} and proc.inflight == 0
+
+
+def test_only_edit_click_takes_admin_chat_key():
+    admin_chat = f"chat:{bot.ADMIN_GROUP_ID}"
+    keys = lambda d: bot.update_keys(bot.Update.de_json(d, None))
+    assert keys(_callback("EDIT|r1")) == (admin_chat, "report:r1")
+    assert keys(_callback("APPROVE|r2")) == ("report:r2",)
+    assert keys(_callback("REJECT|r3")) == ("report:r3",)
+    assert keys(_message(99, bot.ADMIN_GROUP_ID, chat_type="supergroup")) == (admin_chat,)
+
+
+async def test_cancelled_waiter_does_not_block_key():
+    proc = bot.KeyedUpdateProcessor(8)
+    u = bot.Update.de_json(_message(1, 1), None)
+    t1 = asyncio.create_task(proc.process_update(u, asyncio.sleep(0.1)))
+    t2 = asyncio.create_task(proc.process_update(u, asyncio.sleep(0.1)))
+    await asyncio.sleep(0.02)
+    t2.cancel()
+    t3 = asyncio.create_task(proc.process_update(u, asyncio.sleep(0)))
+    await asyncio.wait_for(asyncio.gather(t1, t3), 2)
+    assert t2.cancelled() and proc._queues == {}
+
+
+async def test_head_releases_while_next_waiter_cancelled_but_not_unwound():
+    """Le suivant est annulé dans le même tour de boucle où la tête libère la clé : le troisième doit passer."""
+    proc = bot.KeyedUpdateProcessor(8)
+    u = bot.Update.de_json(_message(1, 1), None)
+    gate = asyncio.Event()
+    tasks = {}
+    ran = []
+
+    async def first():
+        await gate.wait()
+        tasks["second"].cancel()   # future annulée, mais son finally n'a pas encore tourné
+        ran.append("first")
+
+    async def record(name):
+        ran.append(name)
+
+    tasks["first"] = asyncio.create_task(proc.process_update(u, first()))
+    tasks["second"] = asyncio.create_task(proc.process_update(u, record("second")))
+    tasks["third"] = asyncio.create_task(proc.process_update(u, record("third")))
+    await asyncio.sleep(0.01)
+    gate.set()
+
+    await asyncio.wait_for(asyncio.gather(tasks["first"], tasks["third"]), 2)
+    with pytest.raises(asyncio.CancelledError):
+        await tasks["second"]
+    assert ran == ["first", "third"] and proc._queues == {}
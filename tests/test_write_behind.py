@@ -0,0 +1,54 @@
+import bot
+
+EVENT_SQL = "INSERT INTO stats_events (event_type, ts, meta) VALUES (?, ?, NULL)"
+
+
+class DownDB:
+    """BDD indisponible : toute écriture échoue."""
+
+    def write(self):
+        raise OSError("disk I/O error")
+
+
+async def test_failed_flushes_keep_newest_rows_within_bound(db, monkeypatch):
+    alerts = []
+
+    async def notify(text, **kwargs):
+        alerts.append(text)
+
+    pool = bot.DB
+    monkeypatch.setattr(bot, "notify_admin", notify)
+    monkeypatch.setattr(bot, "DB", DownDB())
+    monkeypatch.setattr(bot, "METRICS", bot.Metrics())
+    wb = bot.WriteBehind(batch=10_000, max_rows=5)
+    for i in range(4):
+        wb.add(EVENT_SQL, ("e", i))
+    wb.inc("published_total", 3)
+    assert await wb.flush() == 0
+    assert wb.stats["dropped"] == 0 and alerts == []
+
+    for i in range(4, 8):
+        wb.add(EVENT_SQL, ("e", i))
+    assert await wb.flush() == 0
+    assert wb.stats["dropped"] == 3 and wb.pending == 6       # 5 lignes + 1 compteur
+    assert len(alerts) == 1 and "3 ligne(s)" in alerts[0]
+    assert bot.METRICS.counters[("afbot_write_behind_dropped_total", ())] == 3
+
+    monkeypatch.setattr(bot, "DB", pool)
+    assert await wb.flush() == 6
+    async with pool.read() as conn:
+        async with conn.execute("SELECT ts FROM stats_events ORDER BY ts") as cur:
+            assert [ts for (ts,) in await cur.fetchall()] == [3, 4, 5, 6, 7]
+        async with conn.execute("SELECT value FROM counters WHERE key = 'published_total'") as cur:
+            assert (await cur.fetchone())[0] == 3
+
+
+def test_trim_is_proportional_across_statements():
+    wb = bot.WriteBehind(max_rows=4)
+    for i in range(6):
+        wb.add("A", (i,))
+    for i in range(2):
+        wb.add("B", (i,))
+    assert wb._trim_rows() == 4
+    assert wb._rows == {"A": [(3,), (4,), (5,)], "B": [(1,)]}
+    assert wb.pending == 4